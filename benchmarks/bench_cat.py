@@ -0,0 +1,96 @@
+"""
+Benchmark of the `cat` builtin against /bin/cat.
+
+A file of --size-mb megabytes is copied to a file and into a pipe drained by
+`wc -c`. The builtin runs in this process, so the reported peak RSS growth shows
+that memory stays constant no matter how large the file is.
+
+Usage:
+    python benchmarks/bench_cat.py [--size-mb N] [--repeat R]
+"""
+
+import argparse
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_builtins import ShellBuiltins
+
+
+def make_file(path: str, size_mb: int) -> None:
+    line = b"2024-01-01T00:00:00 INFO some log line with a bit of payload 0123456789\n"
+    block = line * (1024 * 1024 // len(line) + 1)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block[:1024 * 1024])
+
+
+def peak_rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def best_of(repeat: int, run) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def bench(size_mb: int, repeat: int) -> None:
+    builtins = ShellBuiltins()
+    system_cat = shutil.which("cat")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        source = os.path.join(work_dir, "source.log")
+        target = os.path.join(work_dir, "target.log")
+        make_file(source, size_mb)
+
+        def builtin_to_file():
+            with open(target, "wb") as out:
+                builtins.cmd_cat("cat", [source], stdout=out)
+
+        def system_to_file():
+            with open(target, "wb") as out:
+                subprocess.run([system_cat, source], stdout=out, check=True)
+
+        def builtin_to_pipe():
+            counter = subprocess.Popen(["wc", "-c"], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+            builtins.cmd_cat("cat", [source], stdout=counter.stdin)
+            counter.stdin.close()
+            counter.wait()
+
+        def system_to_pipe():
+            subprocess.run(f"{system_cat} {source} | wc -c > /dev/null", shell=True, check=True)
+
+        rss_before = peak_rss_kb()
+
+        results = [
+            ("file", "builtin cat", best_of(repeat, builtin_to_file)),
+            ("file", "/bin/cat", best_of(repeat, system_to_file)),
+            ("pipe", "builtin cat", best_of(repeat, builtin_to_pipe)),
+            ("pipe", "/bin/cat", best_of(repeat, system_to_pipe)),
+        ]
+
+        rss_growth_mb = (peak_rss_kb() - rss_before) / 1024
+
+    print(f"file size: {size_mb} MB")
+    for target_kind, name, seconds in results:
+        print(f"{target_kind:5} {name:12} {seconds * 1000:9.1f} ms  {size_mb / seconds:9.0f} MB/s")
+    print(f"peak RSS growth of this process during the builtin runs: {rss_growth_mb:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=256, help="size of the generated file")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions, best is reported")
+    options = parser.parse_args()
+
+    bench(options.size_mb, options.repeat)
@@ -0,0 +1,92 @@
+"""
+Benchmark of the native ls, wc, head, tail and grep builtins against the
+programs from PATH.
+
+Every command runs --calls times on a small file (or a small directory), the
+way generated scripts call them, once through the builtin and once as a child
+process started by the shell's cmd_not_found. The per-call latency and the
+speedup are printed.
+
+Usage:
+    python benchmarks/bench_coreutils.py [--calls N] [--repeat R] [--lines L]
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_builtins import ShellBuiltins
+
+
+def make_files(work_dir: str, lines: int) -> str:
+    path = os.path.join(work_dir, "app.log")
+    with open(path, "wb") as f:
+        for number in range(lines):
+            level = "ERROR" if number % 7 == 0 else "INFO"
+            f.write(b"2024-01-01T00:00:%02d %s request %d served in %d ms\n" % (number % 60, level.encode(), number, number % 250))
+
+    for number in range(50):
+        open(os.path.join(work_dir, f"file{number:02}.txt"), "wb").close()
+
+    return path
+
+
+def best_of(repeat: int, calls: int, run) -> float:
+    """ Best time of one call over repeat rounds of calls calls """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(calls):
+            run()
+        timings.append((time.perf_counter() - started) / calls)
+    return min(timings)
+
+
+def bench(calls: int, repeat: int, lines: int) -> None:
+    builtins = ShellBuiltins()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        log = make_files(work_dir, lines)
+
+        commands = [
+            ("wc", ["-l", log]),
+            ("wc", [log]),
+            ("head", ["-n", "5", log]),
+            ("tail", ["-n", "5", log]),
+            ("grep", ["-c", "ERROR", log]),
+            ("grep", ["-n", "served in 1[0-9] ms", log]),
+            ("ls", [work_dir]),
+        ]
+
+        with open(os.devnull, "wb") as devnull:
+            print(f"{lines} line file, {calls} calls per round, best of {repeat}")
+
+            for cmd, args in commands:
+                handler = getattr(builtins, f"cmd_{cmd}")
+
+                def native():
+                    handler(cmd, args, stdin=io.BytesIO(), stdout=devnull)
+
+                def external():
+                    builtins.cmd_not_found(cmd, args, stdin=devnull, stdout=devnull)
+
+                native_seconds = best_of(repeat, calls, native)
+                external_seconds = best_of(repeat, calls, external)
+
+                label = " ".join([cmd] + [os.path.basename(arg) if os.path.isabs(arg) else arg for arg in args])
+                print(f"{label:38} native {native_seconds * 1e6:8.1f} us   external {external_seconds * 1e6:8.1f} us   {external_seconds / native_seconds:6.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200, help="calls per timing round")
+    parser.add_argument("--repeat", type=int, default=3, help="timing rounds, best is reported")
+    parser.add_argument("--lines", type=int, default=200, help="lines of the generated log file")
+    options = parser.parse_args()
+
+    bench(options.calls, options.repeat, options.lines)
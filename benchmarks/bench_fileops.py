@@ -0,0 +1,82 @@
+"""
+Benchmark of the bulk filesystem builtins against the programs from PATH.
+
+A build-directory-like tree of --dirs directories with --files files spread
+over them is created and removed again, once with the builtins (`mkdir -p`,
+`touch`, `rm -r`, which spread their system calls over a thread pool) and
+once with /bin/mkdir, /bin/touch and /bin/rm. The tree is created under
+--root (default: a temporary directory), so it can be pointed at the
+filesystem that matters, a network mount for example.
+
+Usage:
+    python benchmarks/bench_fileops.py [--files N] [--dirs D] [--root PATH]
+"""
+
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_builtins import ShellBuiltins
+
+
+def tree_paths(top: str, files: int, dirs: int) -> tuple[list[str], list[str]]:
+    directories = [os.path.join(top, f"module{number // 50}", f"pkg{number}") for number in range(dirs)]
+    file_names = [os.path.join(directories[number % dirs], f"object{number}.o") for number in range(files)]
+    return directories, file_names
+
+
+def timed(run) -> float:
+    started = time.perf_counter()
+    run()
+    return time.perf_counter() - started
+
+
+def bench(files: int, dirs: int, root: str) -> None:
+    builtins = ShellBuiltins()
+    devnull = io.BytesIO()
+
+    with tempfile.TemporaryDirectory(dir=root) as work_dir:
+        results = []
+
+        for name in ("external", "builtin"):
+            top = os.path.join(work_dir, name)
+            directories, file_names = tree_paths(top, files, dirs)
+
+            def run(cmd, flags, operands):
+                if name == "builtin":
+                    status_code, error_text, _ = getattr(builtins, f"cmd_{cmd}")(cmd, flags + operands, stdin=devnull, stdout=devnull)
+                    if status_code != 0:
+                        raise RuntimeError(error_text)
+                    return
+
+                # One program per 2000 operands, as xargs would start them
+                for start in range(0, len(operands), 2000):
+                    subprocess.run([shutil.which(cmd)] + flags + operands[start:start + 2000], check=True)
+
+            mkdir_seconds = timed(lambda: run("mkdir", ["-p"], directories))
+            touch_seconds = timed(lambda: run("touch", [], file_names))
+            rm_seconds = timed(lambda: run("rm", ["-rf"], [top]))
+
+            results.append((name, mkdir_seconds, touch_seconds, rm_seconds))
+
+    print(f"{files} files in {dirs} directories under {root or tempfile.gettempdir()}")
+    print(f"{'':9} {'mkdir -p':>10} {'touch':>10} {'rm -rf':>10}")
+    for name, mkdir_seconds, touch_seconds, rm_seconds in results:
+        print(f"{name:9} {mkdir_seconds:9.2f}s {touch_seconds:9.2f}s {rm_seconds:9.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200_000, help="files in the tree")
+    parser.add_argument("--dirs", type=int, default=2_000, help="directories in the tree")
+    parser.add_argument("--root", default=None, help="where the tree is created")
+    options = parser.parse_args()
+
+    bench(options.files, options.dirs, options.root)
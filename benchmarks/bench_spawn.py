@@ -0,0 +1,73 @@
+"""
+Spawn rate of external commands: os.posix_spawn against subprocess.Popen.
+
+Both paths go through ShellBuiltins.cmd_not_found (the path every external
+command takes), only ShellBuiltins.USE_POSIX_SPAWN differs. --heap-mb grows
+the heap of this process first, like a shell holding large caches and
+history, which is what makes fork + exec slow.
+
+Usage:
+    python benchmarks/bench_spawn.py [--count N] [--rounds R] [--heap-mb M] [--command true]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_builtins import ShellBuiltins
+from shell_spawn import POSIX_SPAWN_AVAILABLE
+
+
+def spawns_per_second(builtins: ShellBuiltins, command: str, count: int) -> float:
+    builtins.cmd_not_found(command, [])  # warm the PATH cache
+
+    started = time.perf_counter()
+    for _ in range(count):
+        status_code, error_text, _ = builtins.cmd_not_found(command, [])
+        if status_code != 0:
+            raise SystemExit(f"{command} failed with status {status_code}: {error_text}")
+
+    return count / (time.perf_counter() - started)
+
+
+def bench(count: int, rounds: int, heap_mb: int, command: str) -> None:
+    # Touched ballast, so its pages are really part of the resident heap
+    ballast = [bytearray(1024 * 1024) for _ in range(heap_mb)]
+    for block in ballast:
+        block[::4096] = b"x" * len(block[::4096])
+
+    builtins = ShellBuiltins()
+    paths = [("posix_spawn", True), ("subprocess", False)] if POSIX_SPAWN_AVAILABLE else [("subprocess", False)]
+    best_rates = {name: 0.0 for name, _ in paths}
+
+    if not POSIX_SPAWN_AVAILABLE:
+        print("os.posix_spawn is not available on this platform")
+
+    # Rounds alternate between the paths, so machine noise hits both alike
+    for _ in range(rounds):
+        for name, use_posix_spawn in paths:
+            builtins.USE_POSIX_SPAWN = use_posix_spawn
+            best_rates[name] = max(best_rates[name], spawns_per_second(builtins, command, count))
+
+    results = list(best_rates.items())
+
+    print(f"command: {command}, best of {rounds} rounds of {count} spawns, extra heap: {heap_mb} MB")
+    for name, rate in results:
+        print(f"{name:12} {rate:9.0f} spawns/s  {1e6 / rate:9.1f} us/spawn")
+
+    if len(results) == 2:
+        print(f"speedup:     {results[0][1] / results[1][1]:9.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=500, help="spawns per round")
+    parser.add_argument("--rounds", type=int, default=5, help="rounds per path, the best is reported")
+    parser.add_argument("--heap-mb", type=int, default=0, help="heap to allocate before spawning")
+    parser.add_argument("--command", default="true", help="external command to run, without arguments")
+    options = parser.parse_args()
+
+    bench(options.count, options.rounds, options.heap_mb, options.command)
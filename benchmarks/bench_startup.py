@@ -0,0 +1,117 @@
+"""
+Startup budget of the shell, measured with `python -X importtime`.
+
+`shell_executor.py -c exit` is started --runs times. For every run the
+cumulative import time of the top-level imports that a bare interpreter does
+not already do (site, encodings, ...) is summed up; the best run must stay
+within --budget-ms. The wall time of the whole process is reported too.
+
+It also fails if a module that should only load on first use (asyncio, socket,
+subprocess, argparse, shell_utils, ...) is imported at startup.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs N] [--budget-ms MS] [--verbose]
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+SHELL_EXECUTOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell", "shell_executor.py")
+
+DEFAULT_BUDGET_MS = 25.0
+
+# Modules that must not be imported just to start the shell
+LAZY_MODULES = (
+    "asyncio",
+    "socket",
+    "ssl",
+    "concurrent.futures",
+    "subprocess",
+    "argparse",
+    "shell_utils",
+)
+
+# "import time:  self [us] | cumulative | imported package", nesting is shown by indentation
+_IMPORT_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_importtime(stderr: str) -> dict[str, int]:
+    """ Top-level module -> cumulative import time in microseconds """
+
+    top_level = {}
+
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE_RE.match(line)
+        if match and len(match.group(3)) == 1:
+            top_level[match.group(4)] = int(match.group(2))
+
+    return top_level
+
+
+def interpreter_modules() -> set[str]:
+    """ Modules a bare interpreter imports at startup, not part of the budget """
+
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True, check=True)
+    return set(parse_importtime(result.stderr))
+
+
+def all_imported_modules() -> set[str]:
+    """ Every module (nested ones too) imported by `shell_executor.py -c exit` """
+
+    result = subprocess.run([sys.executable, "-X", "importtime", SHELL_EXECUTOR, "-c", "exit"], capture_output=True, text=True, check=True)
+    return {match.group(4) for match in map(_IMPORT_LINE_RE.match, result.stderr.splitlines()) if match}
+
+
+def measure_run(baseline_modules: set[str]) -> tuple[float, float, dict[str, int]]:
+    """ (shell import time in ms, process wall time in ms, module -> us) of one run """
+
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", SHELL_EXECUTOR, "-c", "exit"], capture_output=True, text=True, check=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    shell_imports = {name: us for name, us in parse_importtime(result.stderr).items() if name not in baseline_modules}
+    return sum(shell_imports.values()) / 1000, wall_ms, shell_imports
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="shell starts, the best is checked against the budget")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="allowed import time of the shell")
+    parser.add_argument("--verbose", action="store_true", help="list the top-level imports of the best run")
+    options = parser.parse_args(argv)
+
+    baseline_modules = interpreter_modules()
+    runs = [measure_run(baseline_modules) for _ in range(options.runs)]
+    best_import_ms, _, best_imports = min(runs, key=lambda run: run[0])
+    wall_times = [run[1] for run in runs]
+
+    print(f"import time:  best {best_import_ms:7.2f} ms   median {statistics.median(run[0] for run in runs):7.2f} ms   budget {options.budget_ms:.2f} ms")
+    print(f"process wall: best {min(wall_times):7.2f} ms   median {statistics.median(wall_times):7.2f} ms")
+
+    if options.verbose:
+        for name, us in sorted(best_imports.items(), key=lambda item: item[1], reverse=True):
+            print(f"    {us / 1000:7.2f} ms  {name}")
+
+    failures = []
+
+    imported_modules = all_imported_modules()
+    eager_modules = sorted(module for module in LAZY_MODULES if module in imported_modules)
+    if eager_modules:
+        failures.append(f"imported at startup: {', '.join(eager_modules)}")
+
+    if best_import_ms > options.budget_ms:
+        failures.append(f"import time {best_import_ms:.2f} ms is over the budget of {options.budget_ms:.2f} ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""
+Latency benchmark suite of the shell.
+
+Cases:
+    tokenizer.tokenize          ShellTokenizer.tokenize on a 100 command line
+    parser.parse                ShellParser.parse on the tokens of the same line
+    builtins.dispatch           lookup in ShellBuiltins.builtin_commands + call (echo / pwd)
+    executor.parse_line_cached  ShellExecutor.parse_line served from the parse cache
+    executor.chain_run          ShellExecutor.execute on 1000 builtins joined by &&
+    executor.chain_skipped      the same chain after a failing first command
+    spawn.cmd_not_found         external `true` through ShellBuiltins.cmd_not_found
+    glob.expand_cached          `*5.txt` in a directory of 10000 files, listing served from the cache
+    completion.command          Tab completion of a command name with 10000 executables on PATH
+    history.search              reverse search in a history of 1M entries (100000 distinct commands)
+    startup.shell               `python shell_executor.py -c exit` in a new interpreter
+    server.roundtrip            `echo x` sent to a running shell_server.py, output captured
+
+Every case reports the best and the median time per operation. Results are
+written as JSON with --json and can be compared against a stored baseline:
+a case fails when it is slower than baseline * threshold (--threshold, or the
+per-case value in the "thresholds" object of the baseline file). The exit
+status is 1 if any case regressed.
+
+Only the standard library is used, nothing needs network access.
+
+Usage:
+    python benchmarks/bench_suite.py [--json out.json] [--baseline benchmarks/baseline.json]
+                                     [--threshold 1.5] [--only PREFIX] [--repeat R]
+"""
+
+import argparse
+import atexit
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SHELL_DIR = os.path.join(BENCH_DIR, "..", "shell")
+sys.path.insert(0, SHELL_DIR)
+
+from bench_tokenizer import generate_line
+from shell_builtins import ShellBuiltins
+from shell_client import ShellClient
+from shell_completion import ShellCompleter
+from shell_glob import GlobWord, ShellGlob
+from shell_executor import ShellExecutor
+from shell_history import ShellHistory
+from shell_tokenizer import ShellTokenizer
+
+DEFAULT_THRESHOLD = 1.5
+CHAIN_LENGTH = 1000
+
+
+def measure(run, number: int, repeat: int) -> dict:
+    """ Calls run() number times per round, returns seconds per operation """
+
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            run()
+        rounds.append((time.perf_counter() - started) / number)
+
+    return {"best": min(rounds), "median": statistics.median(rounds), "number": number, "repeat": repeat}
+
+
+def silenced(run):
+    """ Wraps run so that builtin output printed to sys.stdout is discarded """
+
+    def silenced_run():
+        original_stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            run()
+        finally:
+            sys.stdout = original_stdout
+
+    return silenced_run
+
+
+def case_tokenize():
+    line = generate_line(100)
+    return lambda: ShellTokenizer.tokenize(line), 200
+
+
+def case_parse():
+    executor = ShellExecutor()
+    tokens = ShellTokenizer.tokenize_typed(generate_line(100))
+    return lambda: executor.parser.parse(tokens), 200
+
+
+def case_dispatch():
+    builtin_commands = ShellBuiltins().builtin_commands
+    args = ("hello", "world")
+
+    def run():
+        builtin_commands["echo"]("echo", args)
+        builtin_commands["pwd"]("pwd", ())
+
+    return run, 20000
+
+
+def case_parse_line_cached():
+    executor = ShellExecutor()
+    line = generate_line(10)
+    executor.parse_line(line)
+    return lambda: executor.parse_line(line), 20000
+
+
+def case_chain_run():
+    executor = ShellExecutor()
+    tree = executor.parse_line(" && ".join(["echo x"] * CHAIN_LENGTH))
+    return silenced(lambda: executor.execute(tree)), 5
+
+
+def case_chain_skipped():
+    executor = ShellExecutor()
+    tree = executor.parse_line(" && ".join(["cd /nonexistent-bench-dir"] + ["echo x"] * CHAIN_LENGTH))
+    return silenced(lambda: executor.execute(tree)), 200
+
+
+def case_spawn():
+    builtins = ShellBuiltins()
+    builtins.cmd_not_found("true", [])  # warm the PATH cache
+    return lambda: builtins.cmd_not_found("true", []), 50
+
+
+def case_glob_cached():
+    directory = tempfile.mkdtemp(prefix="bench-glob-")
+    for index in range(10000):
+        open(os.path.join(directory, f"{index}.txt"), "w").close()
+
+    # Listings of directories changed in the last seconds are not cached
+    os.utime(directory, (time.time() - 60, time.time() - 60))
+    atexit.register(lambda: subprocess.run(["rm", "-rf", directory]))
+
+    glob = ShellGlob()
+    args = (GlobWord(os.path.join(directory, "*5.txt")),)
+    return lambda: glob.expand_args(args), 20
+
+
+def case_completion():
+    directory = tempfile.mkdtemp(prefix="bench-completion-")
+    for index in range(10000):
+        path = os.path.join(directory, f"tool{index}")
+        open(path, "w").close()
+        os.chmod(path, 0o755)
+    atexit.register(lambda: subprocess.run(["rm", "-rf", directory]))
+
+    os.environ["PATH"] = directory + os.pathsep + os.environ.get("PATH", "")
+    completer = ShellCompleter(ShellBuiltins().builtin_commands, ShellGlob())
+    completer.warm_up()
+    return lambda: completer.complete("ls | ", "tool12"), 200
+
+
+def case_history_search():
+    directory = tempfile.mkdtemp(prefix="bench-history-")
+    path = os.path.join(directory, "history")
+    atexit.register(lambda: subprocess.run(["rm", "-rf", directory]))
+
+    commands = ["git commit -m", "ssh host", "make -C build/target", "docker run --rm image", "grep -rn pattern"]
+    with open(path, "w") as history_file:
+        history_file.writelines(f"{commands[index % 5]}-{index * 7919 % 100000}\n" for index in range(1_000_000))
+
+    history = ShellHistory(path)
+    history.search("")  # loads the file and builds the index outside the measurement
+    return lambda: history.search("ssh host-4242", 1), 200
+
+
+def case_startup():
+    command = [sys.executable, os.path.join(SHELL_DIR, "shell_executor.py"), "-c", "exit"]
+    return lambda: subprocess.run(command, stdin=subprocess.DEVNULL, check=True), 5
+
+
+def case_server_roundtrip():
+    socket_dir = tempfile.mkdtemp(prefix="bench-shell-")
+    socket_path = os.path.join(socket_dir, "shell.sock")
+    server = subprocess.Popen([sys.executable, os.path.join(SHELL_DIR, "shell_server.py"), "-s", socket_path], stderr=subprocess.DEVNULL)
+
+    def stop_server():
+        server.terminate()
+        server.wait()
+        os.rmdir(socket_dir) # the server removes its socket on SIGTERM
+
+    atexit.register(stop_server)
+
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            client = ShellClient(socket_path)
+            break
+        except OSError:
+            if time.monotonic() > deadline or server.poll() is not None:
+                raise
+            time.sleep(0.01)
+
+    return lambda: client.capture("echo x"), 200
+
+
+CASES = {
+    "tokenizer.tokenize": case_tokenize,
+    "parser.parse": case_parse,
+    "builtins.dispatch": case_dispatch,
+    "executor.parse_line_cached": case_parse_line_cached,
+    "executor.chain_run": case_chain_run,
+    "executor.chain_skipped": case_chain_skipped,
+    "spawn.cmd_not_found": case_spawn,
+    "glob.expand_cached": case_glob_cached,
+    "completion.command": case_completion,
+    "history.search": case_history_search,
+    "startup.shell": case_startup,
+    "server.roundtrip": case_server_roundtrip,
+}
+
+
+def run_cases(only: list[str], repeat: int) -> dict:
+    results = {}
+
+    for name, setup in CASES.items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+
+        run, number = setup()
+        run()  # warm-up
+        results[name] = measure(run, number, repeat)
+
+    return results
+
+
+def compare(results: dict, baseline: dict, default_threshold: float, out=sys.stdout) -> list[str]:
+    """ Prints the comparison table, returns the names of the cases slower than their baseline allows """
+
+    thresholds = baseline.get("thresholds", {})
+    regressions = []
+
+    print(f"\n{'case':28} {'baseline':>12} {'current':>12} {'ratio':>7} {'limit':>6}", file=out)
+
+    for name, result in results.items():
+        reference = baseline.get("results", {}).get(name)
+
+        if reference is None:
+            print(f"{name:28} {'-':>12} {format_time(result['best']):>12}    (no baseline)", file=out)
+            continue
+
+        ratio = result["best"] / reference["best"]
+        limit = thresholds.get(name, default_threshold)
+        verdict = "REGRESSION" if ratio > limit else ""
+
+        if verdict:
+            regressions.append(name)
+
+        print(f"{name:28} {format_time(reference['best']):>12} {format_time(result['best']):>12} {ratio:6.2f}x {limit:5.2f}x {verdict}", file=out)
+
+    return regressions
+
+
+def format_time(seconds: float) -> str:
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.2f} us"
+
+
+def metadata() -> dict:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", metavar="PATH", help="write the results as JSON ('-' for stdout)")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against a JSON file written by --json")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown ratio for cases without their own threshold")
+    parser.add_argument("--only", action="append", default=[], metavar="PREFIX", help="run only cases starting with PREFIX (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5, help="timing rounds per case, best and median are reported")
+    options = parser.parse_args(argv)
+
+    # With --json - stdout only carries the JSON report
+    out = sys.stderr if options.json == "-" else sys.stdout
+
+    results = run_cases(options.only, options.repeat)
+
+    for name, result in results.items():
+        print(f"{name:28} best {format_time(result['best']):>12}   median {format_time(result['median']):>12}", file=out)
+
+    report = {"meta": metadata(), "results": results}
+
+    if options.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif options.json:
+        with open(options.json, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+
+        regressions = compare(results, baseline, options.threshold, out)
+
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}", file=out)
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""
+Microbenchmark of ShellTokenizer.tokenize against shlex.
+
+That both give the same tokens is checked by tests/test_shell_tokenizer.py
+(SHLEX_COMPAT_CORPUS).
+
+Usage:
+    python benchmarks/bench_tokenizer.py [--commands N] [--repeat R]
+"""
+
+import argparse
+import os
+import shlex
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_tokenizer import ShellTokenizer
+
+
+def generate_line(commands: int) -> str:
+    """ Long machine-generated line mixing quoting, redirects and operators """
+
+    parts = []
+    for index in range(commands):
+        parts.append(f"echo \"hello world {index}\" arg_{index} 'quoted arg' > out_{index}.txt")
+    return " && ".join(parts)
+
+
+def bench(commands: int, repeat: int) -> None:
+    line = generate_line(commands)
+
+    shlex_time = min(timeit.repeat(lambda: list(shlex.shlex(line, posix=True, punctuation_chars=True)), number=1, repeat=repeat))
+    lexer_time = min(timeit.repeat(lambda: ShellTokenizer.tokenize(line), number=1, repeat=repeat))
+
+    print(f"line length: {len(line)} chars, {commands} commands")
+    print(f"shlex:          {shlex_time * 1000:9.2f} ms")
+    print(f"ShellTokenizer: {lexer_time * 1000:9.2f} ms")
+    print(f"speedup:        {shlex_time / lexer_time:9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commands", type=int, default=2000, help="commands in the generated line")
+    parser.add_argument("--repeat", type=int, default=5, help="timing repetitions, best is reported")
+    options = parser.parse_args()
+
+    bench(options.commands, options.repeat)
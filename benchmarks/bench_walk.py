@@ -0,0 +1,105 @@
+"""
+Benchmark of the find and du builtins against the programs from PATH.
+
+A tree of --dirs directories with --files files spread over them is created
+under --root (default: a temporary directory) and walked with the builtins
+(`find` in depth-first and -unordered order, `find -size`, which stats every
+entry, and `du -s`, all on the work-stealing walker of shell_fileops.py) and
+with /usr/bin/find and /usr/bin/du. The os.walk column is the same walk on a
+single thread in Python (lstat'ing every entry where the command needs a
+stat), the baseline the worker pool has to beat. After the first round the
+tree is in the page cache; --root on a network mount shows the walk bound by
+latency.
+
+Usage:
+    python benchmarks/bench_walk.py [--files N] [--dirs D] [--root PATH] [--repeat R]
+"""
+
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_builtins import ShellBuiltins
+
+
+def make_tree(top: str, files: int, dirs: int) -> None:
+    directories = [os.path.join(top, f"module{number // 50}", f"pkg{number}") for number in range(dirs)]
+    for directory in directories:
+        os.makedirs(directory)
+    for number in range(files):
+        with open(os.path.join(directories[number % dirs], f"object{number}.o"), "wb") as f:
+            f.write(b"x" * (number % 3000))
+
+
+def walk_baseline(top: str, with_stat: bool) -> None:
+    """ Single-threaded os.walk printing every path, lstat'ing each entry with with_stat """
+
+    output = io.BytesIO()
+
+    for directory, names, files in os.walk(top):
+        for name in names + files:
+            path = os.path.join(directory, name)
+            if with_stat:
+                os.lstat(path)
+            output.write(os.fsencode(path) + b"\n")
+
+
+def best_of(repeat: int, run) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def bench(files: int, dirs: int, root: str, repeat: int) -> None:
+    builtins = ShellBuiltins()
+
+    with tempfile.TemporaryDirectory(dir=root) as work_dir:
+        make_tree(work_dir, files, dirs)
+
+        # (command, arguments, whether the entries are stat'ed)
+        commands = [
+            ("find", [work_dir], False),
+            ("find", [work_dir, "-unordered"], False),
+            ("find", [work_dir, "-name", "object1*", "-size", "+1k"], True),
+            ("du", ["-s", work_dir], True),
+        ]
+
+        print(f"{files} files in {dirs} directories under {root or tempfile.gettempdir()}, best of {repeat}")
+
+        for cmd, args, with_stat in commands:
+            def builtin():
+                status_code, error_text, _ = getattr(builtins, f"cmd_{cmd}")(cmd, args, stdin=io.BytesIO(), stdout=io.BytesIO())
+                if status_code != 0:
+                    raise RuntimeError(error_text)
+
+            def external():
+                # The real find has no -unordered, its own order is the unordered one
+                subprocess.run([shutil.which(cmd)] + [arg for arg in args if arg != "-unordered"], check=True, stdout=subprocess.DEVNULL)
+
+            builtin_seconds = best_of(repeat, builtin)
+            external_seconds = best_of(repeat, external)
+            baseline_seconds = best_of(repeat, lambda: walk_baseline(work_dir, with_stat))
+
+            label = " ".join([cmd] + ["TREE" if arg == work_dir else arg for arg in args])
+            print(f"{label:36} builtin {builtin_seconds:7.3f}s   external {external_seconds:7.3f}s   os.walk {baseline_seconds:7.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100_000, help="files in the tree")
+    parser.add_argument("--dirs", type=int, default=2_000, help="directories in the tree")
+    parser.add_argument("--root", default=None, help="where the tree is created")
+    parser.add_argument("--repeat", type=int, default=3, help="timing rounds, best is reported")
+    options = parser.parse_args()
+
+    bench(options.files, options.dirs, options.root, options.repeat)
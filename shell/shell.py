@@ -1,6 +1,7 @@
 import sys
 import os
 import subprocess
+from shell_path_cache import ShellPathCache
 
 class Shell:
     def __init__(self):
@@ -12,6 +13,7 @@ class Shell:
             "cd": self.cmd_cd
         }
         self.PATH = os.environ["PATH"].split(":")
+        self.path_cache = ShellPathCache()
 
     def run(self):
         while True:
@@ -118,20 +120,7 @@ class Shell:
         Returns:
             str | None: Full path to the executable if found and executable, otherwise None.
         """
-        found_potencial_file = False
-        potential_path = None
-
-        for folder_path in self.PATH:
-            potential_path = os.path.join(folder_path, executable_file_name)
-
-            if os.path.isfile(potential_path) and os.access(potential_path, os.X_OK):
-                found_potencial_file = True
-                break
-
-        if found_potencial_file:
-            return potential_path
-        
-        return None
+        return self.path_cache.lookup(executable_file_name)
 
 if __name__ == "__main__":
     Shell().run()
@@ -1,13 +1,66 @@
 import os
-import socket
-import subprocess
-from typing import Optional, Tuple, Dict
-from shell_utils import ShellUtils
+import sys
+import mmap
+import stat
+import errno
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple, Dict, Union
+from shell_path_cache import ShellPathCache
+from shell_jobs import ShellJobTable
+from shell_stats import ShellStats, wait_child
+from shell_spawn import POSIX_SPAWN_PREFERRED, spawn_process
+
+def stream_handler(handler):
+    """
+    Marks a cmd_* handler that reads and writes binary streams itself.
+
+    The executor calls it as handler(cmd, args, stdin=..., stdout=...), where
+    stdin / stdout are binary file objects: the terminal, a redirect file or
+    the ends of a pipeline pipe. OUTPUT_TEXT of such a handler is only used
+    for error messages and goes to stderr.
+    """
+    handler.uses_streams = True
+    return handler
+
+# OUTPUT_TEXT of a plain handler: text, or chunks of str / bytes produced on demand
+Output = Union[str, bytes, Iterable[Union[str, bytes]], None]
+
+def write_output(output: Output, stdout: BinaryIO) -> None:
+    """
+    Writes the OUTPUT_TEXT of a handler to a binary stream.
+
+    Text gets a trailing newline and blank text is dropped, as the shell has
+    always printed it. bytes are written as they are. Any other iterable (a
+    generator, usually) is written chunk by chunk while it is produced, so the
+    whole output never sits in memory and a pipe reader gets the first lines
+    before the last ones exist. Chunks are written as they are, without an
+    added newline. A generator is closed when the reader goes away
+    (BrokenPipeError), so its finally blocks run.
+    """
+
+    if output is None:
+        return
+
+    if isinstance(output, str):
+        if output.strip():
+            stdout.write((output + "\n").encode())
+        return
+
+    if isinstance(output, (bytes, bytearray, memoryview)):
+        stdout.write(output)
+        return
+
+    try:
+        for chunk in output:
+            stdout.write(chunk.encode(errors="surrogateescape") if isinstance(chunk, str) else chunk)
+    finally:
+        close = getattr(output, "close", None)
+        if close is not None:
+            close()
 
 class ShellBuiltins:
     """
     Simulates built-in commands. Handlers now return a tuple:
-    (status_code: int, output_text: Optional[str], should_exit: bool)
+    (status_code: int, output_text: Output, should_exit: bool)
 
     status_code: 0 - executed successfully 
     status_code: 1 - executed unsuccessfully
@@ -30,8 +83,9 @@ class ShellBuiltins:
         1. Add a method called cmd_<command_name> to this class.
         2. Nothing else.
 
-        The one-liner below builds the lookup table once, at start-up,
-        so the runtime cost is zero and the human cost is minimal.
+        The method names are collected once per class (see _builtin_method_names),
+        so creating a shell only binds them, the runtime cost is zero and the
+        human cost is minimal.
 
         
         COMMAND HANDLER CONTRACT:
@@ -40,11 +94,18 @@ class ShellBuiltins:
 
         1. STATUS_CODE: The exit status of the command (0 for success, non-zero for failure).
         2. OUTPUT_TEXT: The output (stdout/stderr) generated by the command, or None.
+           Instead of one string it may be an iterable of str / bytes chunks, a
+           generator usually, which the executor consumes lazily into the terminal,
+           a redirect file or a pipe (see write_output). Large listings then take
+           constant memory and stream through pipelines.
         3. SHOULD_EXIT: True if the shell should terminate immediately (only for 'exit').
+
+        Handlers decorated with @stream_handler write to the stdout stream they
+        are given instead, OUTPUT_TEXT then only carries error messages.
         """
         self.builtin_commands = {
-            name[4:]: getattr(self, name)
-            for name in dir(self) if name.startswith('cmd_')
+            command: getattr(self, method_name)
+            for command, method_name in self._builtin_method_names().items()
         }
 
         # Store the not-found handler as a separate, easily accessible attribute
@@ -58,36 +119,206 @@ class ShellBuiltins:
         self.COMMAND_NOT_FOUND_EXIT_FLAG: int = 127
         # -------------------------------------------
 
-        # Utils class that holds all extended methods
-        self.shell_utils = ShellUtils()
+        # False when running a script or -c string (no prompt, no exit message)
+        self.interactive: bool = True
+
+        # Status of the last command, kept up to date by the executor ($? in a
+        # POSIX shell), a bare `exit` exits with it
+        self.last_status_code: int = 0
+
+        # --- OUTPUT CAPTURE OF EXTERNAL COMMANDS ---
+        # Only used when a caller asks for capture=True, by default children
+        # write straight to the terminal or to the redirect target.
+        self.CAPTURE_CHUNK_SIZE: int = 64 * 1024
+        self.CAPTURE_LIMIT_BYTES: int = 1024 * 1024
+        # -------------------------------------------
+
+        # External commands are started with os.posix_spawn (no copy of the
+        # shell's heap) where it is the faster launcher, see shell_spawn.py.
+        # False forces subprocess.Popen.
+        self.USE_POSIX_SPAWN: bool = POSIX_SPAWN_PREFERRED
+
+        # Bytes copied per os.sendfile call / mmap slice by `cat`
+        self.CAT_CHUNK_SIZE: int = 8 * 1024 * 1024
+
+        # Remembers where external commands were found in PATH (`hash` builtin)
+        self.path_cache = ShellPathCache()
+
+        # Background jobs started with `cmd &` (`jobs`, `wait`, `fg` builtins)
+        self.job_table = ShellJobTable()
+
+        # Builtins that change the shell itself. As a pipeline stage or a
+        # background job they run in a forked copy of the shell (like every
+        # stage in bash), so `cd /tmp | cat` leaves the shell where it was.
+        self.SHELL_STATE_BUILTINS: frozenset = frozenset({"cd", "exit", "wait", "fg", "hash"})
+
+        # Resource accounting of commands (`time` keyword, `stats` builtin)
+        self.stats = ShellStats()
+
+        # Command lines of interactive sessions (`history` builtin), created by
+        # the first line typed, scripts never load it
+        self._history = None
 
-        # Utils extended methods
-        self.NET_COMMANDS: Dict[str, function] = {
-            "getip": self.shell_utils.net_getip,
-            "scanports": self.shell_utils.net_scanports
+        # In-process ls, wc, head, tail, grep, mkdir, rmdir, touch, rm, find and
+        # du (see ShellCoreutils), created by the first of them. False, or
+        # SHELL_NATIVE_COREUTILS=0, runs the programs from PATH instead, as do
+        # options the builtins do not support.
+        self.NATIVE_COREUTILS: frozenset = frozenset({"ls", "wc", "head", "tail", "grep", "mkdir", "rmdir", "touch", "rm", "find", "du"})
+        self.USE_NATIVE_COREUTILS: bool = os.environ.get("SHELL_NATIVE_COREUTILS", "1") != "0"
+        self._coreutils = None
+
+        # Utils class that holds all extended methods. It pulls in asyncio,
+        # socket and concurrent.futures, so it is only created by the first `net`
+        self._shell_utils = None
+
+        # Utils extended methods: net subcommand -> ShellUtils method name
+        self.NET_COMMANDS: Dict[str, str] = {
+            "getip": "net_getip",
+            "scanports": "net_scanports"
         }
 
+    @classmethod
+    def _builtin_method_names(cls) -> Dict[str, str]:
+        """
+        Command name -> cmd_* method name, collected from the class dicts along
+        the MRO on first use and kept on the class, instead of a dir() scan
+        (which sorts every attribute) for every new shell.
+        """
+        names = cls.__dict__.get("_BUILTIN_METHOD_NAMES")
+
+        if names is None:
+            names = {}
+            for klass in reversed(cls.__mro__):
+                for attribute in vars(klass):
+                    if attribute.startswith("cmd_"):
+                        names[attribute[4:]] = attribute
+            cls._BUILTIN_METHOD_NAMES = names
+
+        return names
+
+    @property
+    def shell_utils(self):
+        """ ShellUtils instance, imported and created on first use """
+        if self._shell_utils is None:
+            from shell_utils import ShellUtils
+            self._shell_utils = ShellUtils()
+        return self._shell_utils
+
+    @property
+    def coreutils(self):
+        """ ShellCoreutils instance, imported and created on first use """
+        if self._coreutils is None:
+            from shell_coreutils import ShellCoreutils
+            self._coreutils = ShellCoreutils()
+        return self._coreutils
+
+    def prefers_external(self, cmd: str, args: list[str], stdout_fd: Optional[int] = None) -> bool:
+        """
+        True when a native coreutil must run as the program from PATH: the
+        builtins are switched off (USE_NATIVE_COREUTILS), an option is not
+        supported in-process, `ls` writes to a terminal (columns, colors) or
+        grep is given large files (ShellCoreutils.GREP_NATIVE_MAX_BYTES).
+        """
+
+        if cmd not in self.NATIVE_COREUTILS:
+            return False
+
+        return not self.USE_NATIVE_COREUTILS or self.coreutils.parse(cmd, args, stdout_fd) is None
+
+    @property
+    def history(self):
+        """ ShellHistory instance, imported and created on first use """
+        if self._history is None:
+            from shell_history import ShellHistory
+            self._history = ShellHistory()
+        return self._history
+
     def _find_executable_in_path(self, executable_file_name: str) -> Optional[str]:
         """
         Searches directories listed in the PATH environment variable for an executable file.
+        Results are remembered in the hash table (see ShellPathCache).
         """
-        # Get PATH environment variable and split it by ':'
-        path_dirs = os.environ.get("PATH", "").split(os.pathsep) 
-        
-        for folder_path in path_dirs:
-            potential_path = os.path.join(folder_path, executable_file_name)
-            
-            # Check if the path exists, is a file, and is executable
-            if os.path.isfile(potential_path) and os.access(potential_path, os.X_OK):
-                return potential_path
-        
-        return None
+        return self.path_cache.lookup(executable_file_name)
+
+
+    def spawn_external(self, cmd_name: str, args: list[str], stdin=None, stdout=None, stderr=None):
+        """
+        Starts an external program without waiting for it to finish.
+
+        stdin / stdout / stderr may be file descriptors (e.g. the ends of an
+        os.pipe() or redirect files) or file objects, None means the child
+        inherits the shell's own stream.
+        Returns the started process (SpawnedProcess or subprocess.Popen), None
+        if the program is not found in PATH.
+        """
+        executable_path = self._find_executable_in_path(cmd_name)
 
+        if executable_path is None:
+            return None
 
-    def cmd_exit(self, *_) -> Tuple[int, Optional[str], bool]:
-        """Exits the program"""
-        print("Exiting shell.")
-        return (self.STATUS_CODE_SUCCESS, None, self.SHOULD_EXIT)
+        return self._spawn(executable_path, args, stdin=stdin, stdout=stdout, stderr=stderr)
+
+
+    def _spawn(self, executable_path: str, args: list[str], stdin=None, stdout=None, stderr=None):
+        """
+        Starts the executable with the given streams, see spawn_external.
+        Uses os.posix_spawn with dup2 file actions for redirections and pipes,
+        subprocess.Popen only without posix_spawn or for captured output (PIPE).
+        """
+        return spawn_process(executable_path, args, stdin=stdin, stdout=stdout, stderr=stderr, use_posix_spawn=self.USE_POSIX_SPAWN)
+
+
+    def _read_bounded(self, stream) -> str:
+        """
+        Reads a child's output in CAPTURE_CHUNK_SIZE chunks, keeping at most
+        CAPTURE_LIMIT_BYTES. The rest is still drained (so the child never blocks
+        on a full pipe) but discarded.
+        """
+        chunks: list[bytes] = []
+        kept_bytes = 0
+        truncated = False
+
+        while True:
+            chunk = stream.read(self.CAPTURE_CHUNK_SIZE)
+
+            if not chunk:
+                break
+
+            if kept_bytes < self.CAPTURE_LIMIT_BYTES:
+                chunk = chunk[:self.CAPTURE_LIMIT_BYTES - kept_bytes]
+                chunks.append(chunk)
+                kept_bytes += len(chunk)
+            else:
+                truncated = True
+
+        output = b"".join(chunks).decode(errors="replace").strip()
+
+        if truncated:
+            output += f"\n[output truncated after {self.CAPTURE_LIMIT_BYTES} bytes]"
+
+        return output
+
+
+    def cmd_exit(self, cmd: str, args: list[str]) -> Tuple[int, Optional[str], bool]:
+        """Exits the program with the status of the last command, `exit n` with status n"""
+
+        status_code = self.last_status_code
+
+        if args:
+            try:
+                status_code = int(args[0]) & 0xFF
+            except ValueError:
+                error_output = f"shell: execution error for {cmd}: {args[0]}: numeric argument required"
+                return (2, error_output, self.SHOULD_EXIT)
+
+        if len(args) > 1:
+            # Rejected, the shell keeps running (as an interactive bash does)
+            return (1, f"shell: execution error for {cmd}: too many arguments", self.SHOULD_NOT_EXIT)
+
+        if self.interactive:
+            print("Exiting shell.")
+
+        return (status_code, None, self.SHOULD_EXIT)
 
 
     def cmd_echo(self, _cmd: str, args: list[str]) -> Tuple[int, Optional[str], bool]:
@@ -163,12 +394,90 @@ class ShellBuiltins:
             return (self.STATUS_CODE_FAILED, error_message, self.SHOULD_NOT_EXIT)
 
 
-    def cmd_cat(self, cmd: str, args: list[str]) -> Tuple[int, Optional[str], bool]:
+    def _copy_stream(self, source: BinaryIO, target: BinaryIO) -> None:
         """
-        
+        Copies source to target without building the content in Python:
+            1. os.sendfile: the kernel copies a regular file straight into the
+               target fd (file, pipe or terminal), nothing passes through user space.
+            2. mmap: where sendfile is not available, the file is mapped and
+               written in CAT_CHUNK_SIZE slices (memoryview, no copies).
+            3. readinto a reused buffer for pipes, terminals and other streams.
         """
-        # TO IMPLEMENT
-        pass
+        target.flush()
+        source_fd = source.fileno()
+        target_fd = target.fileno()
+        source_stat = os.fstat(source_fd)
+
+        if not stat.S_ISREG(source_stat.st_mode):
+            buffer = bytearray(self.CAT_CHUNK_SIZE)
+            view = memoryview(buffer)
+            while True:
+                read_bytes = source.readinto(buffer)
+                if not read_bytes:
+                    break
+                target.write(view[:read_bytes])
+            target.flush()
+            return
+
+        offset = 0
+
+        if hasattr(os, "sendfile"):
+            try:
+                while True:
+                    sent = os.sendfile(target_fd, source_fd, offset, self.CAT_CHUNK_SIZE)
+                    if sent == 0:
+                        return
+                    offset += sent
+
+            except OSError as e:
+                # Target fd type not supported by sendfile, continue with mmap
+                if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK, errno.EOPNOTSUPP):
+                    raise
+
+        size = os.fstat(source_fd).st_size
+
+        if size <= offset:
+            return
+
+        with mmap.mmap(source_fd, 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                while offset < size:
+                    target.write(view[offset:offset + self.CAT_CHUNK_SIZE])
+                    offset += self.CAT_CHUNK_SIZE
+
+        target.flush()
+
+
+    @stream_handler
+    def cmd_cat(self, cmd: str, args: list[str], stdin: BinaryIO = None, stdout: BinaryIO = None) -> Tuple[int, Optional[str], bool]:
+        """
+        Concatenates files (or stdin for no arguments / '-') to stdout.
+        Memory use is constant, see _copy_stream for how the data is copied.
+        """
+        stdin = stdin if stdin is not None else sys.stdin.buffer
+        stdout = stdout if stdout is not None else sys.stdout.buffer
+
+        status_code = self.STATUS_CODE_SUCCESS
+        errors = []
+
+        for file_name in args or ["-"]:
+            try:
+                if file_name == "-":
+                    self._copy_stream(stdin, stdout)
+                    continue
+
+                with open(file_name, "rb") as source:
+                    self._copy_stream(source, stdout)
+
+            except BrokenPipeError:
+                # Reader went away (e.g. `cat big.log | head`), stop quietly like SIGPIPE
+                return (self.STATUS_CODE_FAILED, None, self.SHOULD_NOT_EXIT)
+
+            except OSError as e:
+                errors.append(f"{cmd}: {file_name}: {e.strerror}")
+                status_code = self.STATUS_CODE_FAILED
+
+        return (status_code, "\n".join(errors) if errors else None, self.SHOULD_NOT_EXIT)
 
 
     def cmd_clear(self, _cmd: str, _args: list[str]) -> Tuple[int, Optional[str], bool]:
@@ -176,70 +485,291 @@ class ShellBuiltins:
         Handles cleaning user terminal from all commands and outputs
         """
 
+        sys.stdout.flush()
         os.system("cls" if os.name == "nt" else "clear")
         return (self.STATUS_CODE_SUCCESS, None, self.SHOULD_NOT_EXIT)
     
 
-    def cmd_mkdir(self, _cmd: str, args: list[str]) -> Tuple[int, Optional[str], bool]:
+    @stream_handler
+    def cmd_mkdir(self, cmd: str, args: list[str], stdin: BinaryIO = None, stdout: BinaryIO = None) -> Tuple[int, Optional[str], bool]:
+        """ Creates directories, -p with their parents """
+        return self._run_coreutil(cmd, args, stdin, stdout)
+
+
+    @stream_handler
+    def cmd_rmdir(self, cmd: str, args: list[str], stdin: BinaryIO = None, stdout: BinaryIO = None) -> Tuple[int, Optional[str], bool]:
+        """ Removes empty directories, -p with their parents """
+        return self._run_coreutil(cmd, args, stdin, stdout)
+
+
+    @stream_handler
+    def cmd_touch(self, cmd: str, args: list[str], stdin: BinaryIO = None, stdout: BinaryIO = None) -> Tuple[int, Optional[str], bool]:
+        """ Creates files or sets their times to now (-c: only existing files) """
+        return self._run_coreutil(cmd, args, stdin, stdout)
+
+
+    @stream_handler
+    def cmd_rm(self, cmd: str, args: list[str], stdin: BinaryIO = None, stdout: BinaryIO = None) -> Tuple[int, Optional[str], bool]:
+        """ Deletes files, -r directory trees (on a thread pool), -f ignores missing files """
+        return self._run_coreutil(cmd, args, stdin, stdout)
+
+
+    @stream_handler
+    def cmd_find(self, cmd: str, args: list[str], stdin: BinaryIO = None, stdout: BinaryIO = None) -> Tuple[int, Optional[str], bool]:
+        """ Walks directory trees in parallel, -name -iname -type -size -mtime -mmin -newer tests, -print -print0 -quit """
+        return self._run_coreutil(cmd, args, stdin, stdout)
+
+
+    @stream_handler
+    def cmd_du(self, cmd: str, args: list[str], stdin: BinaryIO = None, stdout: BinaryIO = None) -> Tuple[int, Optional[str], bool]:
+        """ Disk usage of directory trees, walked in parallel (-s -a -h -k -b -c -x -d N) """
+        return self._run_coreutil(cmd, args, stdin, stdout)
+
+
+    def cmd_hash(self, cmd: str, args: list[str]) -> Tuple[int, Output, bool]:
         """
-        Creates new directory
+        Shows or updates the table of remembered command locations:
+            - hash:         lists remembered commands with their hit counts
+            - hash -r:      forgets all remembered locations
+            - hash name...: searches PATH for the names and remembers them
         """
 
-        folder_name = args[0]
-        os.mkdir(folder_name)
+        if not args:
+            entries = self.path_cache.entries()
+
+            if not entries:
+                return (self.STATUS_CODE_SUCCESS, "hash: hash table empty", self.SHOULD_NOT_EXIT)
+
+            return (self.STATUS_CODE_SUCCESS, self._hash_lines(entries), self.SHOULD_NOT_EXIT)
+
+        if args[0] == "-r":
+            self.path_cache.clear()
+            return (self.STATUS_CODE_SUCCESS, None, self.SHOULD_NOT_EXIT)
+
+        errors = []
+
+        for name in args:
+            self.path_cache.forget(name)
+
+            if self.path_cache.lookup(name) is None:
+                errors.append(f"{cmd}: {name}: not found")
+
+        if errors:
+            return (self.STATUS_CODE_FAILED, "\n".join(errors), self.SHOULD_NOT_EXIT)
 
         return (self.STATUS_CODE_SUCCESS, None, self.SHOULD_NOT_EXIT)
 
 
-    def cmd_rmdir(self, cmd, args) -> Tuple[int, Optional[str], bool]:
+    def _hash_lines(self, entries: list[tuple[int, str]]) -> Iterator[str]:
+        """ Output of `hash`, line by line """
+
+        yield "hits\tcommand\n"
+
+        for hits, path in entries:
+            yield f"{hits:4}\t{path}\n"
+
+        yield f"lookups: {self.path_cache.hits} hits, {self.path_cache.misses} misses\n"
+
+
+    def cmd_jobs(self, _cmd: str, _args: list[str]) -> Tuple[int, Output, bool]:
+        """ Lists background jobs and their state """
+        return (self.STATUS_CODE_SUCCESS, self._jobs_lines(), self.SHOULD_NOT_EXIT)
+
+
+    def _jobs_lines(self) -> Iterator[str]:
+        """ Output of `jobs`, a job is polled when its line is written. Finished jobs are reported once. """
+
+        for job in self.job_table.jobs():
+            marker = self.job_table.marker(job)
+
+            if job.poll() is None:
+                yield f"[{job.job_id}]{marker}  {'Running':<24}{job.command_line} &\n"
+                continue
+
+            state = "Done" if job.status_code == 0 else f"Exit {job.status_code}"
+            self.job_table.remove(job)
+            yield f"[{job.job_id}]{marker}  {state:<24}{job.command_line}\n"
+
+
+    def cmd_wait(self, cmd: str, args: list[str]) -> Tuple[int, Optional[str], bool]:
         """
-        Removes directory
+        Waits for background jobs:
+            - wait:       waits for every job, status 0
+            - wait %n|n:  waits for job n and returns its status
         """
 
-        try:
-            folder_name = args[0]
-            os.rmdir(folder_name)
+        # Output printed before the jobs were started must not come after theirs
+        sys.stdout.flush()
 
+        if not args:
+            for job in self.job_table.jobs():
+                job.wait()
+                self.job_table.remove(job)
             return (self.STATUS_CODE_SUCCESS, None, self.SHOULD_NOT_EXIT)
 
-        except Exception as e:
-            error_output = f"shell: execution error for {cmd}: {e}"
+        status_code = self.STATUS_CODE_SUCCESS
+        errors = []
+
+        for job_spec in args:
+            job = self.job_table.get(job_spec)
+
+            if job is None:
+                errors.append(f"{cmd}: {job_spec}: no such job")
+                status_code = self.COMMAND_NOT_FOUND_EXIT_FLAG
+                continue
+
+            status_code = job.wait()
+            self.job_table.remove(job)
+
+        return (status_code, "\n".join(errors) if errors else None, self.SHOULD_NOT_EXIT)
+
+
+    def cmd_fg(self, cmd: str, args: list[str]) -> Tuple[int, Optional[str], bool]:
+        """
+        Brings job n (default: the most recent one) to the foreground and waits for it.
+        There is no terminal job control, the job keeps reading from /dev/null.
+        """
+
+        job = self.job_table.get(args[0] if args else None)
+
+        if job is None:
+            error_output = f"{cmd}: {args[0] if args else 'current'}: no such job"
             return (self.STATUS_CODE_FAILED, error_output, self.SHOULD_NOT_EXIT)
-        
 
-    def cmd_touch(self, cmd: str, args: list[str]) -> Tuple[int, Optional[str], bool]:
+        # Show which job is waited for before blocking, like bash
+        print(job.command_line)
+        sys.stdout.flush()
+
+        status_code = job.wait()
+        self.job_table.remove(job)
+
+        return (status_code, None, self.SHOULD_NOT_EXIT)
+
+
+    def cmd_stats(self, cmd: str, args: list[str]) -> Tuple[int, Optional[str], bool]:
         """
-        Creates a file
+        Per-command resource table:
+            - stats:         wall / CPU time and max RSS of recorded commands, slowest first
+            - stats -r:      clears the table
+            - stats on|off:  records every command, not only the ones run with `time`
         """
-        try:
-            open(args[0], "w").close()
+
+        if not args:
+            return (self.STATUS_CODE_SUCCESS, self.stats.format_table(), self.SHOULD_NOT_EXIT)
+
+        if len(args) == 1 and args[0] == "-r":
+            self.stats.clear()
             return (self.STATUS_CODE_SUCCESS, None, self.SHOULD_NOT_EXIT)
 
-        except Exception as e:
-            error_output = f"shell: execution error for {cmd}: {e}"
-            return (self.STATUS_CODE_FAILED, error_output, self.SHOULD_NOT_EXIT)
-        
+        if len(args) == 1 and args[0] in ("on", "off"):
+            self.stats.always_on = args[0] == "on"
+            return (self.STATUS_CODE_SUCCESS, None, self.SHOULD_NOT_EXIT)
 
-    def cmd_rm(self, cmd: str, args: list[str]) -> Tuple[int, Optional[str], bool]:
+        error_output = f"{cmd}: usage: {cmd} [-r | on | off]"
+        return (self.STATUS_CODE_FAILED, error_output, self.SHOULD_NOT_EXIT)
+
+
+    @stream_handler
+    def cmd_history(self, cmd: str, args: list[str], stdin: BinaryIO = None, stdout: BinaryIO = None) -> Tuple[int, Optional[str], bool]:
         """
-        Deletes a file
+        Command history shared by all sessions:
+            - history:          lists every entry with its number
+            - history n:        lists the last n entries
+            - history -s TEXT:  distinct commands containing TEXT, most recent first
+            - history -c:       compacts the history file
         """
+        stdout = stdout if stdout is not None else sys.stdout.buffer
 
-        try:
-            os.remove(args[0])
+        if len(args) == 1 and args[0] == "-c":
+            self.history.compact()
             return (self.STATUS_CODE_SUCCESS, None, self.SHOULD_NOT_EXIT)
 
-        except Exception as e:
-            error_output = f"shell: execution error for {cmd}: {e}"
+        if len(args) >= 2 and args[0] == "-s":
+            numbered = self.history.iter_search(" ".join(args[1:]))
+
+        elif not args or (len(args) == 1 and args[0].isdigit()):
+            entries = self.history.entries()
+            first = max(len(entries) - int(args[0]), 0) if args else 0
+            numbered = ((number, entries[number - 1]) for number in range(first + 1, len(entries) + 1))
+
+        else:
+            error_output = f"{cmd}: usage: {cmd} [n | -s TEXT | -c]"
             return (self.STATUS_CODE_FAILED, error_output, self.SHOULD_NOT_EXIT)
 
+        try:
+            for number, line in numbered:
+                stdout.write(f"{number:>5}  {line}\n".encode(errors="surrogateescape"))
+            stdout.flush()
+
+        except BrokenPipeError:
+            # `history | head`
+            return (self.STATUS_CODE_FAILED, None, self.SHOULD_NOT_EXIT)
+
+        return (self.STATUS_CODE_SUCCESS, None, self.SHOULD_NOT_EXIT)
+
+
+    def _run_coreutil(self, cmd: str, args: list[str], stdin: BinaryIO, stdout: BinaryIO) -> Tuple[int, Optional[str], bool]:
+        """ Runs a native coreutil, the real program when prefers_external says so """
+        stdin = stdin if stdin is not None else sys.stdin.buffer
+        stdout = stdout if stdout is not None else sys.stdout.buffer
+
+        options = self.coreutils.parse(cmd, args) if self.USE_NATIVE_COREUTILS else None
+
+        if options is None:
+            # The executor starts the program itself, this is for direct calls
+            stdout.flush()
+            return self.cmd_not_found(cmd, args, stdin=stdin, stdout=stdout)
+
+        try:
+            status_code, error_text = self.coreutils.run(cmd, options, stdin, stdout)
+            stdout.flush()
+
+        except BrokenPipeError:
+            # `grep x big.log | head`
+            return (self.STATUS_CODE_FAILED, None, self.SHOULD_NOT_EXIT)
 
-    def cmd_net(self, cmd: str, args: list[str]) -> Tuple[int, Optional[str], bool]:
+        return (status_code, error_text, self.SHOULD_NOT_EXIT)
+
+
+    @stream_handler
+    def cmd_ls(self, cmd: str, args: list[str], stdin: BinaryIO = None, stdout: BinaryIO = None) -> Tuple[int, Optional[str], bool]:
+        """ Lists directories one name per line (-1 -a -A -d -r -t -p -F), the real ls for a terminal or other options """
+        return self._run_coreutil(cmd, args, stdin, stdout)
+
+
+    @stream_handler
+    def cmd_wc(self, cmd: str, args: list[str], stdin: BinaryIO = None, stdout: BinaryIO = None) -> Tuple[int, Optional[str], bool]:
+        """ Counts lines, words and bytes (-l -w -c) """
+        return self._run_coreutil(cmd, args, stdin, stdout)
+
+
+    @stream_handler
+    def cmd_head(self, cmd: str, args: list[str], stdin: BinaryIO = None, stdout: BinaryIO = None) -> Tuple[int, Optional[str], bool]:
+        """ First lines / bytes of files (-n N, -N, -c N, -q, -v) """
+        return self._run_coreutil(cmd, args, stdin, stdout)
+
+
+    @stream_handler
+    def cmd_tail(self, cmd: str, args: list[str], stdin: BinaryIO = None, stdout: BinaryIO = None) -> Tuple[int, Optional[str], bool]:
+        """ Last lines / bytes of files (-n N, -n +N, -N, -c N, -q, -v), -f runs the real tail """
+        return self._run_coreutil(cmd, args, stdin, stdout)
+
+
+    @stream_handler
+    def cmd_grep(self, cmd: str, args: list[str], stdin: BinaryIO = None, stdout: BinaryIO = None) -> Tuple[int, Optional[str], bool]:
+        """ Prints lines matching a pattern (-i -v -c -n -l -q -s -h -H -o -w -x -F -E -G -e -m) """
+        return self._run_coreutil(cmd, args, stdin, stdout)
+
+
+    @stream_handler
+    def cmd_net(self, cmd: str, args: list[str], stdin: BinaryIO = None, stdout: BinaryIO = None) -> Tuple[int, Optional[str], bool]:
         """
         Custom network scanner that handles:
-            - getip: 
-            - scanports: 
+            - getip:     net getip <domain> [<domain> ...] [-f FILE]  ('-f -' reads the names from stdin)
+            - scanports: net scanports <host> [-p PORTS] [-t TIMEOUT] [-c CONCURRENCY] [-r RATE]
         """
+        stdin = stdin if stdin is not None else sys.stdin.buffer
+        stdout = stdout if stdout is not None else sys.stdout.buffer
 
         if len(args) == 0:
             error_output = f"shell: execution error for: {cmd}: You have to specify arguments"
@@ -248,27 +778,44 @@ class ShellBuiltins:
         if args[0] not in self.NET_COMMANDS.keys():
             error_output = f"shell: execution error for {cmd}: {args[0]} is not supported in the net command"
             return (self.STATUS_CODE_FAILED, error_output, self.SHOULD_NOT_EXIT)
-        
-        ## AF_INET     ->  Address Family
-        ## SOCK_STREAM ->  TPC Protocol
-        ## SOCK_DGRAM  ->  UDP Protocol
-        s: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
-        command_function: function = self.NET_COMMANDS[args[0]]
-        results: Tuple[int, str] = command_function(domain=args[1], s=s)
+        command_function = getattr(self.shell_utils, self.NET_COMMANDS[args[0]])
+
+        if args[0] == "getip":
+            # Names of `-f -` come from the command's stdin (a pipe, a redirect), not the shell's
+            results: Tuple[int, str, str] = command_function(args[1:], stdin=stdin)
+        else:
+            # Open ports are printed while the sweep goes on, the summary comes last
+            def report_open_port(port: int) -> None:
+                stdout.write(f"{port}/tcp open\n".encode())
+                stdout.flush()
+
+            results = command_function(args[1:], on_open=report_open_port)
 
-        net_result_status_code: int = results[0]
-        net_result_message: str = results[1]
+        net_result_status_code, net_result_message, net_result_errors = results
 
-        status_code: int = self.STATUS_CODE_SUCCESS if net_result_status_code == 1 else self.STATUS_CODE_FAILED
+        # ShellUtils returns 0 on success, same as the shell
+        status_code: int = self.STATUS_CODE_SUCCESS if net_result_status_code == 0 else self.STATUS_CODE_FAILED
 
-        return(status_code, net_result_message, self.SHOULD_NOT_EXIT) 
+        try:
+            write_output(net_result_message, stdout)
+            stdout.flush()
+        except BrokenPipeError:
+            return (self.STATUS_CODE_FAILED, net_result_errors or None, self.SHOULD_NOT_EXIT)
+
+        # Returned text of a stream handler goes to stderr
+        return (status_code, net_result_errors or None, self.SHOULD_NOT_EXIT)
 
 
-    def cmd_not_found(self, cmd_name: str, args: list[str]) -> Tuple[int, Optional[str], bool]:
+    def cmd_not_found(self, cmd_name: str, args: list[str], stdout=None, capture: bool = False, stdin=None, stderr=None) -> Tuple[int, Optional[str], bool]:
         """
         Handler for unknown commands. Attempts to find and execute the command as
         an external program via subprocess.
+
+        By default the output is streamed: the child writes directly to stdout
+        (the terminal, or the file / fd passed as stdout) while it runs, and
+        OUTPUT_TEXT is None. stdin / stderr work the same way. With capture=True stdout and stderr are collected
+        into OUTPUT_TEXT, bounded by CAPTURE_LIMIT_BYTES.
         """
 
         executable_path = self._find_executable_in_path(cmd_name)
@@ -280,25 +827,26 @@ class ShellBuiltins:
         
         # Command found, execute it
         try:
-            # subprocess.run executes the command.
-            # capture_output=True captures stdout and stderr.
-            # text=True decodes stdout/stderr as text.
+            if not capture:
+                # Streaming mode, nothing passes through the shell's memory
+                process = self._spawn(executable_path, args, stdin=stdin, stdout=stdout, stderr=stderr)
+                self.stats.record_child(wait_child(process))
+                return (process.returncode, None, self.SHOULD_NOT_EXIT)
 
-            result = subprocess.run(
-                [executable_path, *args], 
-                capture_output=True, 
-                text=True,
-                check=False # Do not raise CalledProcessError for non-zero exit codes
-            )
+            # Capture mode, stderr is merged into stdout like before and read in chunks
+            import subprocess # only needed for captured output, kept off the startup path
+            process = self._spawn(executable_path, args, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
 
-            # Combine stdout and stderr for the output buffer
-            output = (result.stdout + result.stderr).strip()
+            with process.stdout:
+                output = self._read_bounded(process.stdout)
+
+            self.stats.record_child(wait_child(process))
 
             # Return the external command's return code and use constant for exit flag
-            return (result.returncode, output, self.SHOULD_NOT_EXIT)
+            return (process.returncode, output, self.SHOULD_NOT_EXIT)
         
         except Exception as e:
             # Catch execution errors (e.g., permission denied)
             error_output = f"shell: execution error for {cmd_name}: {e}"
             # Use constant for failure code and exit flag
-            return (self.STATUS_CODE_FAILED, error_output, self.SHOULD_NOT_EXIT)
\ No newline at end of file
+            return (self.STATUS_CODE_FAILED, error_output, self.SHOULD_NOT_EXIT)
@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import socket
+import struct
+from typing import Callable, Optional
+
+# --- PROTOCOL ---
+# Both directions carry frames: 1 byte kind + 4 byte big-endian payload length.
+#
+#   client -> server   REQUEST  {"line": "...", "cwd": "..."}
+#                               with the client's stdin / stdout / stderr attached
+#                               (SCM_RIGHTS) the command runs on them directly,
+#                               otherwise its output comes back in frames
+#   server -> client   STDOUT / STDERR  captured output, raw bytes
+#                      STATUS   {"status": n, "exit": bool}, ends the request
+FRAME_HEADER = struct.Struct("!cI")
+REQUEST = b"R"
+STDOUT = b"O"
+STDERR = b"E"
+STATUS = b"S"
+
+RECEIVE_SIZE = 64 * 1024
+
+def default_socket_path() -> str:
+    """ $SHELL_SERVER_SOCKET, else a per-user socket in $XDG_RUNTIME_DIR or /tmp """
+
+    path = os.environ.get("SHELL_SERVER_SOCKET")
+    if path:
+        return path
+
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "pyshell.sock")
+
+    return f"/tmp/pyshell-{os.getuid()}.sock"
+
+def encode_frame(kind: bytes, payload: bytes) -> bytes:
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
+
+def pop_frame(buffer: bytearray) -> Optional[tuple[bytes, bytes]]:
+    """ Removes the first complete frame from buffer, None if it is not all there yet """
+
+    if len(buffer) < FRAME_HEADER.size:
+        return None
+
+    kind, length = FRAME_HEADER.unpack_from(buffer)
+    end = FRAME_HEADER.size + length
+
+    if len(buffer) < end:
+        return None
+
+    payload = bytes(buffer[FRAME_HEADER.size:end])
+    del buffer[:end]
+    return kind, payload
+
+class ShellClient:
+    """
+    Client of a running shell server (shell_server.py).
+
+    It only needs the standard socket module, so a wrapper that runs many
+    commands pays one round-trip per command line instead of starting a new
+    interpreter and shell each time.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None):
+        self.socket_path = socket_path or default_socket_path()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._buffer = bytearray()
+
+        try:
+            self.sock.connect(self.socket_path)
+        except OSError:
+            self.sock.close()
+            raise
+
+    def close(self) -> None:
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _read_frame(self) -> tuple[bytes, bytes]:
+        while True:
+            frame = pop_frame(self._buffer)
+            if frame is not None:
+                return frame
+
+            chunk = self.sock.recv(RECEIVE_SIZE)
+            if not chunk:
+                raise ConnectionError("shell server closed the connection")
+            self._buffer += chunk
+
+    def _request(self, line: str, fds: Optional[tuple[int, int, int]], on_output: Optional[Callable[[bytes, bytes], None]]) -> tuple[int, bool]:
+        payload = json.dumps({"line": line, "cwd": os.getcwd()}).encode()
+        frame = encode_frame(REQUEST, payload)
+
+        if fds is None:
+            self.sock.sendall(frame)
+        else:
+            sent = socket.send_fds(self.sock, [frame], list(fds))
+            if sent < len(frame):
+                self.sock.sendall(frame[sent:])
+
+        while True:
+            kind, payload = self._read_frame()
+
+            if kind == STATUS:
+                result = json.loads(payload)
+                return (result["status"], result["exit"])
+
+            if on_output is not None:
+                on_output(kind, payload)
+
+    def run(self, line: str, stdin: int = 0, stdout: int = 1, stderr: int = 2) -> tuple[int, bool]:
+        """
+        Runs the line on the given fds (by default this process' own terminal):
+        they are passed to the server, so its output never goes through the socket.
+
+        Returns:
+            (status_code, should_exit)
+        """
+        return self._request(line, (stdin, stdout, stderr), None)
+
+    def capture(self, line: str, on_output: Optional[Callable[[bytes, bytes], None]] = None) -> tuple[int, bytes, bytes]:
+        """
+        Runs the line with stdin from /dev/null and its output sent back over the
+        socket. on_output(kind, data) gets every chunk as it arrives (kind is
+        STDOUT or STDERR), otherwise both streams are collected.
+
+        Returns:
+            (status_code, stdout, stderr)
+        """
+
+        output = {STDOUT: bytearray(), STDERR: bytearray()}
+
+        def collect(kind: bytes, data: bytes) -> None:
+            output[kind] += data
+
+        status_code, _ = self._request(line, None, on_output or collect)
+        return (status_code, bytes(output[STDOUT]), bytes(output[STDERR]))
+
+def _write_output(kind: bytes, data: bytes) -> None:
+    stream = sys.stdout.buffer if kind == STDOUT else sys.stderr.buffer
+    stream.write(data)
+    stream.flush()
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Entry point:
+        shell_client.py [-s SOCKET] [--capture] -c "commands"
+        shell_client.py [-s SOCKET] [--capture] script.sh
+
+    Every line is one request, like in a batch shell the last status (or `exit n`)
+    is the exit status. With --capture the output travels over the socket
+    instead of passing the terminal to the server.
+    """
+
+    argv = sys.argv[1:] if argv is None else argv
+    socket_path: Optional[str] = None
+    capture = False
+    lines: Optional[list[str]] = None
+    index = 0
+
+    # Parsed by hand, the client has to start as fast as possible
+    while index < len(argv):
+        arg = argv[index]
+
+        if arg in ("-s", "-c") and index + 1 < len(argv):
+            if arg == "-s":
+                socket_path = argv[index + 1]
+            else:
+                lines = argv[index + 1].splitlines()
+            index += 1
+        elif arg == "--capture":
+            capture = True
+        elif not arg.startswith("-") and lines is None:
+            try:
+                with open(arg) as script_file:
+                    lines = script_file.read().splitlines()
+            except OSError as e:
+                sys.stderr.write(f"shell_client: {arg}: {e.strerror}\n")
+                return 127
+        else:
+            sys.stderr.write(main.__doc__)
+            return 2
+
+        index += 1
+
+    if lines is None:
+        sys.stderr.write(main.__doc__)
+        return 2
+
+    try:
+        client = ShellClient(socket_path)
+    except OSError as e:
+        sys.stderr.write(f"shell_client: cannot connect to {socket_path or default_socket_path()}: {e.strerror}\n")
+        return 1
+
+    status_code = 0
+
+    with client:
+        for line in lines:
+            line = line.strip()
+
+            if not line:
+                continue
+
+            if capture:
+                status_code, should_exit = client._request(line, None, _write_output)
+            else:
+                status_code, should_exit = client.run(line)
+
+            if should_exit:
+                break
+
+    return status_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+import os
+import re
+import threading
+from typing import Iterable, Optional
+
+try:
+    import readline # GNU readline / libedit, missing on Windows
+except ImportError:
+    readline = None
+
+# Characters that end a word for readline: a path like src/a-b.c is one word
+COMPLETER_DELIMITERS = " \t\n;|&<>()"
+
+# Operators after which a new command starts
+_COMMAND_SEPARATOR_RE = re.compile(r"[|&;({]")
+
+# Characters that need a backslash when a completed name is inserted into the line
+_SPECIAL_CHARACTERS = frozenset(" \t\\'\";|&<>()*?[$")
+
+def escape_word(name: str) -> str:
+    """ 'my file' -> 'my\\ file', so the tokenizer reads the completion back as one word """
+    return "".join("\\" + character if character in _SPECIAL_CHARACTERS else character for character in name)
+
+class _TrieNode:
+    __slots__ = ("children", "is_word", "words")
+
+    def __init__(self):
+        self.children: dict[str, "_TrieNode"] = {}
+        self.is_word: bool = False
+        self.words: Optional[tuple[str, ...]] = None # sorted words below this node, None when stale
+
+class CommandTrie:
+    """
+    Prefix trie of command names.
+
+    Every node caches the sorted tuple of the words below it. Adding or removing
+    a word only invalidates the nodes on its path, and a stale node is rebuilt
+    by joining the cached tuples of its children, so listing the completions of
+    a prefix costs a walk down the prefix plus at most one tuple join per
+    changed level, even right after PATH changed.
+    """
+
+    def __init__(self):
+        self._root = _TrieNode()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, word: str) -> None:
+        node = self._root
+        node.words = None
+
+        for character in word:
+            child = node.children.get(character)
+            if child is None:
+                child = node.children[character] = _TrieNode()
+            node = child
+            node.words = None
+
+        if not node.is_word:
+            node.is_word = True
+            self._size += 1
+
+    def remove(self, word: str) -> None:
+        path = [self._root]
+
+        for character in word:
+            node = path[-1].children.get(character)
+            if node is None:
+                return
+            path.append(node)
+
+        if not path[-1].is_word:
+            return
+
+        path[-1].is_word = False
+        self._size -= 1
+
+        for node in path:
+            node.words = None
+
+        # Drop the nodes that no longer lead to a word
+        for depth in range(len(word), 0, -1):
+            node = path[depth]
+            if node.is_word or node.children:
+                break
+            del path[depth - 1].children[word[depth - 1]]
+
+    def _words(self, node: _TrieNode, prefix: str) -> tuple[str, ...]:
+        if node.words is None:
+            words = [prefix] if node.is_word else []
+            for character in sorted(node.children):
+                words.extend(self._words(node.children[character], prefix + character))
+            node.words = tuple(words)
+
+        return node.words
+
+    def complete(self, prefix: str) -> tuple[str, ...]:
+        """ Every word starting with prefix, sorted """
+
+        node = self._root
+
+        for character in prefix:
+            node = node.children.get(character)
+            if node is None:
+                return ()
+
+        return self._words(node, prefix)
+
+class ShellCompleter:
+    """
+    Tab completion of command names and file paths.
+
+    Command names are the builtins plus every executable on PATH, kept in a
+    CommandTrie. Each PATH directory is listed once; on every completion the
+    directories are checked with one stat each, and only a directory whose
+    mtime changed is listed again and its difference applied to the trie.
+    A name found in several directories is counted, so it stays in the trie
+    until the last of them loses it.
+
+    The first listing of PATH is done by warm_up on a background thread while
+    the shell waits for input, so the first Tab does not pay for it.
+
+    File names come from the listing cache of ShellGlob, which is also
+    invalidated by directory mtime.
+    """
+
+    def __init__(self, builtin_names: Iterable[str], glob):
+        self.glob = glob
+
+        self.trie = CommandTrie()
+        self._name_counts: dict[str, int] = {}
+        self._directories: dict[str, tuple[Optional[int], frozenset]] = {} # PATH dir -> (mtime_ns, executables)
+        self._path_value: Optional[str] = None
+        self._lock = threading.Lock() # warm_up runs on its own thread
+
+        self._add_names(builtin_names)
+
+        # Matches of the completion in progress, readline asks for them one by one
+        self._matches: list[str] = []
+
+    # ----------------------
+    # Command names
+    # ----------------------
+
+    def _add_names(self, names: Iterable[str]) -> None:
+        for name in names:
+            count = self._name_counts.get(name, 0)
+            if count == 0:
+                self.trie.add(name)
+            self._name_counts[name] = count + 1
+
+    def _remove_names(self, names: Iterable[str]) -> None:
+        for name in names:
+            count = self._name_counts[name] - 1
+            if count == 0:
+                del self._name_counts[name]
+                self.trie.remove(name)
+            else:
+                self._name_counts[name] = count
+
+    @staticmethod
+    def _list_executables(directory: str, known: frozenset) -> frozenset:
+        """
+        Executables in directory. Names already known are kept without another
+        access() call: chmod does not change the directory's mtime, so they are
+        as fresh as before and only new names need checking.
+        """
+
+        names = []
+
+        try:
+            with os.scandir(directory) as scanner:
+                for entry in scanner:
+                    if entry.name in known:
+                        names.append(entry.name)
+                        continue
+                    try:
+                        if entry.is_file() and os.access(entry.path, os.X_OK):
+                            names.append(entry.name)
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+
+        return frozenset(names)
+
+    def refresh(self) -> None:
+        """ Applies PATH changes and changed PATH directories to the trie """
+
+        path_value = os.environ.get("PATH", "")
+        path_dirs = dict.fromkeys(directory for directory in path_value.split(os.pathsep) if directory)
+
+        if path_value != self._path_value:
+            self._path_value = path_value
+
+            for directory in list(self._directories):
+                if directory not in path_dirs:
+                    self._remove_names(self._directories.pop(directory)[1])
+
+        for directory in path_dirs:
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                mtime_ns = None
+
+            known = self._directories.get(directory)
+
+            if known is not None and known[0] == mtime_ns:
+                continue
+
+            old_executables = known[1] if known is not None else frozenset()
+            executables = self._list_executables(directory, old_executables) if mtime_ns is not None else frozenset()
+
+            self._remove_names(old_executables - executables)
+            self._add_names(executables - old_executables)
+            self._directories[directory] = (mtime_ns, executables)
+
+    def complete_command(self, prefix: str) -> list[str]:
+        with self._lock:
+            self.refresh()
+            return list(self.trie.complete(prefix))
+
+    def warm_up(self) -> None:
+        """ Lists PATH and fills the cached word lists of the trie """
+        self.complete_command("")
+
+    # ----------------------
+    # File paths
+    # ----------------------
+
+    def complete_path(self, text: str) -> list[str]:
+        """ Paths starting with text, directories with a trailing '/'. ~ is kept as typed. """
+
+        directory_part, _, name_prefix = text.rpartition("/")
+
+        if text.startswith("/") and not directory_part:
+            directory_part = "/"
+
+        directory = os.path.expanduser(directory_part) if directory_part else "."
+        written_prefix = "" if not directory_part else directory_part.rstrip("/") + "/"
+        show_hidden = name_prefix.startswith(".")
+
+        matches = []
+
+        for name, is_dir, is_symlink in self.glob.list_directory(directory):
+            if not name.startswith(name_prefix) or (name[0] == "." and not show_hidden):
+                continue
+
+            if is_symlink and not is_dir:
+                is_dir = os.path.isdir(os.path.join(directory, name))
+
+            matches.append(written_prefix + escape_word(name) + ("/" if is_dir else ""))
+
+        return matches
+
+    # ----------------------
+    # readline
+    # ----------------------
+
+    @staticmethod
+    def _is_command_position(line_before: str) -> bool:
+        """ True when the word starting after line_before is a command name """
+
+        words = _COMMAND_SEPARATOR_RE.split(line_before)[-1].split()
+        return not words or words == ["time"]
+
+    def complete(self, line_before: str, text: str) -> list[str]:
+        """
+        Completions of text, the word being typed, where line_before is the line
+        up to that word. A word ending in a single match gets a trailing space.
+        """
+
+        if self._is_command_position(line_before) and "/" not in text and not text.startswith("~"):
+            matches = self.complete_command(text)
+        else:
+            matches = self.complete_path(text)
+
+        if len(matches) == 1 and not matches[0].endswith("/"):
+            matches[0] += " "
+
+        return matches
+
+    def readline_completer(self, text: str, state: int) -> Optional[str]:
+        """ readline's completer protocol: called with state 0, 1, ... until it returns None """
+
+        if state == 0:
+            line = readline.get_line_buffer()
+            self._matches = self.complete(line[:readline.get_begidx()], text)
+
+        return self._matches[state] if state < len(self._matches) else None
+
+def enable_line_editing(completer: ShellCompleter, history_lines: Iterable[str] = ()) -> bool:
+    """
+    Reads the prompt through readline from now on: line editing, Tab completion
+    with the completer, and Up / Ctrl-R over history_lines plus the lines typed.
+    Returns False when readline is not available.
+    """
+
+    if readline is None:
+        return False
+
+    threading.Thread(target=completer.warm_up, name="completion-warm-up", daemon=True).start()
+
+    for line in history_lines:
+        readline.add_history(line)
+
+    readline.set_completer_delims(COMPLETER_DELIMITERS)
+    readline.set_completer(completer.readline_completer)
+
+    # libedit (macOS) uses its own syntax for the key binding
+    if "libedit" in (readline.__doc__ or ""):
+        readline.parse_and_bind("bind ^I rl_complete")
+    else:
+        readline.parse_and_bind("tab: complete")
+
+    return True
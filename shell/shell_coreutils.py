@@ -0,0 +1,1548 @@
+import os
+import re
+import math
+import stat
+import time
+import fnmatch
+import operator
+from collections import deque
+from itertools import compress, islice
+from typing import BinaryIO, Callable, Iterator, Optional
+
+# Name GNU tools print for stdin
+STANDARD_INPUT_NAME = "standard input"
+
+# Whitespace bytes as ' ', everything else as 'x': words start where " x" occurs
+_WORD_TABLE = bytes(0x20 if byte in b" \t\n\r\x0b\x0c" else 0x78 for byte in range(256))
+
+# -5 as a short form of -n 5 (head, tail)
+_LINE_COUNT_RE = re.compile(r"-(\d+)")
+
+def parse_options(args: list[str], flags: str, value_flags: str = "", long_options: Optional[dict[str, str]] = None) -> Optional[tuple[dict[str, object], list[str]]]:
+    """
+    GNU style option parsing: options may come after operands, short flags can
+    be bundled (-lc), values follow the flag (-n5 / -n 5 / --lines=5) and '--'
+    ends the options.
+
+    Returns:
+        (flag -> True or its value, operands), None for anything not in
+        flags / value_flags / long_options, so the caller can run the real tool.
+    """
+
+    long_options = long_options or {}
+    options: dict[str, object] = {}
+    operands: list[str] = []
+    index = 0
+
+    while index < len(args):
+        arg = args[index]
+        index += 1
+
+        if arg == "--":
+            operands.extend(args[index:])
+            break
+
+        if arg.startswith("--"):
+            name, has_value, value = arg[2:].partition("=")
+            flag = long_options.get(name)
+
+            if flag is None:
+                return None
+
+            if flag in value_flags:
+                if not has_value:
+                    if index >= len(args):
+                        return None
+                    value = args[index]
+                    index += 1
+                options[flag] = value
+            elif has_value:
+                return None
+            else:
+                options[flag] = True
+            continue
+
+        if len(arg) < 2 or arg[0] != "-":
+            operands.append(arg)
+            continue
+
+        for position in range(1, len(arg)):
+            flag = arg[position]
+
+            if flag in value_flags:
+                value = arg[position + 1:]
+                if not value:
+                    if index >= len(args):
+                        return None
+                    value = args[index]
+                    index += 1
+                options[flag] = value
+                break
+
+            if flag not in flags:
+                return None
+
+            options[flag] = True
+
+    return options, operands
+
+class ShellCoreutils:
+    """
+    In-process versions of the coreutils that generated scripts call most:
+    ls, wc, head, tail and grep, plus mkdir, rmdir, touch and rm.
+
+    Starting /usr/bin/wc costs a fork / spawn, an exec and the dynamic loader,
+    which is far more than counting the newlines of a small file. These run in
+    the shell process instead, with the same output format and exit statuses
+    as the GNU tools for the options they support.
+
+    Input is read with os.read in CHUNK_SIZE blocks and processed with bytes
+    methods that run in C (count, find, regex search over the whole block), so
+    there is no Python loop per line unless every line is output anyway.
+    mkdir -p, touch and rm spread their system calls over the thread pool of
+    ShellFileOps, which also removes directory trees for rm -r.
+
+    Each tool has a parse_<tool> method returning its options, or None when an
+    option is not supported here. The shell then runs the real program instead
+    (see ShellBuiltins.prefers_external), so nothing a script relies on is lost.
+    Handlers return (status_code, error_text), the error text goes to stderr.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+    # Past this many bytes of file operands GNU grep's own matcher outweighs the
+    # exec it costs, so bigger inputs go to the real grep
+    GREP_NATIVE_MAX_BYTES = 8 * 1024 * 1024
+
+    def __init__(self):
+        self._regex_cache: dict[tuple, Optional[re.Pattern]] = {}
+        self._sort_key: Optional[Callable] = None
+        self._sort_key_ready: bool = False
+        self._fileops = None
+
+    def parse(self, command: str, args: list[str], stdout_fd: Optional[int] = None):
+        """ Options of a tool, None if the real program has to run (unsupported option, ls to a terminal) """
+
+        if command == "ls" and stdout_fd is not None and os.isatty(stdout_fd):
+            return None # columns and colors are left to the real ls
+
+        options = getattr(self, f"parse_{command}")(args)
+
+        if command == "grep" and options is not None and self._operands_size(options[2]) > self.GREP_NATIVE_MAX_BYTES:
+            return None
+
+        return options
+
+    @staticmethod
+    def _operands_size(file_names: list[str]) -> int:
+        """ Total size of the regular files among file_names, one stat each """
+
+        total = 0
+
+        for file_name in file_names:
+            try:
+                file_stat = os.stat(file_name)
+            except OSError:
+                continue
+            if stat.S_ISREG(file_stat.st_mode):
+                total += file_stat.st_size
+
+        return total
+
+    def run(self, command: str, options, stdin: BinaryIO, stdout: BinaryIO) -> tuple[int, Optional[str]]:
+        return getattr(self, command)(options, stdin, stdout)
+
+    # ----------------------
+    # Input
+    # ----------------------
+
+    @staticmethod
+    def _open(file_name: str, stdin: BinaryIO) -> tuple[int, bool]:
+        """ (fd, owned) of an operand, '-' is stdin """
+
+        if file_name == "-":
+            return stdin.fileno(), False
+
+        return os.open(file_name, os.O_RDONLY), True
+
+    def _chunks(self, fd: int) -> Iterator[bytes]:
+        while True:
+            chunk = os.read(fd, self.CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    def _lines_chunks(self, fd: int) -> Iterator[bytes]:
+        """ Blocks of whole lines, the last one may lack its newline """
+
+        carry = b""
+
+        for chunk in self._chunks(fd):
+            data = carry + chunk if carry else chunk
+            cut = data.rfind(b"\n") + 1
+
+            if cut == 0:
+                carry = data
+                continue
+
+            carry = data[cut:]
+            yield data[:cut] if carry else data
+
+        if carry:
+            yield carry
+
+    @staticmethod
+    def _display_name(file_name: str) -> str:
+        return STANDARD_INPUT_NAME if file_name == "-" else file_name
+
+    # ----------------------
+    # wc
+    # ----------------------
+
+    def parse_wc(self, args: list[str]):
+        return parse_options(args, "lwc", long_options={"lines": "l", "words": "w", "bytes": "c"})
+
+    def wc(self, options, stdin: BinaryIO, stdout: BinaryIO) -> tuple[int, Optional[str]]:
+        """
+        Lines, words and bytes (-l, -w, -c), columns aligned like GNU wc.
+        Lines are counted with bytes.count per block, bytes of a regular file
+        come from fstat when nothing else is asked for.
+        """
+
+        flags, operands = options
+        counts = [flag for flag in "lwc" if flag in flags] or ["l", "w", "c"]
+        file_names = operands or ["-"]
+
+        rows: list[tuple[list[int], Optional[str]]] = []
+        errors: list[str] = []
+        regular_total = 0
+        minimum_width = 1
+
+        for file_name in file_names:
+            try:
+                fd, owned = self._open(file_name, stdin)
+            except OSError as e:
+                errors.append(f"wc: {file_name}: {e.strerror}")
+                continue
+
+            try:
+                file_stat = os.fstat(fd)
+
+                if stat.S_ISREG(file_stat.st_mode):
+                    regular_total += file_stat.st_size
+                else:
+                    minimum_width = 7
+
+                rows.append((self._wc_counts(fd, file_stat, counts), file_name if operands else None))
+
+            except OSError as e:
+                errors.append(f"wc: {file_name}: {e.strerror}")
+
+            finally:
+                if owned:
+                    os.close(fd)
+
+        if len(file_names) > 1:
+            rows.append(([sum(row[0][column] for row in rows) for column in range(len(counts))], "total"))
+
+        # GNU: a single count of a single file is not padded, otherwise the
+        # width fits the total size of the regular files (7 for pipes / ttys)
+        if len(file_names) == 1 and len(counts) == 1:
+            width = 1
+        else:
+            width = max(len(str(regular_total)), minimum_width)
+
+        output = []
+        for values, name in rows:
+            line = " ".join(f"{value:>{width}}" for value in values)
+            output.append(line if name is None else f"{line} {name}")
+
+        if output:
+            stdout.write(("\n".join(output) + "\n").encode(errors="surrogateescape"))
+
+        return (1 if errors else 0, "\n".join(errors) if errors else None)
+
+    def _wc_counts(self, fd: int, file_stat: os.stat_result, counts: list[str]) -> list[int]:
+        if counts == ["c"] and stat.S_ISREG(file_stat.st_mode):
+            return [max(file_stat.st_size - os.lseek(fd, 0, os.SEEK_CUR), 0)]
+
+        lines = words = size = 0
+        count_words = "w" in counts
+        previous = b" " # last byte of the previous block, a word may continue across blocks
+
+        for chunk in self._chunks(fd):
+            size += len(chunk)
+            lines += chunk.count(b"\n")
+
+            if count_words:
+                # Word starts counted without splitting the block into word objects
+                classes = (previous + chunk).translate(_WORD_TABLE)
+                words += classes.count(b" x")
+                previous = classes[-1:]
+
+        values = {"l": lines, "w": words, "c": size}
+        return [values[flag] for flag in counts]
+
+    # ----------------------
+    # head / tail
+    # ----------------------
+
+    @staticmethod
+    def _head_tail_options(args: list[str], allow_from_start: bool):
+        """ -n N / -c N / -N, -q / -v; tail also takes +N. Value: (by_bytes, count, from_start) """
+
+        args = [f"-n{match.group(1)}" if (match := _LINE_COUNT_RE.fullmatch(arg)) else arg for arg in args]
+        parsed = parse_options(args, "qv", "nc", {"lines": "n", "bytes": "c", "quiet": "q", "silent": "q", "verbose": "v"})
+
+        if parsed is None:
+            return None
+
+        flags, operands = parsed
+        by_bytes = "c" in flags
+        value = str(flags.get("c" if by_bytes else "n", "10"))
+
+        from_start = value.startswith("+")
+        if from_start and not allow_from_start:
+            return None
+
+        digits = value[1:] if from_start else value
+        if not digits.isdigit():
+            return None # negative counts, size suffixes (1K): the real tool
+
+        headers = "v" in flags or (len(operands) > 1 and "q" not in flags)
+        return (by_bytes, int(digits), from_start, headers, operands or ["-"])
+
+    def parse_head(self, args: list[str]):
+        return self._head_tail_options(args, allow_from_start=False)
+
+    def parse_tail(self, args: list[str]):
+        return self._head_tail_options(args, allow_from_start=True)
+
+    def _each_file(self, tool: str, file_names: list[str], headers: bool, stdin: BinaryIO, stdout: BinaryIO, process) -> tuple[int, Optional[str]]:
+        """ Runs process(fd, stdout) for every operand, with '==> name <==' headers """
+
+        errors = []
+
+        for index, file_name in enumerate(file_names):
+            try:
+                fd, owned = self._open(file_name, stdin)
+            except OSError as e:
+                errors.append(f"{tool}: cannot open '{file_name}' for reading: {e.strerror}")
+                continue
+
+            try:
+                if headers:
+                    separator = "\n" if index else ""
+                    stdout.write(f"{separator}==> {self._display_name(file_name)} <==\n".encode(errors="surrogateescape"))
+
+                process(fd, stdout)
+
+            except IsADirectoryError:
+                errors.append(f"{tool}: error reading '{file_name}': Is a directory")
+
+            except OSError as e:
+                if isinstance(e, BrokenPipeError):
+                    raise
+                errors.append(f"{tool}: {file_name}: {e.strerror}")
+
+            finally:
+                if owned:
+                    os.close(fd)
+
+        return (1 if errors else 0, "\n".join(errors) if errors else None)
+
+    def head(self, options, stdin: BinaryIO, stdout: BinaryIO) -> tuple[int, Optional[str]]:
+        """ First N lines / bytes. Stops reading once they are out and leaves a seekable stdin right after them. """
+
+        by_bytes, count, _, headers, file_names = options
+
+        def process(fd: int, output: BinaryIO) -> None:
+            remaining = count
+            consumed = 0
+            start = self._tell(fd)
+
+            for chunk in self._chunks(fd) if remaining else ():
+                if by_bytes:
+                    end = min(remaining, len(chunk))
+                    remaining -= end
+                else:
+                    newlines = chunk.count(b"\n")
+                    if newlines < remaining:
+                        end = len(chunk)
+                        remaining -= newlines
+                    else:
+                        end = -1
+                        for _ in range(remaining):
+                            end = chunk.find(b"\n", end + 1)
+                        end += 1
+                        remaining = 0
+
+                output.write(memoryview(chunk)[:end])
+                consumed += end
+
+                if not remaining:
+                    break
+
+            # Like GNU head: the next reader of a file descriptor continues after the output
+            if start is not None:
+                os.lseek(fd, start + consumed, os.SEEK_SET)
+
+        return self._each_file("head", file_names, headers, stdin, stdout, process)
+
+    @staticmethod
+    def _tell(fd: int) -> Optional[int]:
+        try:
+            return os.lseek(fd, 0, os.SEEK_CUR)
+        except OSError:
+            return None # pipe
+
+    @staticmethod
+    def _last_lines_start(data: bytes, count: int) -> int:
+        """ Offset of the last count lines of data, -1 if data holds fewer lines """
+
+        position = len(data) - 1 if data.endswith(b"\n") else len(data)
+
+        for _ in range(count):
+            position = data.rfind(b"\n", 0, position)
+            if position < 0:
+                return -1
+
+        return position + 1
+
+    def tail(self, options, stdin: BinaryIO, stdout: BinaryIO) -> tuple[int, Optional[str]]:
+        """
+        Last N lines / bytes, or everything from line / byte N with +N.
+        Regular files are read backwards from the end with os.pread, so the
+        cost depends on N and not on the size of the file. Pipes are read
+        through, keeping only the blocks the last N lines can be in.
+        """
+
+        by_bytes, count, from_start, headers, file_names = options
+
+        def process(fd: int, output: BinaryIO) -> None:
+            if from_start:
+                self._tail_from_start(fd, output, by_bytes, count)
+                return
+
+            file_stat = os.fstat(fd)
+
+            if stat.S_ISREG(file_stat.st_mode):
+                start = self._tell(fd) or 0
+                self._tail_regular(fd, output, by_bytes, count, start, file_stat.st_size)
+            else:
+                self._tail_stream(fd, output, by_bytes, count)
+
+        return self._each_file("tail", file_names, headers, stdin, stdout, process)
+
+    def _tail_regular(self, fd: int, output: BinaryIO, by_bytes: bool, count: int, start: int, size: int) -> None:
+        if by_bytes:
+            begin = max(size - count, start)
+
+            while begin < size:
+                block = os.pread(fd, min(self.CHUNK_SIZE, size - begin), begin)
+                if not block:
+                    break
+                output.write(block)
+                begin += len(block)
+
+        elif count:
+            # Blocks from the end until they hold more than count newlines
+            blocks: list[bytes] = []
+            newlines = 0
+            begin = size
+
+            while begin > start and newlines <= count:
+                block_start = max(begin - self.CHUNK_SIZE, start)
+                block = os.pread(fd, begin - block_start, block_start)
+                blocks.append(block)
+                newlines += block.count(b"\n")
+                begin = block_start
+
+            data = b"".join(reversed(blocks))
+            output.write(memoryview(data)[max(self._last_lines_start(data, count), 0):])
+
+        os.lseek(fd, size, os.SEEK_SET)
+
+    def _tail_stream(self, fd: int, output: BinaryIO, by_bytes: bool, count: int) -> None:
+        kept: deque = deque()
+        kept_size = 0
+        kept_newlines = 0
+
+        for chunk in self._chunks(fd):
+            kept.append(chunk)
+            kept_size += len(chunk)
+            kept_newlines += chunk.count(b"\n")
+
+            # Drop the oldest block while the others still hold everything needed
+            while len(kept) > 1:
+                oldest = kept[0]
+                if by_bytes:
+                    if kept_size - len(oldest) < count:
+                        break
+                else:
+                    if kept_newlines - oldest.count(b"\n") <= count:
+                        break
+                kept.popleft()
+                kept_size -= len(oldest)
+                kept_newlines -= oldest.count(b"\n")
+
+        data = b"".join(kept)
+
+        if by_bytes:
+            output.write(data[max(len(data) - count, 0):] if count else b"")
+        elif count:
+            output.write(data[max(self._last_lines_start(data, count), 0):])
+
+    def _tail_from_start(self, fd: int, output: BinaryIO, by_bytes: bool, count: int) -> None:
+        """ tail +N: skips N - 1 lines (bytes), copies the rest """
+
+        skip = max(count - 1, 0)
+
+        for chunk in self._chunks(fd):
+            if skip:
+                if by_bytes:
+                    if skip >= len(chunk):
+                        skip -= len(chunk)
+                        continue
+                    chunk = chunk[skip:]
+                else:
+                    newlines = chunk.count(b"\n")
+                    if newlines < skip:
+                        skip -= newlines
+                        continue
+                    position = -1
+                    for _ in range(skip):
+                        position = chunk.find(b"\n", position + 1)
+                    chunk = chunk[position + 1:]
+                skip = 0
+
+            output.write(chunk)
+
+    # ----------------------
+    # grep
+    # ----------------------
+
+    def parse_grep(self, args: list[str]):
+        """ -i -v -c -n -l -q -s -h -H -o -w -x -F -E -G, -e PATTERN, -m NUM """
+
+        parsed = parse_options(
+            args, "ivcnlqshHowxFEG", "em",
+            {"ignore-case": "i", "invert-match": "v", "count": "c", "line-number": "n",
+             "files-with-matches": "l", "quiet": "q", "silent": "q", "no-messages": "s",
+             "no-filename": "h", "with-filename": "H", "only-matching": "o", "word-regexp": "w",
+             "line-regexp": "x", "fixed-strings": "F", "extended-regexp": "E", "basic-regexp": "G",
+             "regexp": "e", "max-count": "m"},
+        )
+
+        if parsed is None:
+            return None
+
+        flags, operands = parsed
+
+        # Only the last -e is kept by parse_options: several patterns go to the real grep
+        if args.count("-e") > 1:
+            return None
+
+        if "e" in flags:
+            pattern = str(flags["e"])
+        elif operands:
+            pattern, operands = operands[0], operands[1:]
+        else:
+            return None
+
+        if "m" in flags and not str(flags["m"]).isdigit():
+            return None
+
+        syntax = "F" if "F" in flags else ("E" if "E" in flags else "G")
+        regex = self._compile(pattern, syntax, "i" in flags, "w" in flags, "x" in flags)
+
+        if regex is None:
+            return None
+
+        return (flags, regex, operands)
+
+    def _compile(self, pattern: str, syntax: str, ignore_case: bool, word: bool, line: bool) -> Optional[re.Pattern]:
+        key = (pattern, syntax, ignore_case, word, line)
+
+        if key not in self._regex_cache:
+            if len(self._regex_cache) > 256:
+                self._regex_cache.clear()
+            self._regex_cache[key] = self._build_regex(pattern, syntax, ignore_case, word, line)
+
+        return self._regex_cache[key]
+
+    @classmethod
+    def _build_regex(cls, pattern: str, syntax: str, ignore_case: bool, word: bool, line: bool) -> Optional[re.Pattern]:
+        """ Python bytes regex with the meaning of the grep pattern, None if it cannot be translated """
+
+        if ignore_case and not pattern.isascii():
+            return None # case folding of non-ASCII text depends on the locale
+
+        alternatives = []
+
+        for part in pattern.split("\n"):
+            if syntax == "F":
+                translated = re.escape(part)
+            elif syntax == "E":
+                translated = cls._translate_extended(part)
+            else:
+                translated = cls._translate_basic(part)
+
+            if translated is None:
+                return None
+            alternatives.append(f"(?:{translated})")
+
+        expression = "|".join(alternatives)
+
+        if line:
+            expression = f"^(?:{expression})$"
+        elif word:
+            expression = rf"(?<!\w)(?:{expression})(?!\w)"
+
+        try:
+            return re.compile(os.fsencode(expression), re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+        except re.error:
+            return None
+
+    @staticmethod
+    def _translate_bracket(pattern: str, index: int) -> Optional[tuple[str, int]]:
+        """ [...] starting at index -> (Python class, index after it); None for [:class:] and friends """
+
+        end = index + 1
+        if end < len(pattern) and pattern[end] == "^":
+            end += 1
+        if end < len(pattern) and pattern[end] == "]":
+            end += 1
+
+        while end < len(pattern) and pattern[end] != "]":
+            if pattern[end] == "[" and end + 1 < len(pattern) and pattern[end + 1] in ":.=":
+                return None
+            end += 1
+
+        if end >= len(pattern):
+            return None
+
+        body = pattern[index + 1:end]
+        negate = body.startswith("^")
+        if negate:
+            body = body[1:]
+
+        # Backslash and '[' are literal in POSIX brackets
+        body = body.replace("\\", "\\\\").replace("[", "\\[")
+        return ("[^" if negate else "[") + body + "]", end + 1
+
+    @classmethod
+    def _translate_extended(cls, pattern: str) -> Optional[str]:
+        """ ERE -> Python: the same apart from brackets, lazy-looking quantifiers and some escapes """
+
+        output = []
+        index = 0
+
+        while index < len(pattern):
+            character = pattern[index]
+
+            if character == "\\":
+                if index + 1 >= len(pattern):
+                    return None
+                escaped = pattern[index + 1]
+                if escaped in "wWsSbB" or (not escaped.isalnum() and escaped not in "<>`'"):
+                    output.append("\\" + escaped)
+                    index += 2
+                    continue
+                return None
+
+            if character == "[":
+                bracket = cls._translate_bracket(pattern, index)
+                if bracket is None:
+                    return None
+                output.append(bracket[0])
+                index = bracket[1]
+                continue
+
+            if character in "*+?}" and index + 1 < len(pattern) and pattern[index + 1] in "?+":
+                return None # a+? is (a+)? in ERE but lazy in Python
+
+            if character == "(":
+                output.append("(?:") # no back-references here, findall then returns whole matches
+                index += 1
+                continue
+
+            output.append(character)
+            index += 1
+
+        return "".join(output)
+
+    @classmethod
+    def _translate_basic(cls, pattern: str) -> Optional[str]:
+        """ BRE -> Python: \\( \\) \\{ \\} \\| \\+ \\? are operators, ( ) { } | + ? literals """
+
+        output = []
+        index = 0
+        # Where '*' is literal and '^' an anchor: at the start, after \( and \|
+        at_start = True
+
+        while index < len(pattern):
+            character = pattern[index]
+
+            if character == "\\":
+                if index + 1 >= len(pattern):
+                    return None
+                escaped = pattern[index + 1]
+                index += 2
+
+                if escaped in "(|":
+                    output.append(escaped if escaped == "|" else "(?:")
+                    at_start = True
+                    continue
+                if escaped in "){}+?":
+                    output.append(escaped)
+                elif escaped in "wWsSbB" or escaped in ".*[]^$\\/":
+                    output.append("\\" + escaped)
+                else:
+                    return None # back-references, \< \>, \n ...
+                at_start = False
+                continue
+
+            if character == "[":
+                bracket = cls._translate_bracket(pattern, index)
+                if bracket is None:
+                    return None
+                output.append(bracket[0])
+                index = bracket[1]
+                at_start = False
+                continue
+
+            if character == "^":
+                output.append("^" if at_start else "\\^")
+                index += 1
+                continue
+
+            if character == "$":
+                at_end = index + 1 == len(pattern) or pattern.startswith(("\\)", "\\|"), index + 1)
+                output.append("$" if at_end else "\\$")
+                index += 1
+                at_start = False
+                continue
+
+            if character == "*" and at_start:
+                output.append("\\*")
+            elif character in "(){}|+?":
+                output.append("\\" + character)
+            else:
+                output.append(character)
+
+            index += 1
+            at_start = False
+
+        return "".join(output)
+
+    def grep(self, options, stdin: BinaryIO, stdout: BinaryIO) -> tuple[int, Optional[str]]:
+        """
+        Lines matching a pattern. A block without a match anywhere is skipped
+        with one search; otherwise its lines are split out and searched one by
+        one from C (map / compress), so Python only touches the lines that are
+        output. Status 0 if a line was selected, 1 if not, 2 on errors.
+        """
+
+        flags, regex, operands = options
+        file_names = operands or ["-"]
+        show_names = "H" in flags or (len(file_names) > 1 and "h" not in flags)
+        quiet = "q" in flags
+        selected_any = False
+        errors: list[str] = []
+        messages: list[str] = []
+
+        for file_name in file_names:
+            try:
+                fd, owned = self._open(file_name, stdin)
+            except OSError as e:
+                errors.append(f"grep: {file_name}: {e.strerror}")
+                continue
+
+            try:
+                selected, binary = self._grep_file(fd, flags, regex, stdout, ("(standard input)" if file_name == "-" else file_name) if show_names or "l" in flags else None)
+
+            except IsADirectoryError:
+                errors.append(f"grep: {file_name}: Is a directory")
+                continue
+
+            except OSError as e:
+                if isinstance(e, BrokenPipeError):
+                    raise
+                errors.append(f"grep: {file_name}: {e.strerror}")
+                continue
+
+            finally:
+                if owned:
+                    os.close(fd)
+
+            if selected:
+                selected_any = True
+                if binary:
+                    messages.append(f"grep: {'(standard input)' if file_name == '-' else file_name}: binary file matches")
+                if quiet:
+                    # Files before this one were already reported, the rest is never opened
+                    return (0, "\n".join(errors) if errors and "s" not in flags else None)
+
+        status = 2 if errors and not (quiet and selected_any) else (0 if selected_any else 1)
+
+        # -s only hides the messages, the status still reports the unreadable files
+        report = messages + ([] if "s" in flags else errors)
+        return (status, "\n".join(report) if report else None)
+
+    def _grep_file(self, fd: int, flags: dict, regex: re.Pattern, stdout: BinaryIO, name: Optional[str]) -> tuple[int, bool]:
+        """ Selected lines of one input, (number of selected lines, input is binary) """
+
+        invert = "v" in flags
+        numbered = "n" in flags
+        only_matching = "o" in flags
+        max_count = int(flags["m"]) if "m" in flags else None
+        # -q and -l only need the first selected line, -c only the number of them
+        stop_at_first = "q" in flags or "l" in flags
+        writes_lines = not ("c" in flags or stop_at_first)
+
+        prefix = os.fsencode(name) + b":" if name is not None and "l" not in flags else b""
+        search = regex.search
+        selected = 0
+        line_number = 0   # lines before the current block
+        binary = None     # decided on the first block, like GNU grep
+
+        if max_count == 0:
+            return 0, False
+
+        for data in self._lines_chunks(fd):
+            if binary is None:
+                binary = b"\0" in data
+                writes_lines = writes_lines and not binary
+
+            lines = data.split(b"\n")
+            if not lines[-1]:
+                lines.pop() # the empty "line" after the last newline
+
+            first_number = line_number + 1
+            line_number += len(lines)
+
+            # One search over the block skips blocks without a match (a match
+            # spanning lines only costs the per-line pass below)
+            if not invert and search(data) is None:
+                continue
+
+            # map / filter / compress call the regex from C, no Python loop per line
+            matches = map(search, lines)
+            if invert:
+                matches = map(operator.not_, matches)
+
+            wanted = 1 if stop_at_first else (None if max_count is None else max_count - selected)
+
+            if not writes_lines:
+                count = sum(map(bool, matches)) if wanted is None else len(list(islice(filter(None, matches), wanted)))
+                selected += count
+            else:
+                indexes = list(islice(compress(range(len(lines)), matches), wanted))
+                selected += len(indexes)
+
+                output = []
+                for index in indexes:
+                    head = prefix + b"%d:" % (first_number + index) if numbered else prefix
+                    if only_matching:
+                        output.extend(head + piece + b"\n" for piece in regex.findall(lines[index]) if piece)
+                    else:
+                        output.append(head + lines[index] + b"\n")
+
+                if output:
+                    stdout.write(b"".join(output))
+
+            if (stop_at_first and selected) or selected == max_count:
+                break
+
+        if "l" in flags:
+            if selected:
+                stdout.write(os.fsencode(name) + b"\n")
+        elif "c" in flags:
+            stdout.write(prefix + b"%d\n" % selected)
+
+        return selected, bool(binary) and not ("c" in flags or stop_at_first)
+
+    # ----------------------
+    # ls
+    # ----------------------
+
+    def parse_ls(self, args: list[str]):
+        """ -1 -a -A -d -r -t -p -F; -l, -R, colors and columns are left to the real ls """
+        return parse_options(args, "1aAdrtpF", long_options={"all": "a", "almost-all": "A", "directory": "d", "reverse": "r"})
+
+    def _name_key(self) -> Optional[Callable]:
+        """ Sort key of file names: byte order in the C locale, strxfrm (what ls uses) in others """
+
+        if not self._sort_key_ready:
+            self._sort_key_ready = True
+            collate = os.environ.get("LC_ALL") or os.environ.get("LC_COLLATE") or os.environ.get("LANG") or "C"
+
+            if collate not in ("C", "POSIX") and not collate.startswith("C."):
+                import locale # only for locales that do not sort by bytes
+                try:
+                    locale.setlocale(locale.LC_COLLATE, "")
+                    self._sort_key = locale.strxfrm
+                except locale.Error:
+                    pass
+
+        return self._sort_key
+
+    @staticmethod
+    def _classify(mode: int) -> str:
+        if stat.S_ISDIR(mode):
+            return "/"
+        if stat.S_ISLNK(mode):
+            return "@"
+        if stat.S_ISFIFO(mode):
+            return "|"
+        if stat.S_ISSOCK(mode):
+            return "="
+        if mode & 0o111:
+            return "*"
+        return ""
+
+    def _format_names(self, entries: list[tuple[str, Optional[os.stat_result]]], flags: dict) -> list[str]:
+        """ Sorted names with -p / -F suffixes, entries are (name, lstat or None) """
+
+        key = self._name_key()
+
+        if "t" in flags:
+            entries.sort(key=lambda entry: (-(entry[1].st_mtime_ns if entry[1] else 0), key(entry[0]) if key else entry[0]))
+        else:
+            entries.sort(key=(lambda entry: key(entry[0])) if key else (lambda entry: entry[0]))
+
+        if "r" in flags:
+            entries.reverse()
+
+        if "F" in flags:
+            return [name + (self._classify(entry_stat.st_mode) if entry_stat else "") for name, entry_stat in entries]
+
+        if "p" in flags:
+            return [name + ("/" if entry_stat and stat.S_ISDIR(entry_stat.st_mode) else "") for name, entry_stat in entries]
+
+        return [name for name, _ in entries]
+
+    def _list_directory(self, directory: str, flags: dict) -> list[str]:
+        needs_stat = "t" in flags or "p" in flags or "F" in flags
+        entries: list[tuple[str, Optional[os.stat_result]]] = []
+
+        with os.scandir(directory) as scanner:
+            for entry in scanner:
+                if entry.name[0] == "." and not ("a" in flags or "A" in flags):
+                    continue
+                entries.append((entry.name, self._entry_stat(entry) if needs_stat else None))
+
+        if "a" in flags:
+            for name in (".", ".."):
+                entries.append((name, os.lstat(os.path.join(directory, name)) if needs_stat else None))
+
+        return self._format_names(entries, flags)
+
+    @staticmethod
+    def _entry_stat(entry: os.DirEntry) -> Optional[os.stat_result]:
+        try:
+            return entry.stat(follow_symlinks=False)
+        except OSError:
+            return None
+
+    def ls(self, options, stdin: BinaryIO, stdout: BinaryIO) -> tuple[int, Optional[str]]:
+        """ One name per line, as ls prints when stdout is not a terminal """
+
+        flags, operands = options
+        errors: list[str] = []
+        files: list[tuple[str, Optional[os.stat_result]]] = []
+        directories: list[tuple[str, Optional[os.stat_result]]] = []
+
+        for operand in operands or ["."]:
+            try:
+                operand_stat = os.stat(operand)
+            except OSError as e:
+                try:
+                    operand_stat = os.lstat(operand) # dangling symlink
+                except OSError:
+                    errors.append(f"ls: cannot access '{operand}': {e.strerror}")
+                    continue
+
+            if stat.S_ISDIR(operand_stat.st_mode) and "d" not in flags:
+                directories.append((operand, operand_stat))
+            else:
+                files.append((operand, os.lstat(operand) if "F" in flags else operand_stat))
+
+        sections: list[str] = []
+
+        if files:
+            sections.append("\n".join(self._format_names(files, flags)))
+
+        show_headers = len(operands) > 1 or bool(errors)
+
+        for directory in self._format_names(directories, {flag: True for flag in "rt" if flag in flags}):
+            try:
+                names = self._list_directory(directory, flags)
+            except OSError as e:
+                errors.append(f"ls: cannot open directory '{directory}': {e.strerror}")
+                continue
+
+            body = "\n".join(names)
+            if show_headers:
+                sections.append(f"{directory}:\n{body}" if body else f"{directory}:")
+            elif body:
+                sections.append(body)
+
+        if sections:
+            stdout.write(("\n\n".join(sections) + "\n").encode(errors="surrogateescape"))
+
+        return (2 if errors else 0, "\n".join(errors) if errors else None)
+
+    # ----------------------
+    # mkdir, rmdir, touch, rm
+    # ----------------------
+
+    @property
+    def fileops(self):
+        """ ShellFileOps (thread pool), imported and created by the first command that spreads work """
+        if self._fileops is None:
+            from shell_fileops import ShellFileOps
+            self._fileops = ShellFileOps()
+        return self._fileops
+
+    @staticmethod
+    def _missing_operand(tool: str, what: str = "operand") -> tuple[int, str]:
+        return (1, f"{tool}: missing {what}\nTry '{tool} --help' for more information.")
+
+    def parse_mkdir(self, args: list[str]):
+        """ -p; -m and -v are left to the real mkdir """
+        return parse_options(args, "p", long_options={"parents": "p"})
+
+    def mkdir(self, options, stdin: BinaryIO, stdout: BinaryIO) -> tuple[int, Optional[str]]:
+        """ Directories are made in order, with -p (order does not matter then) on the thread pool """
+
+        flags, operands = options
+
+        if not operands:
+            return self._missing_operand("mkdir")
+
+        def make(directory: str) -> Optional[str]:
+            try:
+                if "p" in flags:
+                    os.makedirs(directory, exist_ok=True)
+                else:
+                    os.mkdir(directory)
+            except NotADirectoryError as e:
+                return f"mkdir: cannot create directory '{self._not_a_directory(directory)}': {e.strerror}"
+            except OSError as e:
+                return f"mkdir: cannot create directory '{directory}': {e.strerror}"
+            return None
+
+        results = self.fileops.map(make, operands) if "p" in flags else [make(directory) for directory in operands]
+        errors = [error for error in results if error is not None]
+
+        return (1 if errors else 0, "\n".join(errors) if errors else None)
+
+    @staticmethod
+    def _not_a_directory(path: str) -> str:
+        """ The first parent of path that is not a directory, what mkdir names in its error """
+
+        parent = ""
+
+        for part in path.split("/")[:-1]:
+            parent = f"{parent}/{part}" if parent or path.startswith("/") else part
+            if part and not os.path.isdir(parent):
+                return parent
+
+        return path
+
+    def parse_rmdir(self, args: list[str]):
+        """ -p; --ignore-fail-on-non-empty and -v are left to the real rmdir """
+        return parse_options(args, "p", long_options={"parents": "p"})
+
+    def rmdir(self, options, stdin: BinaryIO, stdout: BinaryIO) -> tuple[int, Optional[str]]:
+        """ Removes empty directories in order (`rmdir a/b a` must remove a/b first), with -p their parents too """
+
+        flags, operands = options
+        errors: list[str] = []
+
+        if not operands:
+            return self._missing_operand("rmdir")
+
+        for directory in operands:
+            try:
+                os.rmdir(directory)
+            except OSError as e:
+                errors.append(f"rmdir: failed to remove '{directory}': {e.strerror}")
+                continue
+
+            if "p" not in flags:
+                continue
+
+            parent = os.path.dirname(directory.rstrip("/"))
+
+            while parent and parent.strip("/"):
+                try:
+                    os.rmdir(parent)
+                except OSError as e:
+                    errors.append(f"rmdir: failed to remove directory '{parent}': {e.strerror}")
+                    break
+                parent = os.path.dirname(parent.rstrip("/"))
+
+        return (1 if errors else 0, "\n".join(errors) if errors else None)
+
+    def parse_touch(self, args: list[str]):
+        """ -c; -d, -r, -t and the other time options are left to the real touch """
+        return parse_options(args, "c", long_options={"no-create": "c"})
+
+    def touch(self, options, stdin: BinaryIO, stdout: BinaryIO) -> tuple[int, Optional[str]]:
+        """ Creates missing files and sets the times of all of them to now, on the thread pool """
+
+        flags, operands = options
+        create_flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_NOCTTY", 0) | getattr(os, "O_NONBLOCK", 0) | getattr(os, "O_CLOEXEC", 0)
+
+        if not operands:
+            return self._missing_operand("touch", "file operand")
+
+        def touch_one(file_name: str) -> Optional[str]:
+            # A file created just now already has the current times, only existing ones need utime
+            if "c" not in flags:
+                try:
+                    os.close(os.open(file_name, create_flags | os.O_EXCL, 0o666))
+                    return None
+                except FileExistsError:
+                    pass
+                except OSError as e:
+                    return f"touch: cannot touch '{file_name}': {e.strerror}"
+
+            try:
+                os.utime(file_name)
+            except FileNotFoundError:
+                if "c" in flags:
+                    return None
+                # A dangling symlink: O_EXCL does not follow it, the file it names is created
+                try:
+                    os.close(os.open(file_name, create_flags, 0o666))
+                except OSError as e:
+                    return f"touch: cannot touch '{file_name}': {e.strerror}"
+            except OSError as e:
+                return f"touch: cannot touch '{file_name}': {e.strerror}"
+
+            return None
+
+        errors = [error for error in self.fileops.map(touch_one, operands) if error is not None]
+        return (1 if errors else 0, "\n".join(errors) if errors else None)
+
+    def parse_rm(self, args: list[str]):
+        """ -r -R -f; -i, -I, -d, -v and --no-preserve-root are left to the real rm """
+        return parse_options(args, "rRf", long_options={"recursive": "r", "force": "f"})
+
+    def rm(self, options, stdin: BinaryIO, stdout: BinaryIO) -> tuple[int, Optional[str]]:
+        """
+        Removes files, with -r whole directory trees. Files given as operands are
+        unlinked on the thread pool, trees are removed by ShellFileOps.remove_trees.
+        Errors come in operand order, as from rm.
+        """
+
+        flags, operands = options
+        force = "f" in flags
+        recursive = "r" in flags or "R" in flags
+
+        if not operands:
+            return (0, None) if force else self._missing_operand("rm")
+
+        errors: list[tuple[int, str]] = []
+        files: list[tuple[int, str]] = []
+        trees: list[tuple[int, str]] = []
+        root_stat = os.stat("/")
+
+        for index, operand in enumerate(operands):
+            try:
+                operand_stat = os.lstat(operand)
+            except OSError as e:
+                if not (force and isinstance(e, (FileNotFoundError, NotADirectoryError))):
+                    errors.append((index, f"rm: cannot remove '{operand}': {e.strerror}"))
+                continue
+
+            if not stat.S_ISDIR(operand_stat.st_mode):
+                files.append((index, operand))
+
+            elif not recursive:
+                errors.append((index, f"rm: cannot remove '{operand}': Is a directory"))
+
+            elif os.path.basename(operand.rstrip("/")) in (".", ".."):
+                errors.append((index, f"rm: refusing to remove '.' or '..' directory: skipping '{operand}'"))
+
+            elif (operand_stat.st_dev, operand_stat.st_ino) == (root_stat.st_dev, root_stat.st_ino):
+                errors.append((index, f"rm: it is dangerous to operate recursively on '{operand}'\nrm: use --no-preserve-root to override this failsafe"))
+
+            else:
+                trees.append((index, operand))
+
+        def unlink(item: tuple[int, str]) -> Optional[tuple[int, str]]:
+            index, file_name = item
+            try:
+                os.unlink(file_name)
+            except FileNotFoundError:
+                pass # removed meanwhile
+            except OSError as e:
+                return (index, f"rm: cannot remove '{file_name}': {e.strerror}")
+            return None
+
+        errors.extend(error for error in self.fileops.map(unlink, files) if error is not None)
+        errors.extend((index, f"rm: cannot remove '{path}': {strerror}") for index, path, strerror in self.fileops.remove_trees(trees))
+        errors.sort(key=lambda error: error[0])
+
+        return (1 if errors else 0, "\n".join(message for _, message in errors) if errors else None)
+
+    # ----------------------
+    # find, du
+    # ----------------------
+
+    def parse_find(self, args: list[str]):
+        """
+        Paths, then an and-list of tests and actions: -name -iname -type -size
+        -mtime -mmin -newer (each may follow ! / -not), -print -print0 -quit,
+        and the options -maxdepth -mindepth and -unordered (a shell extension:
+        print entries as the parallel walk finds them, not in find's order).
+        -o, parentheses, -exec, -delete, -L and the rest go to the real find.
+        """
+
+        index = 0
+        while index < len(args) and not (args[index].startswith("-") or args[index] in ("!", "(")):
+            index += 1
+
+        paths = args[:index] or ["."]
+        tests: list[tuple[bool, str, object]] = []  # (negated, test, argument)
+        settings: dict[str, object] = {"unordered": False}
+        has_action = False
+        negated = False
+
+        while index < len(args):
+            token = args[index]
+            index += 1
+
+            if token in ("!", "-not"):
+                negated = not negated
+                continue
+            if token in ("-a", "-and"):
+                continue
+
+            if token in ("-print", "-print0", "-quit"):
+                if negated:
+                    return None
+                tests.append((False, token[1:], None))
+                has_action = has_action or token != "-quit"
+                continue
+
+            if token == "-unordered":
+                settings["unordered"] = True
+                continue
+
+            if token not in ("-name", "-iname", "-type", "-size", "-mtime", "-mmin", "-newer", "-maxdepth", "-mindepth") or index >= len(args):
+                return None
+
+            value = args[index]
+            index += 1
+
+            if token in ("-maxdepth", "-mindepth"):
+                if negated or not value.isdigit():
+                    return None
+                settings[token[1:]] = int(value)
+                continue
+
+            argument = self._find_argument(token[1:], value)
+            if argument is None:
+                return None
+
+            tests.append((negated, token[1:], argument))
+            negated = False
+
+        if negated:
+            return None
+
+        if not has_action:
+            tests.append((False, "print", None))
+
+        return (paths, tests, settings)
+
+    # find -size units, b (512-byte blocks) by default
+    _SIZE_UNITS = {"c": 1, "w": 2, "b": 512, "k": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+    # find -type letters and the file types they stand for
+    _TYPE_LETTERS = {"f": stat.S_IFREG, "d": stat.S_IFDIR, "l": stat.S_IFLNK, "p": stat.S_IFIFO, "s": stat.S_IFSOCK, "b": stat.S_IFBLK, "c": stat.S_IFCHR}
+
+    def _find_argument(self, test: str, value: str):
+        """ Parsed argument of a find test, None if it is not supported """
+
+        if test in ("name", "iname"):
+            # fnmatch without FNM_PERIOD: * matches a leading dot, as in find
+            return re.compile(fnmatch.translate(value), re.IGNORECASE if test == "iname" else 0)
+
+        if test == "type":
+            letters = value.split(",")
+            if not all(letter in self._TYPE_LETTERS for letter in letters):
+                return None
+            return frozenset(self._TYPE_LETTERS[letter] for letter in letters)
+
+        if test == "newer":
+            try:
+                return os.stat(value).st_mtime_ns # float seconds lose the nanoseconds that tell files apart
+            except OSError:
+                return None # the real find reports it
+
+        comparison = value[0] if value[:1] in ("+", "-") else ""
+        number = value[len(comparison):]
+        unit = 1
+
+        if test == "size":
+            unit = self._SIZE_UNITS.get(number[-1:], None)
+            if unit is None:
+                unit = 512
+            else:
+                number = number[:-1]
+
+        if not number.isdigit():
+            return None
+
+        return (comparison, int(number), unit)
+
+    @staticmethod
+    def _compare(comparison: str, value: int, number: int) -> bool:
+        if comparison == "+":
+            return value > number
+        if comparison == "-":
+            return value < number
+        return value == number
+
+    def _find_test(self, test: str, argument, entry, now: float) -> bool:
+        if test in ("name", "iname"):
+            return argument.match(entry.name) is not None
+
+        if test == "type":
+            if entry.is_symlink():
+                file_type = stat.S_IFLNK
+            elif entry.is_dir(follow_symlinks=False):
+                file_type = stat.S_IFDIR
+            elif entry.is_file(follow_symlinks=False):
+                file_type = stat.S_IFREG
+            else:
+                file_type = stat.S_IFMT(entry.stat(follow_symlinks=False).st_mode)
+            return file_type in argument
+
+        entry_stat = entry.stat(follow_symlinks=False)
+
+        if test == "newer":
+            return entry_stat.st_mtime_ns > argument
+
+        comparison, number, unit = argument
+
+        if test == "size":
+            # Rounded up to whole units: -size -1M only matches empty files, as in find
+            return self._compare(comparison, -(-entry_stat.st_size // unit), number)
+
+        age = now - entry_stat.st_mtime
+
+        if test == "mtime":
+            return self._compare(comparison, int(age // 86400), number)
+
+        # -mmin N is an age in (N - 1, N] minutes, -N / +N compare the exact age
+        if comparison == "+":
+            return age > number * 60
+        if comparison == "-":
+            return age < number * 60
+        return (number - 1) * 60 < age <= number * 60
+
+    def find(self, options, stdin: BinaryIO, stdout: BinaryIO) -> tuple[int, Optional[str]]:
+        """
+        Walks the paths with ShellFileOps.walk: directories are listed (and
+        entries stat'ed, when a test needs it) by worker threads while this
+        thread tests and prints. -quit, or a reader closing the pipe, stops
+        the walk.
+        """
+
+        paths, tests, settings = options
+        min_depth = settings.get("mindepth", 0)
+        with_stat = any(test in ("size", "mtime", "mmin", "newer") for _, test, _ in tests)
+        now = time.time()
+        errors: list[str] = []
+
+        walk = self.fileops.walk(paths, with_stat=with_stat, max_depth=settings.get("maxdepth"), ordered=not settings["unordered"])
+
+        try:
+            for path, depth, entry, error in walk:
+                if error is not None:
+                    errors.append(f"find: '{path}': {error.strerror}")
+                    continue
+
+                if depth < min_depth:
+                    continue
+
+                for negated, test, argument in tests:
+                    if test == "print":
+                        stdout.write(os.fsencode(path) + b"\n")
+                    elif test == "print0":
+                        stdout.write(os.fsencode(path) + b"\0")
+                    elif test == "quit":
+                        return (1 if errors else 0, "\n".join(errors) if errors else None)
+                    else:
+                        try:
+                            matched = self._find_test(test, argument, entry, now)
+                        except OSError as e:
+                            errors.append(f"find: '{path}': {e.strerror}")
+                            break
+                        if matched == negated:
+                            break
+
+        finally:
+            walk.close()
+
+        return (1 if errors else 0, "\n".join(errors) if errors else None)
+
+    def parse_du(self, args: list[str]):
+        """ -s -a -h -k -b -c -x, -d N / --max-depth=N; --apparent-size, --inodes and the rest go to the real du """
+
+        parsed = parse_options(
+            args, "sahkbcx", "d",
+            {"summarize": "s", "all": "a", "human-readable": "h", "bytes": "b", "total": "c",
+             "one-file-system": "x", "max-depth": "d"},
+        )
+
+        if parsed is None:
+            return None
+
+        flags, operands = parsed
+
+        if "d" in flags and not str(flags["d"]).isdigit():
+            return None
+
+        if "s" in flags and ("a" in flags or "d" in flags):
+            return None # du refuses these combinations, let it say so
+
+        return (flags, operands or ["."])
+
+    @staticmethod
+    def _human_size(size: int) -> str:
+        """ du -h: one decimal below 10, rounded up, powers of 1024 """
+
+        if size < 1024:
+            return str(size)
+
+        value = float(size)
+
+        for unit in "KMGTPE":
+            value /= 1024
+            if value < 10:
+                rounded = math.ceil(value * 10) / 10
+                if rounded < 10:
+                    return f"{rounded:.1f}{unit}"
+                value = rounded
+            rounded_up = math.ceil(value)
+            if rounded_up < 1024:
+                return f"{rounded_up}{unit}"
+
+        return f"{math.ceil(value)}E"
+
+    def du(self, options, stdin: BinaryIO, stdout: BinaryIO) -> tuple[int, Optional[str]]:
+        """
+        Disk usage of directory trees. The entries come from an ordered
+        parallel walk with their stat already taken by the workers; the
+        directory totals are summed here and printed once the walk leaves a
+        directory, so output streams as in du. Hard-linked files (and
+        directories reached twice) are counted once.
+        """
+
+        flags, operands = options
+        apparent = "b" in flags
+        max_depth = 0 if "s" in flags else (int(flags["d"]) if "d" in flags else None)
+        errors: list[str] = []
+        seen: set[tuple[int, int]] = set()
+        grand_total = 0
+
+        if "h" in flags:
+            format_size = self._human_size
+        elif apparent:
+            format_size = str
+        else:
+            format_size = lambda size: str(-(-size // 1024))
+
+        def show(size: int, path: str, depth: int) -> None:
+            if max_depth is None or depth <= max_depth:
+                stdout.write(f"{format_size(size)}\t{path}\n".encode(errors="surrogateescape"))
+
+        # (path, depth, total) of the directories the walk is inside of
+        stack: list[list] = []
+        root_device = None
+        skip_below: Optional[int] = None
+
+        walk = self.fileops.walk(operands, with_stat=True)
+
+        try:
+            for path, depth, entry, error in walk:
+                # Below a directory that is not counted (other file system, seen before)
+                if skip_below is not None:
+                    if depth > skip_below:
+                        continue
+                    skip_below = None
+
+                # A directory that cannot be listed is reported right after it, at its own depth
+                if error is not None:
+                    if stack and stack[-1][0] == path:
+                        errors.append(f"du: cannot read directory '{path}': {error.strerror}")
+                    else:
+                        errors.append(f"du: cannot access '{path}': {error.strerror}")
+                    continue
+
+                while stack and stack[-1][1] >= depth:
+                    directory_path, directory_depth, total = stack.pop()
+                    show(total, directory_path, directory_depth)
+                    if stack:
+                        stack[-1][2] += total
+                    else:
+                        grand_total += total
+
+                try:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                except OSError as e:
+                    errors.append(f"du: cannot access '{path}': {e.strerror}")
+                    continue
+
+                is_directory = stat.S_ISDIR(entry_stat.st_mode)
+
+                if depth == 0:
+                    root_device = entry_stat.st_dev
+                elif "x" in flags and entry_stat.st_dev != root_device:
+                    skip_below = depth
+                    continue
+
+                if is_directory or entry_stat.st_nlink > 1:
+                    key = (entry_stat.st_dev, entry_stat.st_ino)
+                    if key in seen:
+                        skip_below = depth
+                        continue
+                    seen.add(key)
+
+                size = entry_stat.st_size if apparent else entry_stat.st_blocks * 512
+
+                if is_directory:
+                    stack.append([path, depth, size])
+                    continue
+
+                if stack:
+                    stack[-1][2] += size
+                else:
+                    grand_total += size
+
+                if depth == 0 or "a" in flags:
+                    show(size, path, depth)
+
+            while stack:
+                directory_path, directory_depth, total = stack.pop()
+                show(total, directory_path, directory_depth)
+                if stack:
+                    stack[-1][2] += total
+                else:
+                    grand_total += total
+
+        finally:
+            walk.close()
+
+        if "c" in flags:
+            stdout.write(f"{format_size(grand_total)}\ttotal\n".encode())
+
+        return (1 if errors else 0, "\n".join(errors) if errors else None)
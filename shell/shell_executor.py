@@ -1,10 +1,16 @@
+import io
 import os
 import sys
-from typing import Optional
-from shell_models import CommandObject
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Iterable, Optional
+from shell_models import CommandObject, CommandTreeNode
 from shell_tokenizer import ShellTokenizer 
 from shell_parser import ShellParser
-from shell_builtins import ShellBuiltins
+from shell_builtins import ShellBuiltins, write_output
+from shell_jobs import ShellJob
+from shell_spawn import FORK_AVAILABLE, fork_process
+from shell_glob import ShellGlob, argument_space
 
 class ShellExecutor:
     """
@@ -13,140 +19,1010 @@ class ShellExecutor:
 
     def __init__(self):
         builtins = ShellBuiltins()
+        self.builtins = builtins
         self.builtin_commands = builtins.builtin_commands
         self.cmd_not_found_handler = builtins.not_found_handler
+        self.spawn_external_handler = builtins.spawn_external
+        self.job_table = builtins.job_table
+        self.stats = builtins.stats
 
         self.operators = {
             "&&",
             ";",
             "||",
-            "|"
+            "|",
+            "&",
+            "(",
+            ")"
         }
 
+        # Redirect token -> (fd, mode, fixed target). The fixed target is the fd
+        # number of a duplication (2>&1), None means the next word is the file name.
         self.redirects = {
-            ">": "stdout_redirect",
-            "<": "stdin_redirect"
+            "<": (0, "<", None),
+            ">": (1, ">", None),
+            "1>": (1, ">", None),
+            ">>": (1, ">>", None),
+            "1>>": (1, ">>", None),
+            "2>": (2, ">", None),
+            "2>>": (2, ">>", None),
+            "2>&1": (2, ">&", "1"),
+            ">&2": (1, ">&", "2"),
+            "1>&2": (1, ">&", "2"),
+        }
+
+        # os.open flags of the file redirect modes
+        self.REDIRECT_OPEN_FLAGS = {
+            "<": os.O_RDONLY,
+            ">": os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+            ">>": os.O_WRONLY | os.O_CREAT | os.O_APPEND,
         }
 
         self.PATH = os.environ["PATH"].split(":")
 
+        self.COMMAND_NOT_FOUND_STATUS: int = 127
+        self.CANNOT_EXECUTE_STATUS: int = 126
+        self.SYNTAX_ERROR_STATUS: int = 2
+
+        # fd number -> fd, the shell's own stdin / stdout / stderr
+        self.STANDARD_FDS: dict[int, int] = {0: 0, 1: 1, 2: 2}
+
+        # Buffer of the stdout writer used in batch mode, flushed only on exit
+        # or before a child process is started
+        self.BATCH_OUTPUT_BUFFER_SIZE: int = 64 * 1024
+
+        # Pathname expansion of GlobWord arguments, with its directory listing cache
+        self.glob = ShellGlob()
+
+        # History entries loaded into readline at the interactive prompt (Up, Ctrl-R)
+        self.HISTORY_RECALL_LINES: int = 1000
+
+        self.tokenizer = ShellTokenizer()
+        self.parser = ShellParser(
+            supported=self.builtin_commands,
+            operators=self.operators,
+            redirects=self.redirects
+        )
+
+        # --- PARSE CACHE ---
+        # Raw line -> immutable CommandTreeNode (None for a line with only a comment).
+        # Loops and generated scripts repeat the same lines, so they skip tokenizing
+        # and parsing. The whole cache is dropped when the builtin registry changes,
+        # because it decides which commands are parsed as builtins.
+        self.PARSE_CACHE_SIZE: int = 512
+        self._parse_cache: OrderedDict = OrderedDict()
+        self._parse_cache_registry: frozenset = frozenset(self.builtin_commands)
+        self.parse_cache_hits: int = 0
+        self.parse_cache_misses: int = 0
+
+    @property
+    def last_status_code(self) -> int:
+        """ Status of the last executed command ($? in a POSIX shell), kept by the builtins for `exit` """
+        return self.builtins.last_status_code
+
+    @last_status_code.setter
+    def last_status_code(self, status_code: int) -> None:
+        self.builtins.last_status_code = status_code
+
     def list_supported_commands(self):
         """ Returns a list of currently supported shell commands. """
         print("Supported Builtin Commands:")
         for i, cmd in enumerate(self.supported_commands.keys(), 1):
             print(f"{i}- {cmd.upper()}")
 
-    def execute(self, command_list: list[CommandObject]):
-        """ 
-        Execution of the command object with support for status codes, 
-        redirection, and command chaining (&&, ||).
+    def clear_parse_cache(self) -> None:
+        """ Drops every cached plan """
+        self._parse_cache.clear()
+        self._parse_cache_registry = frozenset(self.builtin_commands)
+
+    def parse_cache_stats(self) -> dict:
+        """ Returns hit / miss counters and the current size of the parse cache """
+        return {
+            "hits": self.parse_cache_hits,
+            "misses": self.parse_cache_misses,
+            "size": len(self._parse_cache),
+            "max_size": self.PARSE_CACHE_SIZE,
+        }
+
+    def parse_line(self, line: str) -> Optional[CommandTreeNode]:
+        """
+        Tokenizes and parses a command line into its AST, served from the LRU
+        parse cache when the same line was seen before.
+
+        The returned tree is shared between runs of the same line, so it must
+        never be modified by the caller.
+
+        Raises:
+            ValueError: On a syntax error.
+        """
+
+        if self._parse_cache_registry != self.builtin_commands.keys():
+            self.clear_parse_cache()
+
+        if line in self._parse_cache:
+            self._parse_cache.move_to_end(line)
+            self.parse_cache_hits += 1
+            return self._parse_cache[line]
+
+        self.parse_cache_misses += 1
+
+        tree = self.parser.parse(self.tokenizer.tokenize_typed(line))
+
+        self._parse_cache[line] = tree
+        if len(self._parse_cache) > self.PARSE_CACHE_SIZE:
+            self._parse_cache.popitem(last=False) # least recently used
+
+        return tree
+
+    def _open_redirections(self, redirections, fds: dict[int, int]) -> tuple[dict[int, int], list[int]]:
+        """
+        Applies redirections of a command or a group, in command line order, on
+        top of the given fds (the shell's own 0 / 1 / 2, the ends of pipeline
+        pipes or the redirect files of an enclosing group).
+        Files are opened by the shell with os.open, so the child (or the builtin)
+        writes straight to them.
+
+        Returns:
+            (fds, opened_fds): fd number -> fd to use, and the fds opened here,
+            which the caller closes once the command has been started.
+
+        Raises:
+            OSError: If a file cannot be opened, nothing is left open.
+        """
+
+        fds = dict(fds)
+        opened_fds: list[int] = []
+
+        try:
+            for fd, mode, target in redirections:
+                if mode == ">&":
+                    # 2>&1: fd 2 becomes whatever fd 1 is at this point
+                    fds[fd] = fds[int(target)]
+                    continue
+
+                new_fd = os.open(target, self.REDIRECT_OPEN_FLAGS[mode], 0o666)
+                opened_fds.append(new_fd)
+                fds[fd] = new_fd
+
+        except OSError:
+            for opened_fd in opened_fds:
+                os.close(opened_fd)
+            raise
+
+        return fds, opened_fds
+
+    @staticmethod
+    def _fd_stream(fd: int, mode: str):
+        """ Binary stream over fd for builtins, the shell's own streams for 0 / 1 / 2 """
+
+        if fd == 0:
+            return sys.stdin.buffer
+        if fd == 1:
+            return sys.stdout.buffer
+        if fd == 2:
+            return sys.stderr.buffer
+
+        return open(fd, mode, closefd=False)
+
+    def _expand_globs(self, command_object: CommandObject) -> CommandObject:
+        """
+        Returns the command with its GlobWord arguments replaced by the matching
+        paths. It is a copy, the parsed command is cached and used again by the
+        next run, when the directory may hold other files.
+
+        Arguments of an external command are expanded only up to the argv space
+        exec allows.
+
+        Raises:
+            OSError: E2BIG if the arguments of an external command are too long.
+        """
+
+        if not command_object.has_globs:
+            return command_object
+
+        max_bytes = argument_space() if command_object.unsuported_command else None
+
+        return CommandObject(
+            command=command_object.command,
+            args=self.glob.expand_args(command_object.args, max_bytes),
+            stdin_redirect=command_object.stdin_redirect,
+            stdout_redirect=command_object.stdout_redirect,
+            redirections=command_object.redirections,
+            operator=command_object.operator,
+            unsuported_command=command_object.unsuported_command,
+        )
+
+    def _execute_external(self, command_object: CommandObject, fds: dict[int, int]) -> tuple[int, Optional[str], bool]:
+        """
+        Runs an external command in streaming mode: the child writes directly to
+        the terminal, or to the files opened by the shell for its redirections.
+        """
+
+        # Flush our own buffered output so it appears before the child's output
+        sys.stdout.flush()
+
+        try:
+            fds, opened_fds = self._open_redirections(command_object.redirections or (), fds)
+        except OSError as e:
+            self._write_to_fd(fds[2], f"shell: {e.filename}: {e.strerror}\n")
+            return (1, None, False)
+
+        try:
+            status_code, should_exit = self._run_external_on_fds(command_object, fds)
+        finally:
+            for fd in opened_fds:
+                os.close(fd)
+
+        return (status_code, None, should_exit)
+
+    def _run_external_on_fds(self, command_object: CommandObject, fds: dict[int, int]) -> tuple[int, bool]:
+        """ Runs the program from PATH on fds whose redirections are already applied """
+
+        status_code, error_text, should_exit = self.cmd_not_found_handler(
+            command_object.command, command_object.args, stdin=fds[0], stdout=fds[1], stderr=fds[2]
+        )
+
+        # In streaming mode only errors ("command not found") come back as text
+        if error_text:
+            self._write_to_fd(fds[2], error_text + "\n")
+
+        return (status_code, should_exit)
+
+    def _write_to_fd(self, fd: int, text: str) -> None:
+        """ Writes shell messages to stdout / stderr or to the file they were redirected to """
+
+        if fd in (1, 2):
+            stream = sys.stdout if fd == 1 else sys.stderr
+            stream.write(text)
+            return
+
+        stream = self._fd_stream(fd, "wb")
+        stream.write(text.encode())
+        stream.flush()
+
+    def _execute_builtin(self, handler, command_object: CommandObject, fds: dict[int, int]) -> tuple[int, bool]:
+        """
+        Runs a builtin in the foreground.
+
+        Plain builtins without redirections print through sys.stdout. Otherwise
+        the redirect files are opened by the shell and the builtin's output (or
+        the streams of a @stream_handler) goes straight to them. Output given as
+        chunks is written while the builtin produces it (see write_output).
+        """
+
+        uses_streams = getattr(handler, "uses_streams", False)
+
+        if not command_object.redirections and not uses_streams and fds == self.STANDARD_FDS:
+            status_code, output_text, should_exit = handler(command_object.command, command_object.args)
+
+            if isinstance(output_text, str):
+                if output_text.strip():
+                    print(output_text)
+
+            elif output_text is not None:
+                # Chunks go to the terminal as they are produced
+                sys.stdout.flush()
+                try:
+                    write_output(output_text, sys.stdout.buffer)
+                    sys.stdout.buffer.flush()
+                except BrokenPipeError:
+                    status_code = 1
+
+            return (status_code, should_exit)
+
+        # Text written so far must come out before the builtin writes to the fds
+        sys.stdout.flush()
+
+        try:
+            fds, opened_fds = self._open_redirections(command_object.redirections or (), fds)
+        except OSError as e:
+            self._write_to_fd(fds[2], f"shell: {e.filename}: {e.strerror}\n")
+            return (1, False)
+
+        # Native coreutils with options they do not support run the real program
+        if self.builtins.prefers_external(command_object.command, command_object.args, fds[1]):
+            try:
+                return self._run_external_on_fds(command_object, fds)
+            finally:
+                for fd in opened_fds:
+                    os.close(fd)
+
+        stdout = self._fd_stream(fds[1], "wb")
+        stderr = self._fd_stream(fds[2], "wb")
+
+        try:
+            status_code, output_text, should_exit = self._call_builtin(handler, command_object, self._fd_stream(fds[0], "rb"), stdout, stderr)
+            write_output(output_text, stdout)
+
+        except BrokenPipeError:
+            status_code, should_exit = 1, False
+
+        finally:
+            for stream in (stdout, stderr):
+                try:
+                    stream.flush()
+                except BrokenPipeError:
+                    pass
+
+            for fd in opened_fds:
+                os.close(fd)
+
+        return (status_code, should_exit)
+
+    def _call_builtin(self, handler, command_object: CommandObject, stdin, stdout, stderr) -> tuple[int, Optional[str], bool]:
+        """
+        Calls a builtin handler. Handlers marked with @stream_handler get the binary
+        stdin / stdout streams and report errors on stderr, others return their
+        output as text or as chunks (see ShellBuiltins).
+        """
+
+        if not getattr(handler, "uses_streams", False):
+            return handler(command_object.command, command_object.args)
+
+        status_code, error_text, should_exit = handler(command_object.command, command_object.args, stdin=stdin, stdout=stdout)
+
+        if error_text:
+            stdout.flush()
+            stderr.write((error_text + "\n").encode())
+            stderr.flush()
+
+        return (status_code, None, should_exit)
+
+    def _run_builtin_stage(self, command_object: CommandObject, fds: dict[int, int], owned_fds: list[int], job: ShellJob, position: int) -> None:
+        """
+        Runs a builtin as a pipeline stage on the given fds (pipe ends, redirect
+        files, or the shell's own 0 / 1 / 2), then closes the fds it owns.
+        Only stream handlers read stdin, so other builtins never block the rest
+        of the pipeline.
+        """
+
+        status_code = 1
+        stdout = self._fd_stream(fds[1], "wb")
+        stderr = self._fd_stream(fds[2], "wb")
+
+        try:
+            handler = self.builtin_commands.get(command_object.command)
+            status_code, output_text, _ = self._call_builtin(handler, command_object, self._fd_stream(fds[0], "rb"), stdout, stderr)
+            # A generator runs here, chunk by chunk, while the next stage reads them
+            write_output(output_text, stdout)
+            stdout.flush()
+
+        except BrokenPipeError:
+            # Next stage exited before reading everything, same as SIGPIPE in a real shell
+            status_code = 1
+
+        except Exception as e:
+            self._write_to_fd(fds[2], f"shell: execution error for {command_object.command}: {e}\n")
+            status_code = 1
+
+        finally:
+            try:
+                stderr.flush()
+            except BrokenPipeError:
+                pass
+
+            # Closing the write end is what lets the next stage see EOF
+            for fd in owned_fds:
+                os.close(fd)
+
+        job.statuses[position] = status_code
+
+    def _fork_stage(self, node: CommandTreeNode, fds: dict[int, int]):
+        """
+        Starts node in a forked copy of the shell on fds (see fork_process), for a
+        pipeline stage or background job that must not change the shell itself.
+        The copy has no jobs of its own and never prompts.
+        """
+
+        def subshell() -> int:
+            self.job_table.clear()
+            self.builtins.interactive = False
+            return self._evaluate(node, self.STANDARD_FDS)[0]
+
+        return fork_process(subshell, fds[0], fds[1], fds[2], node.describe())
+
+    def _run_tree_stage(self, node: CommandTreeNode, fds: dict[int, int], owned_fds: list[int], job: ShellJob, position: int) -> None:
+        """
+        Runs a ( subshell ), { group } or a whole and-or chain as a pipeline stage
+        or background job on a thread, then closes the fds it owns. Only used
+        where os.fork is missing: the stage shares the shell's cwd.
         """
 
-        should_exist: bool = False
-        prev_status: bool = 0 # Initial status is success (0)
+        status_code = 1
+
+        try:
+            status_code, _ = self._evaluate(node, fds)
+
+        except Exception as e:
+            self._write_to_fd(fds[2], f"shell: execution error: {e}\n")
+
+        finally:
+            for fd in owned_fds:
+                os.close(fd)
 
-        for i, command_object in enumerate(command_list):
-            cmd: str = command_object.command
-            args: list[str] = command_object.args
+        job.statuses[position] = status_code
+
+    def _start_pipeline(self, stages: tuple[CommandTreeNode, ...], fds: dict[int, int], stdin_fd: Optional[int] = None) -> ShellJob:
+        """
+        Starts commands joined by '|' as a real OS-level pipeline, without waiting.
+
+        Every stage is started at once and connected with kernel pipes (os.pipe),
+        so data goes straight from one process to the next and nothing is held
+        in the shell's memory. The first stage reads fds[0] and the last one
+        writes to fds[1]. stdin_fd (owned and closed by this method) replaces
+        fds[0] when given.
+        """
 
-            # --- 1. COMMAND CHAINING LOGIC ---
-            
-            # If this is not the first command, check the operator of the previous command 
-            # (assuming the operator is set on the command object it precedes)
+        import threading # loaded by the first pipeline, not needed to start the shell
 
-            if i > 0:
-                prev_command = command_list[i-1]
-                op = prev_command.operator
+        # Flush our own buffered output before children start writing to the terminal
+        sys.stdout.flush()
 
-                # Skip if previous command failed AND operator was '&&' (Success dependency)
-                if op == "&&" and prev_status != 0:
-                    print(f"Skipping '{cmd}' due to failed preceding command.")
-                    prev_status = 0 # Shell behavior: clear status after skipping
+        last_position = len(stages) - 1
+        job = ShellJob(" | ".join(stage.describe() for stage in stages), last_position)
+        job.on_child_exit = self.stats.record_child
+
+        read_fd: Optional[int] = stdin_fd   # read end of the pipe coming from the previous stage
+
+        for position, stage in enumerate(stages):
+            next_read_fd, write_fd = (None, None) if position == last_position else os.pipe()
+
+            # Pipe ends this stage is responsible for closing
+            owned_fds = [fd for fd in (read_fd, write_fd) if fd is not None]
+
+            stage_fds = {
+                0: read_fd if read_fd is not None else fds[0],
+                1: write_fd if write_fd is not None else fds[1],
+                2: fds[2],
+            }
+
+            try:
+                # ( ... ), { ... }, and-or chains and builtins such as cd run in a copy
+                # of the shell, so their cd and exit stay there while the shell goes on.
+                # The copy expands globs and opens the stage's redirections itself.
+                changes_shell = stage.kind != CommandTreeNode.COMMAND or (
+                    stage.data.command in self.builtins.SHELL_STATE_BUILTINS and not stage.data.unsuported_command
+                )
+
+                if changes_shell and FORK_AVAILABLE:
+                    job.processes[position] = self._fork_stage(stage, stage_fds)
+                    for fd in owned_fds:
+                        os.close(fd)
+                    read_fd = next_read_fd
                     continue
-                
-                # Skip if previous command succeeded AND operator was '||' (Failure dependency)
-                if op == "||" and prev_status == 0:
-                    print(f"Skipping '{cmd}' due to successful preceding command.")
-                    prev_status = 0 # Shell behavior: clear status after skipping
+
+                if stage.kind != CommandTreeNode.COMMAND:
+                    thread = threading.Thread(target=self._run_tree_stage, args=(stage, stage_fds, owned_fds, job, position))
+                    thread.start()
+                    job.threads.append(thread)
+                    read_fd = next_read_fd
                     continue
-                
-                # If operator is None or ';', we always execute.
-
-            # --- 2. SELECT HANDLER AND EXECUTE ---
-            
-            status_code: int
-            output_text: Optional[str]
-            
-            if command_object.unsuported_command:
-                # Execute the 'command not found' handler which now runs external commands
-                status_code, output_text, should_exit = self.cmd_not_found_handler(cmd, args)
-            else:
-                # Execute the built-in handler
-                handler = self.builtin_commands.get(cmd)
-                if handler:
-                    status_code, output_text, should_exit = handler(cmd, args)
+
+                command_object = self._expand_globs(stage.data)
+
+                # A redirect on a stage wins over the pipe, e.g. with '>' the next stage gets EOF
+                stage_fds, opened_fds = self._open_redirections(command_object.redirections or (), stage_fds)
+                owned_fds.extend(opened_fds)
+
+                if command_object.unsuported_command or self.builtins.prefers_external(command_object.command, command_object.args, stage_fds[1]):
+                    process = self.spawn_external_handler(command_object.command, command_object.args, stdin=stage_fds[0], stdout=stage_fds[1], stderr=stage_fds[2])
+
+                    if process is None:
+                        self._write_to_fd(stage_fds[2], f"{command_object.command}: command not found\n")
+                        job.statuses[position] = self.COMMAND_NOT_FOUND_STATUS
+                    else:
+                        job.processes[position] = process
+
                 else:
-                    # Should not happen with correct parsing
-                    sys.stderr.write(f"Internal Error: Handler for '{cmd}' not found.\n")
-                    status_code, output_text, should_exit = 1, None, False
-            
-            # Update the status and output on the command object
-            command_object.output_status_code = status_code
-            command_object.output = output_text
-            
-            # Set status for the next command's chaining check
-            prev_status = status_code
-
-            # --- 3. REDIRECTION AND STANDARD OUTPUT HANDLING ---
-            if output_text is not None and output_text.strip():
-                if command_object.stdout_redirect:
-                    # Handle STDOUT Redirection (>)
-                    try:
-                        # Use 'w' to overwrite, similar to standard shell behavior
-                        with open(command_object.stdout_redirect, 'w') as f:
-                            f.write(output_text + "\n")
-                    except IOError as e:
-                        # Log redirection failure, set status code
-                        sys.stderr.write(f"shell: cannot redirect output to {command_object.stdout_redirect}: {e}\n")
-                        prev_status = 1 # Redirection failure sets status code to 1
+                    thread = threading.Thread(target=self._run_builtin_stage, args=(command_object, stage_fds, owned_fds, job, position))
+                    thread.start()
+                    job.threads.append(thread)
+                    owned_fds = [] # closed by the stage itself
+
+            except OSError as e:
+                self._write_to_fd(fds[2], f"shell: execution error for {stage.describe()}: {e}\n")
+                job.statuses[position] = 1
+
+            # Parent closes its copies of the pipe ends, otherwise readers never see EOF
+            for fd in owned_fds:
+                os.close(fd)
+
+            read_fd = next_read_fd
+
+        return job
+
+    def _start_background_job(self, node: CommandTreeNode, fds: dict[int, int]) -> int:
+        """
+        Starts a command, pipeline or and-or chain terminated by '&' and returns
+        to the caller right away. Like a non-interactive bash, background jobs
+        read from /dev/null instead of competing with the shell for the terminal.
+        """
+
+        stages = node.children if node.kind == CommandTreeNode.PIPELINE else (node,)
+
+        job = self._start_pipeline(stages, fds, stdin_fd=os.open(os.devnull, os.O_RDONLY))
+        job_id = self.job_table.add(job)
+
+        if self.builtins.interactive:
+            last_pid = job.pids[-1] if job.pids else ""
+            sys.stderr.write(f"[{job_id}] {last_pid}\n")
+
+        return 0
+
+    def _reap_jobs(self) -> None:
+        """
+        Collects finished background jobs. In interactive mode they are reported
+        before the prompt and forgotten; otherwise they stay in the job table
+        until `jobs` reports them, like in a bash script.
+        """
+
+        if not len(self.job_table):
+            return
+
+        if not self.builtins.interactive:
+            self.job_table.collect()
+            return
+
+        for job in self.job_table.reap():
+            state = "Done" if job.status_code == 0 else f"Exit {job.status_code}"
+            sys.stderr.write(f"[{job.job_id}]   {state:<24}{job.command_line}\n")
+
+    def _execute_command(self, command_object: CommandObject, fds: dict[int, int]) -> tuple[int, bool]:
+        """ Runs a single command in the foreground, returns (status_code, should_exit) """
+
+        if command_object.has_globs:
+            try:
+                command_object = self._expand_globs(command_object)
+            except OSError as e:
+                self._write_to_fd(fds[2], f"shell: {command_object.command}: {e.strerror}\n")
+                return (self.CANNOT_EXECUTE_STATUS, False)
+
+        if command_object.unsuported_command:
+            # Execute the 'command not found' handler which streams external commands
+            status_code, _, should_exit = self._execute_external(command_object, fds)
+            return (status_code, should_exit)
+
+        handler = self.builtin_commands.get(command_object.command)
+
+        if handler is None:
+            # Should not happen with correct parsing
+            self._write_to_fd(fds[2], f"Internal Error: Handler for '{command_object.command}' not found.\n")
+            return (1, False)
+
+        return self._execute_builtin(handler, command_object, fds)
+
+    @staticmethod
+    def _stats_key(node: CommandTreeNode) -> str:
+        """ Name a command or pipeline is recorded under in the stats table """
+
+        if node.kind == CommandTreeNode.COMMAND:
+            return node.data.command
+        if node.kind == CommandTreeNode.PIPELINE:
+            return " | ".join(ShellExecutor._stats_key(stage) for stage in node.children)
+        if node.kind == CommandTreeNode.SUBSHELL:
+            return "( ... )"
+        return "{ ... }"
+
+    def _enter_group(self, node: CommandTreeNode, fds: dict[int, int]) -> Optional[list]:
+        """
+        Evaluator frame of a LIST / AND_OR / SUBSHELL / GROUP / TIME node:
+            [node, index of the next child, fds, fds opened for redirections, saved cwd, measurement]
+
+        Returns None if a redirect file of the group cannot be opened.
+        """
+
+        opened_fds: list[int] = []
+        saved_cwd: Optional[str] = None
+
+        if node.redirections:
+            sys.stdout.flush()
+            try:
+                fds, opened_fds = self._open_redirections(node.redirections, fds)
+            except OSError as e:
+                self._write_to_fd(fds[2], f"shell: {e.filename}: {e.strerror}\n")
+                return None
+
+        if node.kind == CommandTreeNode.SUBSHELL:
+            # `( cd dir; ... )` must not move the shell itself
+            try:
+                saved_cwd = os.getcwd()
+            except OSError:
+                pass
+
+        measurement = self.stats.start() if node.kind == CommandTreeNode.TIME else None
+
+        return [node, 0, fds, opened_fds, saved_cwd, measurement]
+
+    def _leave_group(self, frame: list) -> None:
+        """
+        Closes the redirect files of the group and restores the cwd after a subshell.
+        For `time` the report goes to stderr and the sample into the stats table.
+        """
+
+        node, _, fds, opened_fds, saved_cwd, measurement = frame
+
+        if measurement is not None:
+            sample = self.stats.stop(measurement)
+
+            # Output of the timed command comes before the report
+            sys.stdout.flush()
+            self._write_to_fd(fds[2], self.stats.format_report(sample))
+
+            if node.children:
+                child = node.children[0]
+                # In always-on mode commands and pipelines are already recorded by _evaluate
+                if not (self.stats.always_on and child.kind in (CommandTreeNode.COMMAND, CommandTreeNode.PIPELINE)):
+                    self.stats.record(self._stats_key(child), sample)
+
+        if opened_fds:
+            sys.stdout.flush()
+            for fd in opened_fds:
+                os.close(fd)
+
+        if saved_cwd is not None:
+            try:
+                os.chdir(saved_cwd)
+            except OSError:
+                pass
+
+    def _evaluate(self, root: CommandTreeNode, fds: dict[int, int]) -> tuple[int, bool]:
+        """
+        Evaluates the AST without recursion, using an explicit stack of frames
+        (see _enter_group), and returns (status_code, should_exit).
+
+        Skipped parts are never visited: an and-or chain jumps over every pipeline
+        joined by the same operator at once (CommandTreeNode.skip_to), and a
+        skipped pipeline is one child, however large the group behind it is.
+        So a generated chain costs time proportional to the commands that run.
+        """
+
+        LIST = CommandTreeNode.LIST
+        AND_OR = CommandTreeNode.AND_OR
+        COMMAND = CommandTreeNode.COMMAND
+        PIPELINE = CommandTreeNode.PIPELINE
+        SUBSHELL = CommandTreeNode.SUBSHELL
+
+        stats = self.stats
+        status_code: int = 0
+        should_exit: bool = False
+        stack: list[list] = []
+        node: Optional[CommandTreeNode] = root
+
+        while True:
+            # --- 1. RUN A LEAF OR ENTER A GROUP ---
+
+            if node is not None:
+                kind = node.kind
+
+                if kind == COMMAND or kind == PIPELINE:
+                    measurement = stats.start() if stats.always_on else None
+
+                    if kind == COMMAND:
+                        status_code, should_exit = self._execute_command(node.data, fds)
+                    else:
+                        # Stages of a pipeline run concurrently, as in a real shell 'exit'
+                        # inside a pipeline does not terminate the shell
+                        status_code = self._start_pipeline(node.children, fds).wait()
+
+                    if measurement is not None:
+                        stats.record(self._stats_key(node), stats.stop(measurement))
+
+                    # A bare `exit` later in the line exits with it
+                    self.last_status_code = status_code
+
                 else:
-                    # If no redirection, print to standard output
-                    print(output_text)
-            
-            # --- 4. EXIT CHECK ---
+                    frame = self._enter_group(node, fds)
+                    if frame is None:
+                        status_code = 1
+                    else:
+                        stack.append(frame)
+
+                node = None
+
+            if not stack:
+                break
+
+            # --- 2. PICK THE NEXT CHILD OF THE INNERMOST GROUP ---
+
+            frame = stack[-1]
+            group, index = frame[0], frame[1]
+            children = group.children
+            child: Optional[CommandTreeNode] = None
+
             if should_exit:
-                return should_exit
-        
+                pass # unwind every frame up to the shell (or to the enclosing subshell)
+
+            elif group.kind == LIST:
+                while index < len(children):
+                    if group.background[index]:
+                        # 'cmd &' gives the prompt back right away, the next command always runs
+                        status_code = self._start_background_job(children[index], frame[2])
+                        self.last_status_code = status_code
+                        index += 1
+                    else:
+                        child = children[index]
+                        index += 1
+                        break
+
+            elif group.kind == AND_OR:
+                if index == 0:
+                    child = children[0]
+                    index = 1
+
+                while child is None and index < len(children):
+                    # && runs after a success, || after a failure, otherwise skip the whole run
+                    if (group.operators[index] == "&&") == (status_code == 0):
+                        child = children[index]
+                        index += 1
+                    else:
+                        index = group.skip_to[index]
+
+            elif index == 0 and children:
+                # SUBSHELL / GROUP / TIME: a single child
+                child = children[0]
+                index = 1
+
+            if child is None:
+                stack.pop()
+                self._leave_group(frame)
+
+                # 'exit' inside ( ... ) only leaves the subshell
+                if group.kind == SUBSHELL:
+                    should_exit = False
+                continue
+
+            frame[1] = index
+            fds = frame[2]
+            node = child
+
+        return (status_code, should_exit)
+
+    def execute(self, tree: Optional[CommandTreeNode]) -> bool:
+        """ 
+        Execution of a parsed command line with support for status codes, 
+        redirection (<, >, >>, 2>, 2>&1), pipelines (|), command chaining
+        (&&, ||, ;, &) and grouping with ( ... ) and { ...; }.
+
+        The tree is only read, trees returned by parse_line are cached.
+
+        Returns:
+            bool: True if the shell should exit.
+        """
+
+        if tree is None:
+            return False
+
+        status_code, should_exit = self._evaluate(tree, self.STANDARD_FDS)
+
+        self.last_status_code = status_code
         return should_exit
 
+    def run_line(self, line: str, fds: Optional[dict[int, int]] = None) -> tuple[int, bool]:
+        """
+        Parses and runs one command line on the given fds instead of the shell's
+        own 0 / 1 / 2, e.g. the terminal of a shell server client or pipes that
+        capture the output. Syntax errors are reported on fds[2].
+
+        Returns:
+            (status_code, should_exit)
+        """
+
+        fds = self.STANDARD_FDS if fds is None else fds
+
+        try:
+            tree = self.parse_line(line)
+        except ValueError as e:
+            self._write_to_fd(fds[2], f"shell: syntax error: {e}\n")
+            self.last_status_code = self.SYNTAX_ERROR_STATUS
+            return (self.SYNTAX_ERROR_STATUS, False)
+
+        if tree is None:
+            return (self.last_status_code, False)
+
+        status_code, should_exit = self._evaluate(tree, fds)
+
+        self.last_status_code = status_code
+        return (status_code, should_exit)
+
+    def _parse_or_report(self, line: str) -> Optional[CommandTreeNode]:
+        """ Parses the line, on a syntax error reports it and returns None """
+
+        try:
+            return self.parse_line(line)
+        except ValueError as e:
+            sys.stderr.write(f"shell: syntax error: {e}\n")
+            self.last_status_code = self.SYNTAX_ERROR_STATUS
+            return None
+
+    def _enable_line_editing(self) -> bool:
+        """ readline with Tab completion and the last HISTORY_RECALL_LINES of the history, False if unavailable """
+
+        # Imported here: scripts and -c strings do not need readline
+        from shell_completion import ShellCompleter, enable_line_editing
+
+        completer = ShellCompleter(self.builtin_commands, self.glob)
+        return enable_line_editing(completer, self.builtins.history.recent(self.HISTORY_RECALL_LINES))
+
+    def _read_prompt_line(self, line_editing: bool) -> str:
+        """ Next line typed at the prompt, '' at end of input (Ctrl-D) """
+
+        if line_editing:
+            try:
+                return input("$ ") + "\n"
+            except EOFError:
+                return ""
+
+        # Output buffer
+        sys.stdout.write("$ ")
+        sys.stdout.flush() # forces Python to empty the buffer immediately and write it to the terminal.
+        return sys.stdin.readline()
 
     def run(self):
         """ Main shell loop """
 
+        line_editing = sys.stdin.isatty() and self._enable_line_editing()
+
         while True:
-            # Output buffer
-            sys.stdout.write("$ ")
-            sys.stdout.flush() # forces Python to empty the buffer immediately and write it to the terminal.
-            line = sys.stdin.readline()
+            self._reap_jobs()
+
+            line = self._read_prompt_line(line_editing)
+
+            # End of input (Ctrl-D)
+            if not line:
+                break
 
             if not line.strip():
                 continue
 
-            tokenized_line = ShellTokenizer().tokenize(line)
+            # Recorded before parsing, so lines with a typo can be recalled and fixed
+            self.builtins.history.add(line.rstrip("\n"))
 
-            parser = ShellParser(
-                supported=self.builtin_commands,
-                operators=self.operators,
-                redirects=self.redirects
-            )
+            command_flow = self._parse_or_report(line.strip())
 
-            command_flow = parser.parse(tokenized_line)
+            if command_flow is None:
+                continue
 
             should_exit = self.execute(command_flow)
 
             if should_exit:
                 break
 
-if __name__ == "__main__":
+        return self.last_status_code
+
+    def run_batch(self, lines: Iterable[str]) -> int:
+        """
+        Non-interactive loop used for scripts and -c strings.
+
+        There is no prompt and stdout is replaced by a single block-buffered
+        writer, so output is only flushed when the buffer fills, before a child
+        process is started (see _execute_external / _start_pipeline) and on exit.
+
+        Returns:
+            int: Exit status of the last executed command (or of `exit n`).
+        """
+
+        self.builtins.interactive = False
+
+        sys.stdout.flush()
+        original_stdout = sys.stdout
+        sys.stdout = io.TextIOWrapper(
+            io.BufferedWriter(io.FileIO(original_stdout.fileno(), "w", closefd=False), buffer_size=self.BATCH_OUTPUT_BUFFER_SIZE),
+            encoding=original_stdout.encoding,
+            errors=original_stdout.errors,
+        )
+
+        try:
+            for line in lines:
+                line = line.strip()
+
+                if not line:
+                    continue
+
+                self._reap_jobs()
+
+                command_flow = self._parse_or_report(line)
+
+                if command_flow is None:
+                    continue
+
+                if self.execute(command_flow):
+                    break
+
+        finally:
+            try:
+                sys.stdout.flush()
+            except BrokenPipeError:
+                pass
+            sys.stdout = original_stdout
+
+        return self.last_status_code
+
+    def run_script(self, script_path: str) -> int:
+        """ Runs every line of the script file in batch mode """
+
+        with open(script_path) as script_file:
+            return self.run_batch(script_file)
+
+    def run_command_string(self, command_string: str) -> int:
+        """ Runs a -c string in batch mode, it may contain several lines """
+        return self.run_batch(command_string.splitlines())
+
+
+def _run_shell(se: ShellExecutor, options: SimpleNamespace) -> int:
+    """ Runs the -c string, the script, or the interactive / batch loop """
+
+    if options.command_string is not None:
+        return se.run_command_string(options.command_string)
+
+    if options.script is not None:
+        try:
+            return se.run_script(options.script)
+        except OSError as e:
+            sys.stderr.write(f"shell: {options.script}: {e.strerror}\n")
+            return se.COMMAND_NOT_FOUND_STATUS
+
+    if not sys.stdin.isatty():
+        return se.run_batch(sys.stdin)
+
+    return se.run()
+
+def _parse_arguments(argv: list[str]) -> SimpleNamespace:
+    """
+    Parses [--stats] [-c COMMANDS] [script] by hand: wrappers start the shell
+    thousands of times and argparse costs more to import than the rest of the
+    shell. Anything else (--help, unknown options, usage errors) goes to argparse.
+    """
+
+    options = SimpleNamespace(command_string=None, stats=False, script=None)
+    index = 0
+
+    while index < len(argv):
+        arg = argv[index]
+
+        if arg == "--stats":
+            options.stats = True
+        elif arg == "-c" and index + 1 < len(argv) and options.command_string is None:
+            options.command_string = argv[index + 1]
+            index += 1
+        elif not arg.startswith("-") and options.script is None:
+            options.script = arg
+        else:
+            return _parse_arguments_argparse(argv)
+
+        index += 1
+
+    return options
+
+def _parse_arguments_argparse(argv: list[str]) -> SimpleNamespace:
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(prog="shell_executor.py", description="Python shell")
+    arg_parser.add_argument("-c", dest="command_string", metavar="COMMANDS", help="run the command string and exit")
+    arg_parser.add_argument("--stats", action="store_true", help="record every command and print the stats table to stderr on exit")
+    arg_parser.add_argument("script", nargs="?", help="script file to run")
+    return SimpleNamespace(**vars(arg_parser.parse_args(argv)))
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Entry point:
+        shell_executor.py                 interactive shell (batch mode if stdin is not a terminal)
+        shell_executor.py script.sh       runs the script
+        shell_executor.py -c "commands"   runs the command string
+        --stats                           records every command and prints the stats table on exit
+    """
+
+    options = _parse_arguments(sys.argv[1:] if argv is None else argv)
+
     se = ShellExecutor()
-    se.run()
\ No newline at end of file
+
+    if options.stats:
+        se.stats.always_on = True
+
+    try:
+        return _run_shell(se, options)
+    finally:
+        if options.stats:
+            sys.stderr.write(se.stats.format_table() + "\n")
+
+if __name__ == "__main__":
+    sys.exit(main())
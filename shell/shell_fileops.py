@@ -0,0 +1,607 @@
+import errno
+import os
+import stat
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import SimpleQueue
+from typing import Any, Callable, Iterable, Iterator, Optional, TypeVar
+
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+
+# Directories are opened without following a symlink swapped in for them
+_DIRECTORY_FLAGS = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | getattr(os, "O_NOFOLLOW", 0) | getattr(os, "O_CLOEXEC", 0)
+
+class _Directory:
+    """ A directory being removed: it is rmdir'ed once pending drops to zero """
+    __slots__ = ("path", "name", "identity", "parent", "root", "pending", "failed")
+
+    def __init__(self, path: str, parent: Optional["_Directory"], root: int, identity: Optional[tuple[int, int]] = None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.identity = identity  # (st_dev, st_ino) seen by the listing of the parent, set by the scan for operands
+        self.parent = parent
+        self.root = root          # index of the operand it belongs to, orders the errors
+        self.pending = 1          # the scan of the directory itself, then one per batch / subdirectory
+        self.failed = False       # something below could not be removed, so neither can this
+
+class _TreeRemoval:
+    """
+    One `rm -r` run over any number of directory trees.
+
+    Every directory is a task: it is opened (O_NOFOLLOW), listed with scandir
+    and its files are unlinked relative to its fd. Files past the first
+    UNLINK_BATCH are handed to other workers in batches on a dup of the fd,
+    subdirectories become tasks of their own. A directory counts its batches
+    and subdirectories still running; the task that finishes the last of them
+    removes it (rmdir relative to the parent's fd) and reports to the parent,
+    so directories go bottom-up without any thread waiting for another.
+
+    Directories are opened by path, so the fds of a wide tree are not all open
+    at once. O_NOFOLLOW only covers the last component of the path, so every
+    open is checked against the device and inode the listing of the parent
+    saw: if a directory above was swapped for a symlink meanwhile, the open
+    reaches another directory and the removal stops there instead of
+    unlinking files outside the tree.
+    """
+
+    def __init__(self, fileops: "ShellFileOps", roots: list[tuple[int, str]]):
+        self.fileops = fileops
+        self.lock = threading.Lock()
+        self.errors: list[tuple[int, str, str]] = []   # (operand index, path, strerror)
+        self.done = threading.Event()
+
+        # Parent of the operands, finishing it ends the run
+        self.top = _Directory("", None, -1)
+        self.top.pending = len(roots) + 1
+        self.roots = [_Directory(path, self.top, index) for index, path in roots]
+
+    def run(self) -> list[tuple[int, str, str]]:
+        # The first tree is scanned on this thread, a single small directory never starts the pool
+        for directory in self.roots[1:]:
+            self.fileops.pool.submit(self._scan, directory)
+        if self.roots:
+            self._scan(self.roots[0])
+
+        self._release(self.top)
+        self.done.wait()
+        return self.errors
+
+    def _fail(self, directory: _Directory, path: str, error: OSError) -> None:
+        with self.lock:
+            self.errors.append((directory.root, path, error.strerror))
+            directory.failed = True
+
+    @staticmethod
+    def _open(directory: _Directory) -> int:
+        """
+        fd of the directory, the one its parent listed.
+
+        Raises:
+            OSError: If it cannot be opened, or the path now leads to another
+                directory (a component above it was replaced).
+        """
+
+        fd = os.open(directory.path, _DIRECTORY_FLAGS)
+        fd_stat = os.fstat(fd)
+        identity = (fd_stat.st_dev, fd_stat.st_ino)
+
+        if directory.identity is None:
+            directory.identity = identity
+        elif identity != directory.identity:
+            os.close(fd)
+            raise OSError(errno.ESTALE, "Directory was replaced during removal")
+
+        return fd
+
+    def _scan(self, directory: _Directory) -> None:
+        try:
+            try:
+                fd = self._open(directory)
+            except FileNotFoundError:
+                return # removed by someone else meanwhile
+            except OSError as e:
+                self._fail(directory, directory.path, e)
+                return
+
+            try:
+                files: list[str] = []
+                subdirectories: list[tuple[str, tuple[int, int]]] = []
+
+                with os.scandir(fd) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                entry_stat = entry.stat(follow_symlinks=False)
+                                subdirectories.append((entry.name, (entry_stat.st_dev, entry_stat.st_ino)))
+                                continue
+                        except FileNotFoundError:
+                            continue
+                        except OSError:
+                            pass
+                        files.append(entry.name)
+
+                batch = self.fileops.UNLINK_BATCH
+                batches = range(batch, len(files), batch)
+
+                unsubmitted = len(batches) + len(subdirectories)
+
+                if unsubmitted:
+                    with self.lock:
+                        directory.pending += unsubmitted
+
+                    try:
+                        for start in batches:
+                            self.fileops.pool.submit(self._unlink_batch, directory, os.dup(fd), files[start:start + batch])
+                            unsubmitted -= 1
+
+                        for name, identity in subdirectories:
+                            self.fileops.pool.submit(self._scan, _Directory(os.path.join(directory.path, name), directory, directory.root, identity))
+                            unsubmitted -= 1
+
+                    finally:
+                        # Tasks that could not be started (no fd left) never report back
+                        if unsubmitted:
+                            with self.lock:
+                                directory.pending -= unsubmitted
+
+                self._unlink_names(directory, fd, files[:batch])
+
+            except OSError as e:
+                self._fail(directory, directory.path, e)
+
+            finally:
+                os.close(fd)
+
+        except BaseException as e: # a lost task would leave run() waiting forever
+            self._fail(directory, directory.path, OSError(0, str(e)))
+
+        finally:
+            self._release(directory)
+
+    def _unlink_batch(self, directory: _Directory, fd: int, names: list[str]) -> None:
+        try:
+            self._unlink_names(directory, fd, names)
+        except BaseException as e:
+            self._fail(directory, directory.path, OSError(0, str(e)))
+        finally:
+            os.close(fd)
+            self._release(directory)
+
+    def _unlink_names(self, directory: _Directory, fd: int, names: list[str]) -> None:
+        for name in names:
+            try:
+                os.unlink(name, dir_fd=fd)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self._fail(directory, os.path.join(directory.path, name), e)
+
+    def _remove(self, directory: _Directory) -> None:
+        """ rmdir relative to the parent's fd, checked like a scan; operands are removed by the path given """
+
+        parent = directory.parent
+
+        if parent is self.top:
+            os.rmdir(directory.path)
+            return
+
+        parent_fd = self._open(parent)
+        try:
+            os.rmdir(directory.name, dir_fd=parent_fd)
+        finally:
+            os.close(parent_fd)
+
+    def _release(self, directory: _Directory) -> None:
+        """ One task of directory is over; removes it and walks up while parents are complete """
+
+        while directory is not None:
+            with self.lock:
+                directory.pending -= 1
+                if directory.pending:
+                    return
+                failed = directory.failed
+
+            if directory is self.top:
+                self.done.set()
+                return
+
+            if not failed:
+                try:
+                    self._remove(directory)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    self._fail(directory, directory.path, e)
+                    failed = True
+
+            if failed:
+                with self.lock:
+                    directory.parent.failed = True
+
+            directory = directory.parent
+
+class RootEntry:
+    """
+    A walk operand, with the os.DirEntry methods the walk's consumers use.
+    It is lstat'ed once: like find -P and du, a symlink given as operand is
+    not followed.
+    """
+    __slots__ = ("name", "path", "_stat")
+
+    def __init__(self, path: str, stat_result: os.stat_result):
+        self.path = path
+        self.name = os.path.basename(path.rstrip("/")) or path
+        self._stat = stat_result
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result:
+        return self._stat
+
+    def is_dir(self, *, follow_symlinks: bool = True) -> bool:
+        return stat.S_ISDIR(self._stat.st_mode)
+
+    def is_file(self, *, follow_symlinks: bool = True) -> bool:
+        return stat.S_ISREG(self._stat.st_mode)
+
+    def is_symlink(self) -> bool:
+        return stat.S_ISLNK(self._stat.st_mode)
+
+class _Listing:
+    """ Entries of one directory, filled by a walk worker """
+    __slots__ = ("path", "depth", "entries", "error", "ready")
+
+    def __init__(self, path: str, depth: int):
+        self.path = path
+        self.depth = depth                                    # depth of the directory, its entries are one deeper
+        self.entries: list[tuple[os.DirEntry, Optional["_Listing"]]] = []
+        self.error: Optional[OSError] = None
+        self.ready = threading.Event()
+
+class _ParallelWalk:
+    """
+    Directory walk on the workers of ShellFileOps, with work stealing.
+
+    Every worker owns a deque of directories still to list. It takes the
+    newest one from its own deque (so it goes depth first and keeps close to
+    the order a single-threaded walk prints) and puts the subdirectories it
+    finds back on it. An idle worker steals the oldest directory of another
+    worker, which is the top of the largest subtree not started yet, so the
+    work spreads without a shared queue everyone contends on.
+
+    Entries are lstat'ed by the workers when stat is asked for, os.DirEntry
+    caches the result, so every entry costs one stat at most and the stats of
+    a directory run in parallel with the listing of others (which is where
+    NFS and NVMe gain). Without stat only the d_type of readdir is used.
+
+    The consumer reads the finished listings: in order, waiting for each
+    directory as a sequential walk would reach it, or unordered, in the order
+    the listings complete. Setting stop ends the workers after the directory
+    they are listing.
+
+    Listings wait in memory until the consumer reads them, and a consumer
+    slower than the workers (find into a pipe, an ordered walk blocked on one
+    slow directory) would let the whole tree pile up. So the workers pause
+    while ShellFileOps.WALK_MAX_BUFFERED entries are listed and not read yet.
+    The cap is checked before a directory is taken, so each worker can pass
+    it by the directory it is listing. If the ordered consumer waits for a
+    directory still in a deque while the workers pause, it takes the
+    directory out and lists it itself.
+    """
+
+    def __init__(self, fileops: "ShellFileOps", roots: list[_Listing], with_stat: bool, max_depth: Optional[int], ordered: bool):
+        self.fileops = fileops
+        self.with_stat = with_stat
+        self.max_depth = max_depth
+        self.ordered = ordered
+
+        self.deques = [deque() for _ in range(fileops.WORKERS)]
+        self.deques[0].extend(reversed(roots))
+        self.pending = len(roots)                   # listings queued or being listed
+        self.idle = 0
+        self.buffered = 0                           # entries listed and not read by the consumer
+        self.max_buffered = fileops.WALK_MAX_BUFFERED
+        self.wanted: Optional[_Listing] = None      # listing the ordered consumer waits for
+        self.changed = threading.Condition()
+        self.stop = False
+        self.finished: Optional[SimpleQueue] = None if ordered else SimpleQueue()
+
+    def start(self) -> None:
+        if not self.pending:
+            if self.finished is not None:
+                self.finished.put(None)
+            return
+
+        for index in range(len(self.deques)):
+            self.fileops.pool.submit(self._work, index)
+
+    def _take(self, index: int) -> Optional[_Listing]:
+        try:
+            return self.deques[index].pop()
+        except IndexError:
+            pass
+
+        # deque.pop / popleft are atomic, stealing needs no lock
+        for offset in range(1, len(self.deques)):
+            try:
+                return self.deques[(index + offset) % len(self.deques)].popleft()
+            except IndexError:
+                continue
+
+        return None
+
+    def _work(self, index: int) -> None:
+        while not self.stop:
+            if self.buffered >= self.max_buffered:
+                with self.changed:
+                    if self.pending == 0:
+                        return
+                    if self.buffered >= self.max_buffered and not self.stop:
+                        self.changed.wait(0.01)
+                continue
+
+            listing = self._take(index)
+
+            if listing is None:
+                with self.changed:
+                    if self.pending == 0 or self.stop:
+                        return
+                    self.idle += 1
+                    # The timeout covers a push between _take and this wait
+                    self.changed.wait(0.01)
+                    self.idle -= 1
+                continue
+
+            self._list(listing, self.deques[index])
+
+    def _list(self, listing: _Listing, own: deque) -> None:
+        children: list[_Listing] = []
+
+        try:
+            # Subdirectories are listed only if their entries are within max_depth
+            descend = self.max_depth is None or listing.depth + 1 < self.max_depth
+
+            with os.scandir(listing.path) as scanner:
+                for entry in scanner:
+                    if self.stop:
+                        break
+
+                    if self.with_stat:
+                        try:
+                            entry.stat(follow_symlinks=False)
+                        except OSError:
+                            pass
+
+                    child = None
+                    if descend:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                child = _Listing(entry.path, listing.depth + 1)
+                                children.append(child)
+                        except OSError:
+                            pass
+
+                    listing.entries.append((entry, child))
+
+        except OSError as e:
+            listing.error = e
+
+        except BaseException as e: # the consumer waits for every listing
+            listing.error = OSError(0, str(e))
+
+        finally:
+            if self.stop:
+                children = []
+
+            with self.changed:
+                self.pending += len(children) - 1
+                self.buffered += len(listing.entries)
+                # Newest last: this worker lists the first subdirectory next
+                own.extend(reversed(children))
+
+                # Under the lock, so the end marker comes after every listing
+                if self.finished is not None:
+                    self.finished.put(listing)
+                    if self.pending == 0:
+                        self.finished.put(None)
+
+                # Under the lock too, so _wait_ready cannot miss it
+                listing.ready.set()
+
+                if self.pending == 0 or (self.wanted is not None and (listing is self.wanted or self.buffered >= self.max_buffered)):
+                    self.changed.notify_all()
+                elif children and self.idle:
+                    self.changed.notify(len(children))
+
+    def _consumed(self, listing: _Listing) -> None:
+        """ The consumer has the entries of listing, workers paused on the cap may go on """
+
+        with self.changed:
+            full = self.buffered >= self.max_buffered
+            self.buffered -= len(listing.entries)
+            if full and self.buffered < self.max_buffered:
+                self.changed.notify_all()
+
+    def _wait_ready(self, listing: _Listing) -> None:
+        """ Waits for a listing the ordered consumer needs next, lists it here if the workers are paused """
+
+        if listing.ready.is_set():
+            return
+
+        with self.changed:
+            self.wanted = listing
+            while not listing.ready.is_set():
+                if self.buffered >= self.max_buffered and self._unqueue(listing):
+                    break
+                self.changed.wait()
+            self.wanted = None
+
+        if not listing.ready.is_set():
+            self._list(listing, self.deques[0])
+
+    def _unqueue(self, listing: _Listing) -> bool:
+        """ Takes listing out of the deques, False if a worker already has it """
+
+        for queued in self.deques:
+            try:
+                # Identity comparison, atomic like pop: a worker cannot take it as well
+                queued.remove(listing)
+                return True
+            except ValueError:
+                continue
+
+        return False
+
+    def items(self, roots: list[tuple[str, Optional[RootEntry], Optional[_Listing], Optional[OSError]]]) -> Iterator[tuple[str, int, Optional[Any], Optional[OSError]]]:
+        """ (path, depth, entry, error) of the roots and everything below them, see ShellFileOps.walk """
+
+        if not self.ordered:
+            for path, entry, _, error in roots:
+                yield path, 0, entry, error
+
+            while True:
+                listing = self.finished.get()
+                if listing is None:
+                    return
+
+                self._consumed(listing)
+
+                if listing.error is not None:
+                    yield listing.path, listing.depth, None, listing.error
+
+                depth = listing.depth + 1
+                for entry, _ in listing.entries:
+                    yield entry.path, depth, entry, None
+
+        for path, entry, listing, error in roots:
+            yield path, 0, entry, error
+
+            # Depth first: a listing on the stack is replaced by its entries once ready. They
+            # are taken off a reversed list, so nothing already yielded stays referenced
+            stack: list = [] if listing is None else [listing]
+
+            while stack:
+                top = stack[-1]
+
+                if isinstance(top, _Listing):
+                    self._wait_ready(top)
+                    self._consumed(top)
+                    remaining = top.entries
+                    remaining.reverse()
+                    top.entries = []
+                    stack[-1] = (top.depth + 1, remaining)
+                    if top.error is not None:
+                        yield top.path, top.depth, None, top.error
+                    continue
+
+                depth, remaining = top
+
+                if not remaining:
+                    stack.pop()
+                    continue
+
+                entry, child = remaining.pop()
+                yield entry.path, depth, entry, None
+
+                if child is not None:
+                    stack.append(child)
+
+class ShellFileOps:
+    """
+    Metadata operations over many paths, spread across a thread pool.
+
+    Creating, touching or unlinking a file is a system call that waits on the
+    filesystem, and the GIL is released while it runs, so keeping WORKERS of
+    them in flight overlaps the waits (journal, directory locks, network
+    filesystems). Lists shorter than PARALLEL_MIN run on the calling thread,
+    the pool is only started for work large enough to pay for it.
+    """
+
+    WORKERS = min(32, 4 * (os.cpu_count() or 1))
+    PARALLEL_MIN = 16
+    MAP_BATCH = 256
+    UNLINK_BATCH = 512
+    # Directory entries a walk lists ahead of its consumer, see _ParallelWalk
+    WALK_MAX_BUFFERED = 65536
+
+    def __init__(self):
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+        if hasattr(os, "register_at_fork"):
+            # The workers do not exist in a forked subshell, it starts a pool of its own
+            os.register_at_fork(after_in_child=self._forget_pool)
+
+    def _forget_pool(self) -> None:
+        self._pool = None
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.WORKERS, thread_name_prefix="fileops")
+        return self._pool
+
+    def map(self, function: Callable[[Item], Result], items: Iterable[Item]) -> list[Result]:
+        """ [function(item) for item in items], on the pool for long lists, results in order """
+
+        items = list(items)
+
+        if len(items) < self.PARALLEL_MIN:
+            return [function(item) for item in items]
+
+        # A few tasks per worker: a future per item would cost more than most system calls
+        size = min(self.MAP_BATCH, -(-len(items) // (4 * self.WORKERS)))
+        batches = self.pool.map(lambda start: [function(item) for item in items[start:start + size]], range(0, len(items), size))
+
+        return [result for batch in batches for result in batch]
+
+    def remove_trees(self, roots: list[tuple[int, str]]) -> list[tuple[int, str, str]]:
+        """
+        Removes directory trees (rm -r), given as (operand index, path).
+
+        Returns:
+            (operand index, path, strerror) of everything that could not be
+            removed. Directories above a failure are left in place and not
+            reported, like rm does.
+        """
+
+        if not roots:
+            return []
+
+        return _TreeRemoval(self, roots).run()
+
+    def walk(self, paths: list[str], with_stat: bool = False, max_depth: Optional[int] = None, ordered: bool = True) -> Iterator[tuple[str, int, Optional[Any], Optional[OSError]]]:
+        """
+        Walks the trees below paths on the worker threads (see _ParallelWalk).
+
+        Yields (path, depth, entry, error) for every path and everything below
+        it, a directory before its contents. entry is an os.DirEntry (a
+        RootEntry for the paths themselves) whose stat() is already cached when
+        with_stat is set. A path that cannot be accessed, or a directory that
+        cannot be listed, yields an error with entry None. Directories at
+        max_depth are not listed. ordered gives the order of a single-threaded
+        walk, otherwise entries come as directories finish.
+
+        Closing the generator (a consumer stopping early) stops the workers.
+        """
+
+        roots: list[tuple[str, Optional[RootEntry], Optional[_Listing], Optional[OSError]]] = []
+
+        for path in paths:
+            try:
+                entry = RootEntry(path, os.lstat(path))
+            except OSError as e:
+                roots.append((path, None, None, e))
+                continue
+
+            descend = entry.is_dir() and (max_depth is None or max_depth > 0)
+            roots.append((path, entry, _Listing(path, 0) if descend else None, None))
+
+        walk = _ParallelWalk(self, [listing for _, _, listing, _ in roots if listing is not None], with_stat, max_depth, ordered)
+        walk.start()
+
+        try:
+            yield from walk.items(roots)
+        finally:
+            walk.stop = True
+            with walk.changed:
+                walk.changed.notify_all()
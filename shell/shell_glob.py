@@ -0,0 +1,358 @@
+import os
+import re
+import time
+import errno
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
+
+# *, ? or a [...] class: the word needs expansion. A lone '[' is literal (`[ -f x ]`).
+_MAGIC_RE = re.compile(r"[*?]|\[.+\]")
+
+# Wildcard characters of a quoted part, escaped as one-character classes for fnmatch
+_ESCAPE_RE = re.compile(r"([*?\[])")
+
+# ^ and \ of a quoted part get a backslash, so a quoted ^ never negates a class
+_BACKSLASH_RE = re.compile(r"([\\^])")
+_UNESCAPE_RE = re.compile(r"\\([\\^])")
+
+def has_magic(text: str) -> bool:
+    return _MAGIC_RE.search(text) is not None
+
+def escape_pattern(text: str) -> str:
+    """ Makes *, ? and [ match themselves: 'a*' -> 'a[*]', ^ and \\ are backslash-escaped: '^' -> '\\^' """
+    return _ESCAPE_RE.sub(r"[\1]", _BACKSLASH_RE.sub(r"\\\1", text))
+
+def _to_fnmatch(component: str) -> str:
+    """
+    fnmatch syntax of a pattern component. [^...] negates like [!...] in bash,
+    where fnmatch takes the ^ as a member, and the escapes of escape_pattern are
+    removed: '[^x]' -> '[!x]', '[\\^x]' -> '[^x]' (^ or x for fnmatch).
+    """
+
+    if "^" not in component and "\\" not in component:
+        return component
+
+    parts = []
+    index = 0
+
+    while index < len(component):
+        character = component[index]
+
+        if character == "[":
+            # The class ends at the first ] after an optional ! / ^ and a leading ] (a member)
+            end = index + 1
+            if component[end:end + 1] in ("!", "^"):
+                end += 1
+            if component[end:end + 1] == "]":
+                end += 1
+            end = component.find("]", end)
+
+            if end != -1:
+                members = component[index + 1:end]
+                if members[:1] == "^":
+                    members = "!" + members[1:]
+                parts.append("[" + _UNESCAPE_RE.sub(r"\1", members) + "]")
+                index = end + 1
+                continue
+
+        elif character == "\\" and component[index + 1:index + 2] in ("\\", "^"):
+            character = component[index + 1]
+            index += 1
+
+        parts.append(character)
+        index += 1
+
+    return "".join(parts)
+
+class GlobWord(str):
+    """
+    Word of the command line with unquoted wildcards, built by the tokenizer.
+
+    The string value is the word itself with quotes removed, which is also the
+    argument when nothing matches (as in bash). pattern is the glob to expand,
+    where wildcards that were quoted are escaped: "a*"* -> a[*]*.
+
+    Words are expanded when the command runs (see ShellGlob), not when the line
+    is parsed: parsed lines are cached and the directory may have changed.
+    """
+
+    def __new__(cls, value: str, pattern: Optional[str] = None):
+        word = super().__new__(cls, value)
+        word.pattern = value if pattern is None else pattern
+        return word
+
+class ShellGlob:
+    """
+    POSIX pathname expansion (*, ?, [...]) plus bash globstar (**) on os.scandir.
+
+    Directory listings are cached per directory and checked with a single stat:
+    a listing is reused as long as the directory's mtime has not changed, so a
+    script that globs the same large directory again and again lists it once.
+    The names matching each pattern are kept with the listing, so repeating the
+    same glob does not even run the matcher again.
+    Listings of directories modified within the last RACY_SECONDS are not
+    trusted, because a change within the same timestamp tick would go unnoticed.
+
+    iter_expand is a generator: matches come out directory by directory in
+    sorted order. expand_word sorts the matches of a word as a whole, as bash
+    does (`**` would otherwise list a/b/c before a/b-c); it collects them, but
+    stops as soon as they outgrow the ARG_MAX bound used for external commands
+    (see expand_args).
+
+    Like bash, names starting with '.' only match a pattern that starts with '.',
+    and ** neither descends into hidden directories nor follows symlinks.
+    """
+
+    CACHE_MAX_DIRECTORIES = 256
+    CACHE_MAX_ENTRIES = 1_000_000
+    CACHE_MAX_PATTERNS = 64 # per directory
+    RACY_SECONDS = 2.0
+
+    def __init__(self):
+        # directory -> (mtime_ns, ((name, is_dir, is_symlink), ...) sorted by name, pattern -> matching entries)
+        self._listings: OrderedDict = OrderedDict()
+        self._cached_entries: int = 0
+        self._matchers: dict = {}
+
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
+
+    # ----------------------
+    # Directory listings
+    # ----------------------
+
+    def clear(self) -> None:
+        self._listings.clear()
+        self._cached_entries = 0
+
+    def _list_directory(self, directory: str) -> tuple[tuple, dict]:
+        """
+        Sorted (name, is_dir, is_symlink) of every entry, () if it cannot be
+        listed, and the dict of pattern matches that goes with the listing.
+        """
+
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return (), {}
+
+        cached = self._listings.get(directory)
+
+        if cached is not None and cached[0] == mtime_ns:
+            self._listings.move_to_end(directory)
+            self.cache_hits += 1
+            return cached[1], cached[2]
+
+        self.cache_misses += 1
+
+        entries = []
+        try:
+            with os.scandir(directory) as scanner:
+                for entry in scanner:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    entries.append((entry.name, is_dir, entry.is_symlink()))
+        except OSError:
+            return (), {}
+
+        entries.sort()
+        listing = tuple(entries)
+
+        if cached is not None:
+            self._listings.pop(directory)
+            self._cached_entries -= len(cached[1])
+
+        matches: dict = {}
+
+        if time.time_ns() - mtime_ns > self.RACY_SECONDS * 1e9 and len(listing) <= self.CACHE_MAX_ENTRIES:
+            self._listings[directory] = (mtime_ns, listing, matches)
+            self._cached_entries += len(listing)
+
+            while len(self._listings) > self.CACHE_MAX_DIRECTORIES or self._cached_entries > self.CACHE_MAX_ENTRIES:
+                _, (_, evicted, _) = self._listings.popitem(last=False) # least recently used
+                self._cached_entries -= len(evicted)
+
+        return listing, matches
+
+    def list_directory(self, directory: str) -> tuple:
+        """ Sorted (name, is_dir, is_symlink) of every entry of directory, from the cache when it is unchanged """
+        return self._list_directory(directory)[0]
+
+    def _match_directory(self, directory: str, component: str) -> tuple:
+        """ Entries of directory matching one pattern component, hidden names only for a pattern starting with '.' """
+
+        listing, matches = self._list_directory(directory)
+        found = matches.get(component)
+
+        if found is None:
+            match = self._matcher(component)
+            match_hidden = component[0] == "."
+            found = tuple(entry for entry in listing if (match_hidden or entry[0][0] != ".") and match(entry[0]) is not None)
+
+            if len(matches) >= self.CACHE_MAX_PATTERNS:
+                matches.clear()
+            matches[component] = found
+
+        return found
+
+    def _matcher(self, component: str):
+        matcher = self._matchers.get(component)
+
+        if matcher is None:
+            if len(self._matchers) > 1024:
+                self._matchers.clear()
+            from fnmatch import translate # loaded by the first glob, not needed to start the shell
+            matcher = self._matchers[component] = re.compile(translate(_to_fnmatch(component))).match
+
+        return matcher
+
+    # ----------------------
+    # Expansion
+    # ----------------------
+
+    def _walk(self, directory: str, prefix: str) -> Iterator[tuple[str, str, bool]]:
+        """ (directory, prefix, is_dir) of every non-hidden entry below directory, depth first, no symlinks followed """
+
+        for name, is_dir, is_symlink in self._list_directory(directory)[0]:
+            if name[0] == ".":
+                continue
+
+            yield (os.path.join(directory, name), prefix + name, is_dir)
+
+            if is_dir and not is_symlink:
+                yield from self._walk(os.path.join(directory, name), prefix + name + "/")
+
+    def _expand(self, directory: str, prefix: str, components: list[str], index: int, dirs_only: bool) -> Iterator[str]:
+        """
+        Matches components[index:] inside directory. prefix is how directory is
+        written in the results ('' for the cwd, 'src/', '/usr/').
+        """
+
+        component = components[index]
+        last = index == len(components) - 1
+
+        if component == "**":
+            if last:
+                # `**` alone: everything below, each directory before its contents.
+                # The zero-directory match is the directory itself (`a/**` gives a/ too).
+                if prefix:
+                    yield prefix
+
+                for _, path, is_dir in self._walk(directory, prefix):
+                    if is_dir or not dirs_only:
+                        yield path + "/" if dirs_only else path
+                return
+
+            # Zero or more directories: this one, then every directory below
+            yield from self._expand(directory, prefix, components, index + 1, dirs_only)
+
+            for subdirectory, path, is_dir in self._walk(directory, prefix):
+                if is_dir:
+                    yield from self._expand(subdirectory, path + "/", components, index + 1, dirs_only)
+            return
+
+        if not has_magic(component):
+            path = prefix + component
+
+            if last:
+                if os.path.isdir(path) if dirs_only else os.path.lexists(path):
+                    yield path + "/" if dirs_only else path
+            else:
+                yield from self._expand(os.path.join(directory, component), path + "/", components, index + 1, dirs_only)
+            return
+
+        for name, is_dir, _ in self._match_directory(directory, component):
+            if last:
+                if is_dir or not dirs_only:
+                    yield prefix + name + "/" if dirs_only else prefix + name
+            elif is_dir:
+                yield from self._expand(os.path.join(directory, name), prefix + name + "/", components, index + 1, dirs_only)
+
+    def iter_expand(self, pattern: str) -> Iterator[str]:
+        """
+        Paths matching the pattern, lazily and sorted within every directory.
+        Yields nothing if there is no match.
+        """
+
+        dirs_only = pattern.endswith("/")
+        components = [component for component in pattern.split("/") if component]
+
+        if not components:
+            return
+
+        if pattern.startswith("/"):
+            yield from self._expand("/", "/", components, 0, dirs_only)
+        else:
+            yield from self._expand(".", "", components, 0, dirs_only)
+
+    def expand_word(self, word: str, max_bytes: Optional[int] = None) -> list[str]:
+        """
+        Matches of a GlobWord, sorted as a whole, or the word itself when
+        nothing matches; other words are returned as is.
+
+        Raises:
+            OSError: E2BIG as soon as the matches take more than max_bytes of
+                argv space (each costs its length, a NUL and a pointer).
+        """
+
+        if not isinstance(word, GlobWord):
+            return [word]
+
+        matches = []
+        used_bytes = 0
+
+        for path in self.iter_expand(word.pattern):
+            if max_bytes is not None:
+                used_bytes += len(path) + 9
+                if used_bytes > max_bytes:
+                    raise OSError(errno.E2BIG, os.strerror(errno.E2BIG))
+            matches.append(path)
+
+        if not matches:
+            return [str(word)]
+
+        matches.sort()
+        return matches
+
+    def expand_args(self, args: Iterable[str], max_bytes: Optional[int] = None) -> tuple[str, ...]:
+        """
+        Arguments with every GlobWord replaced by its matches.
+
+        With max_bytes the expansion stops as soon as the arguments would not fit
+        into that much argv space, so a pattern matching millions of files fails
+        fast instead of materializing an argument list exec would reject anyway.
+
+        Raises:
+            OSError: E2BIG when max_bytes is exceeded.
+        """
+
+        if max_bytes is None:
+            return tuple(path for word in args for path in self.expand_word(word))
+
+        expanded = []
+        used_bytes = 0
+
+        for word in args:
+            for path in self.expand_word(word, max_bytes - used_bytes):
+                used_bytes += len(path) + 9
+                if used_bytes > max_bytes:
+                    raise OSError(errno.E2BIG, os.strerror(errno.E2BIG))
+                expanded.append(path)
+
+        return tuple(expanded)
+
+def argument_space() -> Optional[int]:
+    """ Bytes left for the argv of a child: ARG_MAX minus the environment, None if unknown """
+
+    try:
+        arg_max = os.sysconf("SC_ARG_MAX")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+    if arg_max <= 0:
+        return None
+
+    environment_bytes = sum(len(key) + len(value) + 10 for key, value in os.environ.items())
+    return arg_max - environment_bytes - 2048
@@ -0,0 +1,369 @@
+import os
+import sys
+import mmap
+from array import array
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+try:
+    import fcntl # Unix only
+except ImportError:
+    fcntl = None
+
+def default_history_path() -> str:
+    """ $SHELL_HISTORY_FILE, else ~/.pyshell_history """
+    return os.environ.get("SHELL_HISTORY_FILE") or os.path.join(os.path.expanduser("~"), ".pyshell_history")
+
+class ShellHistory:
+    """
+    Command history kept in an append-only file shared by every session.
+
+    Writing:
+        Every line is added with a single write() on an O_APPEND fd, which the
+        kernel appends atomically, so concurrent sessions never tear or overwrite
+        each other's lines. Writers hold a shared flock, compaction an exclusive
+        one. Once the file grows past COMPACT_BYTES it is rewritten with only the
+        newest occurrence of each command, at most MAX_ENTRIES of them and no more
+        than half of COMPACT_BYTES. The rewrite goes to a temporary file renamed
+        over the history, so a crash never leaves a truncated history behind.
+
+    Reading:
+        Nothing is read at startup. The file is memory mapped and decoded in one
+        piece the first time the history is used, afterwards only the bytes
+        appended since (by this or any other session) are read.
+
+    Searching:
+        The distinct commands, newest first, are cut into blocks of
+        INDEX_BLOCK_COMMANDS. For every 4-byte gram of the UTF-8 text the index
+        keeps the blocks containing it, so a query only looks at blocks holding
+        all of its grams and checks them with `in` on the block text, which
+        runs in C. The grams of a block come from casting its bytes to an array
+        of uint32 at the four offsets, no Python loop per character.
+        The index is built on the first search. Entries appended later are
+        scanned directly and folded into a new, newest block once there are
+        INDEX_TAIL_LINES of them. Queries shorter than four bytes check every
+        block with `in`.
+    """
+
+    COMPACT_BYTES = 32 * 1024 * 1024
+    MAX_ENTRIES = 1_000_000
+    COMPACT_CHECK_EVERY = 256 # appends between two size checks
+    INDEX_BLOCK_COMMANDS = 512
+    INDEX_TAIL_LINES = 4096
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_history_path()
+
+        self._lines: Optional[list[str]] = None     # every entry in file order, None until first use
+        self._loaded_size: int = 0                  # bytes of the file already in _lines
+        self._loaded_inode: Optional[int] = None    # compaction replaces the file
+
+        # Gram index, built by the first search
+        self._grams: Optional[dict[int, array]] = None  # gram -> ids of the blocks containing it, ascending
+        self._blocks: list[tuple[str, list[str], array]] = []  # (text, commands newest first, their entry indexes), oldest block first
+        self._indexed_lines: int = 0                # entries covered by the blocks
+
+        self._last_added: Optional[str] = None
+        self._appends_since_check: int = 0
+
+    # ----------------------
+    # Writing
+    # ----------------------
+
+    def _open_locked(self, flags: int, lock: int) -> int:
+        """
+        Opens the history file and locks it. Retries when the file was replaced by
+        a compaction while waiting for the lock, so nothing is written to the old one.
+        """
+
+        while True:
+            fd = os.open(self.path, flags, 0o600)
+
+            if fcntl is None:
+                return fd
+
+            try:
+                fcntl.flock(fd, lock)
+                if os.fstat(fd).st_ino == os.stat(self.path).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            except BaseException:
+                os.close(fd)
+                raise
+
+            os.close(fd)
+
+    def add(self, line: str) -> None:
+        """
+        Appends a command line. Like bash with ignoreboth, lines starting with a
+        space and repeats of the previous line are not recorded.
+        """
+
+        if not line.strip() or line[0].isspace() or line == self._last_added:
+            return
+
+        self._last_added = line
+        data = (line.replace("\n", " ") + "\n").encode(errors="surrogateescape")
+
+        try:
+            fd = self._open_locked(os.O_WRONLY | os.O_APPEND | os.O_CREAT, fcntl.LOCK_SH if fcntl else 0)
+        except OSError:
+            return # a read-only home must not break the shell
+
+        try:
+            os.write(fd, data)
+
+            self._appends_since_check += 1
+            compact = self._appends_since_check >= self.COMPACT_CHECK_EVERY and os.fstat(fd).st_size > self.COMPACT_BYTES
+
+        except OSError:
+            compact = False
+
+        finally:
+            os.close(fd)
+
+        if compact:
+            self._appends_since_check = 0
+            self.compact()
+
+    def compact(self) -> None:
+        """ Rewrites the file with the newest occurrence of each command, see the class docstring """
+
+        try:
+            fd = self._open_locked(os.O_RDONLY | os.O_CREAT, fcntl.LOCK_EX if fcntl else 0)
+        except OSError:
+            return
+
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+
+        try:
+            kept: list[str] = []
+            seen: set[str] = set()
+            kept_bytes = 0
+
+            # Newest first, so the first occurrence seen is the one to keep
+            for line in reversed(self._read_lines(fd, 0)[0]):
+                if line in seen:
+                    continue
+
+                kept_bytes += len(line) + 1
+                if len(kept) >= self.MAX_ENTRIES or kept_bytes > self.COMPACT_BYTES // 2:
+                    break
+
+                seen.add(line)
+                kept.append(line)
+
+            kept.reverse()
+
+            with open(temporary_path, "w", encoding="utf-8", errors="surrogateescape") as new_file:
+                os.chmod(temporary_path, 0o600)
+                new_file.writelines(line + "\n" for line in kept)
+
+            os.replace(temporary_path, self.path)
+
+        except OSError:
+            try:
+                os.unlink(temporary_path)
+            except OSError:
+                pass
+
+        finally:
+            os.close(fd) # releases the lock, waiting writers reopen the new file
+
+        # Entry numbers changed, everything is read again on next use
+        self._lines = None
+
+    # ----------------------
+    # Reading
+    # ----------------------
+
+    @staticmethod
+    def _read_lines(fd: int, offset: int) -> tuple[list[str], int]:
+        """ Complete lines of the file from offset on, read through mmap, and the offset after them """
+
+        size = os.fstat(fd).st_size
+        if size <= offset:
+            return [], offset
+
+        with mmap.mmap(fd, size, access=mmap.ACCESS_READ) as mapped:
+            end = mapped.rfind(b"\n", offset) + 1
+            if end <= offset:
+                return [], offset # only a line that is still being written
+
+            # Decoded straight from the mapping, no copy of the file in a bytes object
+            with memoryview(mapped) as view, view[offset:end] as lines_view:
+                text = str(lines_view, "utf-8", "surrogateescape")
+
+        return text.split("\n")[:-1], end
+
+    def _sync(self) -> list[str]:
+        """ Brings the in-memory entries up to date with the file, returns them """
+
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            self._lines, self._loaded_size, self._loaded_inode = [], 0, None
+            self._reset_index()
+            return self._lines
+
+        try:
+            file_stat = os.fstat(fd)
+
+            # First use, or the file was compacted / replaced: read it all again
+            if self._lines is None or file_stat.st_ino != self._loaded_inode or file_stat.st_size < self._loaded_size:
+                self._lines, self._loaded_size, self._loaded_inode = [], 0, file_stat.st_ino
+                self._reset_index()
+
+            if file_stat.st_size > self._loaded_size:
+                new_lines, self._loaded_size = self._read_lines(fd, self._loaded_size)
+                self._lines.extend(new_lines)
+
+        finally:
+            os.close(fd)
+
+        return self._lines
+
+    def recent(self, count: int) -> list[str]:
+        """
+        The last count entries, read from the end of the file only. Used to
+        seed line editing at startup without loading the whole history.
+        """
+
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return []
+
+        try:
+            size = os.fstat(fd).st_size
+            read_size = 256 * count
+
+            while True:
+                start = max(size - read_size, 0)
+                lines = os.pread(fd, size - start, start).decode("utf-8", "surrogateescape").split("\n")[:-1]
+
+                if start > 0:
+                    lines = lines[1:] # the first line may be cut
+
+                if len(lines) >= count or start == 0:
+                    return lines[-count:] if count else []
+
+                read_size *= 4
+
+        finally:
+            os.close(fd)
+
+    def entries(self) -> list[str]:
+        """ Every entry, oldest first (entry n is entries()[n - 1]) """
+        return self._sync()
+
+    # ----------------------
+    # Searching
+    # ----------------------
+
+    @staticmethod
+    def _grams_of(data: bytes) -> set[int]:
+        """ Every 4-byte substring of data as a native-endian uint32 """
+
+        grams: set[int] = set()
+
+        for offset in range(4):
+            usable = (len(data) - offset) // 4 * 4
+            if usable > 0:
+                grams.update(memoryview(data)[offset:offset + usable].cast("I"))
+
+        return grams
+
+    def _reset_index(self) -> None:
+        self._grams = None
+        self._blocks = []
+        self._indexed_lines = 0
+
+    def _add_blocks(self, commands: list[str], entries: list[int]) -> None:
+        """ Indexes distinct commands given newest first; the newest block gets the highest id """
+
+        size = self.INDEX_BLOCK_COMMANDS
+        chunks = [(commands[start:start + size], entries[start:start + size]) for start in range(0, len(commands), size)]
+
+        for block_commands, block_entries in reversed(chunks):
+            text = "\n".join(block_commands)
+            block_id = len(self._blocks)
+            self._blocks.append((text, block_commands, array("q", block_entries)))
+
+            for gram in self._grams_of(text.encode("utf-8", "surrogateescape")):
+                blocks = self._grams.get(gram)
+                if blocks is None:
+                    blocks = self._grams[gram] = array("I")
+                blocks.append(block_id)
+
+    def _update_index(self, lines: list[str]) -> None:
+        """ Builds the index on first use, folds the entries appended since into it once they are many """
+
+        if self._grams is None:
+            self._grams = {}
+            tail_start = 0
+        elif len(lines) - self._indexed_lines >= self.INDEX_TAIL_LINES:
+            tail_start = self._indexed_lines
+        else:
+            return
+
+        tail = lines[tail_start:]
+        newest = dict(zip(tail, range(tail_start, len(lines)))) # later entries overwrite earlier ones
+        commands = list(dict.fromkeys(reversed(tail)))
+
+        # A command already in an older block is found in the new one first, search() skips the rest
+        self._add_blocks(commands, [newest[command] for command in commands])
+        self._indexed_lines = len(lines)
+
+    def _candidate_blocks(self, query: str) -> Iterable[int]:
+        """ Ids of the blocks that may contain query, newest first """
+
+        data = query.encode("utf-8", "surrogateescape")
+
+        if len(data) < 4:
+            return range(len(self._blocks) - 1, -1, -1)
+
+        candidates: Optional[set[int]] = None
+
+        for gram in sorted({int.from_bytes(data[i:i + 4], sys.byteorder) for i in range(len(data) - 3)},
+                           key=lambda gram: len(self._grams.get(gram, ()))):
+            blocks = self._grams.get(gram)
+            if blocks is None:
+                return ()
+
+            candidates = set(blocks) if candidates is None else candidates.intersection(blocks)
+            if not candidates:
+                return ()
+
+        return sorted(candidates, reverse=True)
+
+    def iter_search(self, query: str) -> Iterator[tuple[int, str]]:
+        """ (entry number, command) of distinct commands containing query, most recently used first """
+
+        lines = self._sync()
+        self._update_index(lines)
+
+        seen: set[str] = set()
+
+        # Entries not in the index yet are the newest ones
+        for position in range(len(lines) - 1, self._indexed_lines - 1, -1):
+            line = lines[position]
+            if query in line and line not in seen:
+                seen.add(line)
+                yield position + 1, line
+
+        for block_id in self._candidate_blocks(query):
+            text, commands, entries = self._blocks[block_id]
+
+            if query not in text:
+                continue
+
+            for command, entry in zip(commands, entries):
+                if query in command and command not in seen:
+                    seen.add(command)
+                    yield entry + 1, command
+
+    def search(self, query: str, limit: Optional[int] = None) -> list[tuple[int, str]]:
+        """ First limit (default all) results of iter_search """
+        return list(islice(self.iter_search(query), limit))
@@ -0,0 +1,146 @@
+from typing import Callable, Optional
+from shell_stats import wait_child
+
+class ShellJob:
+    """
+    Handle of a started pipeline (one or more stages).
+
+    Foreground pipelines are waited for right away, background ones (`cmd &`)
+    are kept in the ShellJobTable until they finish.
+
+    Children are reaped with os.wait4 (see wait_child), their rusage is passed
+    to on_child_exit (ShellStats.record_child) when it is set.
+    """
+
+    __slots__ = ("job_id", "command_line", "processes", "threads", "statuses", "last_position", "status_code", "on_child_exit")
+
+    def __init__(self, command_line: str, last_position: int):
+        self.job_id: int = 0
+        self.command_line = command_line
+        self.processes: dict = {}                          # position -> external stage (subprocess.Popen or SpawnedProcess)
+        self.threads: list = []                            # builtin stages (threading.Thread)
+        self.statuses: dict[int, int] = {}                 # position -> status of finished / failed stages
+        self.last_position = last_position
+        self.status_code: Optional[int] = None             # status of the last stage once finished
+        self.on_child_exit: Optional[Callable] = None      # called with the rusage of every reaped child
+
+    @property
+    def pids(self) -> list[int]:
+        return [process.pid for process in self.processes.values()]
+
+    def poll(self) -> Optional[int]:
+        """ Non-blocking check (wait4 with WNOHANG), returns the status once every stage finished """
+
+        if self.status_code is not None:
+            return self.status_code
+
+        finished = True
+
+        for position, process in self.processes.items():
+            rusage = wait_child(process, block=False)
+            if rusage is not None and self.on_child_exit is not None:
+                self.on_child_exit(rusage)
+
+            if process.returncode is None:
+                finished = False
+            else:
+                self.statuses[position] = process.returncode
+
+        if not finished or any(thread.is_alive() for thread in self.threads):
+            return None
+
+        self.status_code = self.statuses.get(self.last_position, 1)
+        return self.status_code
+
+    def wait(self) -> int:
+        """ Blocks until every stage finished, returns the status of the last stage """
+
+        if self.status_code is not None:
+            return self.status_code
+
+        for thread in self.threads:
+            thread.join()
+
+        for position, process in self.processes.items():
+            rusage = wait_child(process)
+            if rusage is not None and self.on_child_exit is not None:
+                self.on_child_exit(rusage)
+            self.statuses[position] = process.returncode
+
+        self.status_code = self.statuses.get(self.last_position, 1)
+        return self.status_code
+
+class ShellJobTable:
+    """
+    Background jobs of the shell, numbered like in bash ([1], [2], ...).
+
+    Finished jobs are collected with reap(), which only polls the children
+    (waitpid WNOHANG), so it never blocks the prompt. Without a prompt to
+    report them at, collect() keeps them for `jobs` instead.
+    """
+
+    # Finished jobs collect() keeps until `jobs` reports them, the oldest are dropped
+    MAX_FINISHED = 256
+
+    def __init__(self):
+        self._jobs: dict[int, ShellJob] = {}    # job id -> job, in start order
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def add(self, job: ShellJob) -> int:
+        """ Registers a background job and returns its job id """
+
+        job.job_id = max(self._jobs, default=0) + 1
+        self._jobs[job.job_id] = job
+        return job.job_id
+
+    def get(self, job_spec: Optional[str] = None) -> Optional[ShellJob]:
+        """ Returns the job for '%n' / 'n', or the most recent job when job_spec is None """
+
+        if job_spec is None:
+            return self._jobs[max(self._jobs)] if self._jobs else None
+
+        try:
+            return self._jobs.get(int(job_spec.lstrip("%")))
+        except ValueError:
+            return None
+
+    def remove(self, job: ShellJob) -> None:
+        self._jobs.pop(job.job_id, None)
+
+    def clear(self) -> None:
+        """ Forgets every job, e.g. in a forked subshell, whose jobs are not its children """
+        self._jobs.clear()
+
+    def jobs(self) -> list[ShellJob]:
+        return list(self._jobs.values())
+
+    def reap(self) -> list[ShellJob]:
+        """ Removes and returns jobs that finished since the last call """
+
+        finished = [job for job in self._jobs.values() if job.poll() is not None]
+
+        for job in finished:
+            self.remove(job)
+
+        return finished
+
+    def collect(self) -> None:
+        """ Polls every job, so finished children are reaped, and keeps the newest MAX_FINISHED finished jobs """
+
+        finished = [job for job in self._jobs.values() if job.poll() is not None]
+
+        for job in finished[:max(len(finished) - self.MAX_FINISHED, 0)]:
+            self.remove(job)
+
+    def marker(self, job: ShellJob) -> str:
+        """ '+' for the current (most recent) job, '-' for the previous one """
+
+        job_ids = sorted(self._jobs)
+
+        if job_ids and job.job_id == job_ids[-1]:
+            return "+"
+        if len(job_ids) > 1 and job.job_id == job_ids[-2]:
+            return "-"
+        return " "
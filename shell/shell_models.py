@@ -1,18 +1,221 @@
-from pydantic import BaseModel
 from typing import Optional
 
-class CommandObject(BaseModel):
-    command: str
-    args: list[str]
-    stdin_redirect: Optional[str] = None
-    stdout_redirect: Optional[str] = None
-    operator: Optional[str] = None # "&&", "||", or None
-    output: Optional[str] = None
-    output_status_code: int = 0 # 0 succeeded 1 failed
-    unsuported_command: bool = False
+class CommandObject:
+    """
+    Single command of the parsed command line.
+
+    Plain __slots__ class instead of a pydantic model: the parser creates one per
+    command, so it has to be cheap to build (no per-field validation, no __dict__).
+    Values coming from outside the parser (API boundaries) should be checked
+    with validate().
+
+    The parser builds args as a tuple: command objects are cached inside the
+    trees returned by ShellExecutor.parse_line and shared between runs, they
+    must not be modified.
+
+    redirections holds every redirect in command line order as (fd, mode, target):
+        (0, "<", "in.txt")    (1, ">", "out.txt")    (2, ">>", "err.log")
+        (2, ">&", "1")        -> 2>&1, target is the fd number
+    stdin_redirect / stdout_redirect keep the last file stdin / stdout go to.
+
+    has_globs is True when args holds GlobWords, which the executor expands
+    before the command runs (see shell_glob.py).
+    """
+
+    __slots__ = (
+        "command",
+        "args",
+        "stdin_redirect",
+        "stdout_redirect",
+        "redirections",
+        "operator",
+        "output",
+        "output_status_code",
+        "unsuported_command",
+        "has_globs",
+    )
+
+    def __init__(
+        self,
+        command: str,
+        args: list[str],
+        stdin_redirect: Optional[str] = None,
+        stdout_redirect: Optional[str] = None,
+        redirections: Optional[list[tuple[int, str, str]]] = None,
+        operator: Optional[str] = None, # "&&", "||", ";", "|" or None
+        output: Optional[str] = None,
+        output_status_code: int = 0, # 0 succeeded 1 failed
+        unsuported_command: bool = False,
+        has_globs: bool = False,
+    ):
+        self.command = command
+        self.args = args
+        self.stdin_redirect = stdin_redirect
+        self.stdout_redirect = stdout_redirect
+        self.redirections = redirections
+        self.operator = operator
+        self.output = output
+        self.output_status_code = output_status_code
+        self.unsuported_command = unsuported_command
+        self.has_globs = has_globs
+
+    def validate(self) -> "CommandObject":
+        """ Checks field types, raises TypeError on the first invalid field """
+
+        if not isinstance(self.command, str):
+            raise TypeError(f"CommandObject.command must be str, got {type(self.command).__name__}")
+
+        if not isinstance(self.args, (list, tuple)) or not all(isinstance(arg, str) for arg in self.args):
+            raise TypeError("CommandObject.args must be a list or tuple of str")
+
+        for field in ("stdin_redirect", "stdout_redirect", "operator", "output"):
+            value = getattr(self, field)
+            if value is not None and not isinstance(value, str):
+                raise TypeError(f"CommandObject.{field} must be str or None, got {type(value).__name__}")
+
+        if self.redirections is not None:
+            for redirection in self.redirections:
+                if (
+                    len(redirection) != 3
+                    or not isinstance(redirection[0], int)
+                    or redirection[1] not in ("<", ">", ">>", ">&")
+                    or not isinstance(redirection[2], str)
+                ):
+                    raise TypeError(f"CommandObject.redirections has an invalid entry: {redirection!r}")
+
+        if not isinstance(self.output_status_code, int):
+            raise TypeError("CommandObject.output_status_code must be int")
+
+        if not isinstance(self.unsuported_command, bool):
+            raise TypeError("CommandObject.unsuported_command must be bool")
+
+        if not isinstance(self.has_globs, bool):
+            raise TypeError("CommandObject.has_globs must be bool")
+
+        return self
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CommandObject):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.__slots__)
+        return f"CommandObject({fields})"
 
 class CommandTreeNode:
-    def __init__(self, data=None, right=None, left=None):
+    """
+    Node of the command line AST built by ShellParser.parse.
+
+        kind        children                            other fields
+        LIST        and-or chains run one after another background: True for items ending with '&'
+        AND_OR      pipelines joined by && / ||         operators: (None, "&&", "||", ...), skip_to
+        PIPELINE    stages joined by |
+        SUBSHELL    ( list )                            redirections
+        GROUP       { list; }                           redirections
+        TIME        the pipeline after `time` (or none)
+        COMMAND     -                                   data: the CommandObject
+
+    Nodes with a single child are never built, `ls` is a lone COMMAND node and
+    `a && b; c` is LIST(AND_OR(a, b), c).
+
+    skip_to[i] is the index of the first pipeline after i joined by the other
+    operator. When pipeline i is skipped (&& after a failure, || after a success)
+    the status does not change, so every following pipeline joined by the same
+    operator is skipped too and the evaluator jumps straight to skip_to[i].
+
+    Trees cached by ShellExecutor.parse_line are shared between runs, they must
+    not be modified.
+    """
+
+    LIST = "list"
+    AND_OR = "and_or"
+    PIPELINE = "pipeline"
+    SUBSHELL = "subshell"
+    GROUP = "group"
+    TIME = "time"
+    COMMAND = "command"
+
+    __slots__ = ("kind", "data", "children", "operators", "skip_to", "background", "redirections")
+
+    def __init__(
+        self,
+        kind: str,
+        data: Optional[CommandObject] = None,
+        children: tuple["CommandTreeNode", ...] = (),
+        operators: tuple[Optional[str], ...] = (),
+        background: tuple[bool, ...] = (),
+        redirections: Optional[tuple[tuple[int, str, str], ...]] = None,
+    ):
+        self.kind = kind
         self.data = data
-        self.right = right
-        self.left = left
\ No newline at end of file
+        self.children = children
+        self.operators = operators
+        self.background = background
+        self.redirections = redirections
+        self.skip_to = self._build_skip_table(operators)
+
+    @staticmethod
+    def _build_skip_table(operators: tuple[Optional[str], ...]) -> tuple[int, ...]:
+        """ Computes skip_to from the end, so a chain of any length is handled in one pass """
+
+        skip_to = [len(operators)] * len(operators)
+
+        for index in range(len(operators) - 2, -1, -1):
+            if operators[index + 1] != operators[index]:
+                skip_to[index] = index + 1
+            else:
+                skip_to[index] = skip_to[index + 1]
+
+        return tuple(skip_to)
+
+    @staticmethod
+    def _describe_redirections(redirections) -> str:
+        words = []
+
+        for fd, mode, target in redirections or ():
+            if mode == ">&":
+                words.append(f"{fd}>&{target}")
+            elif mode == "<":
+                words.append(f"< {target}")
+            else:
+                words.append(f"{'' if fd == 1 else fd}{mode} {target}")
+
+        return " ".join(words)
+
+    def describe(self) -> str:
+        """ Command line text of the node, shown by `jobs` """
+
+        if self.kind == self.COMMAND:
+            command_object = self.data
+            text = " ".join([command_object.command, *command_object.args])
+            redirections = self._describe_redirections(command_object.redirections)
+            return f"{text} {redirections}" if redirections else text
+
+        if self.kind == self.PIPELINE:
+            return " | ".join(child.describe() for child in self.children)
+
+        if self.kind == self.AND_OR:
+            parts = [self.children[0].describe()]
+            for operator, child in zip(self.operators[1:], self.children[1:]):
+                parts.append(f"{operator} {child.describe()}")
+            return " ".join(parts)
+
+        if self.kind == self.LIST:
+            parts = []
+            for child, background in zip(self.children, self.background):
+                parts.append(child.describe() + (" &" if background else ";"))
+            return " ".join(parts).rstrip(";")
+
+        if self.kind == self.TIME:
+            return " ".join(["time", *(child.describe() for child in self.children)])
+
+        inner = self.children[0].describe()
+        text = f"( {inner} )" if self.kind == self.SUBSHELL else f"{{ {inner}{'' if inner.endswith('&') else ';'} }}"
+        redirections = self._describe_redirections(self.redirections)
+        return f"{text} {redirections}" if redirections else text
+
+    def __repr__(self) -> str:
+        if self.kind == self.COMMAND:
+            return f"CommandTreeNode(command, {self.data.command!r})"
+        return f"CommandTreeNode({self.kind}, {list(self.children)!r})"
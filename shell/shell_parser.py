@@ -1,58 +1,94 @@
-from shell_models import CommandObject
-from typing import List
+from shell_models import CommandObject, CommandTreeNode
+from shell_glob import GlobWord
+from shell_tokenizer import ShellTokenizer, Token
+from typing import List, Optional
 
 class ShellParser:
     """
     ShellParser is responsible for getting the tokenized commands and 
-    parsing it to the CommandObjects data type
-    representing the program flow.
+    parsing it to a CommandTreeNode AST representing the program flow.
+
+    Grammar (lowest precedence first, same as a POSIX shell):
+        list      := and_or ((';' | '&') and_or)* [';' | '&']
+        and_or    := pipeline (('&&' | '||') pipeline)*
+        pipeline  := command ('|' command)*
+        pipeline  := 'time' [pipeline]
+        command   := simple_command | '(' list ')' redirect* | '{' list '}' redirect*
+
+    '{', '}' and 'time' are reserved words, they are only recognized where a
+    command name is expected, so `echo {` and `echo time` just print the word.
+    Operators and redirects are told apart from words by the token kind, so a
+    quoted "|", '&&' or ">" is an ordinary argument.
     """
 
-    def __init__(self, supported: set[str], redirects: set[str], operators: set[str]):
+    def __init__(self, supported: set[str], redirects: dict[str, tuple], operators: set[str]):
         self.supported_commands = supported
         self.operators = operators
         self.redirects = redirects
 
-    def _create_command_object(self, token: str) -> None:
-        """ Creates new CommandObject in the commands_flow_list """
-        self._commands_flow_list.append(CommandObject(command=token, args=[]))
-        self._commands_flow_index+=1
+    def _peek(self) -> Optional[str]:
+        """ Returns the text of the current token without consuming it, None at the end of the line """
+
+        if self._position < len(self._tokens):
+            return self._tokens[self._position].value
+        return None
+
+    def _peek_kind(self) -> Optional[str]:
+        """ Returns the kind of the current token (ShellTokenizer.WORD, ...), None at the end of the line """
+
+        if self._position < len(self._tokens):
+            return self._tokens[self._position].kind
+        return None
+
+    def _peek_operator(self) -> Optional[str]:
+        """ Returns the current token if it is an operator (|, &&, ;, ( ...), None for a word, a redirect or the end of the line """
+
+        if self._position < len(self._tokens):
+            token = self._tokens[self._position]
+            if token.kind == ShellTokenizer.OPERATOR:
+                return token.value
+        return None
+
+    def _advance(self) -> str:
+        token = self._tokens[self._position]
+        self._position += 1
+        return token.value
 
-    def _assign_redirect(self, redirect: str, redirect_file: str) -> None:
-        """ Assigns redirect parameter to existing CommandObject
+    def _expect(self, expected: str) -> None:
+        """ Consumes the closing ')' (an operator) or '}' (a reserved word), a syntax error for anything else """
+
+        token = self._peek()
+        kind = ShellTokenizer.OPERATOR if expected == ")" else ShellTokenizer.WORD
+
+        if token != expected or self._peek_kind() != kind:
+            if token is None:
+                raise ValueError(f"unexpected end of line, expected '{expected}'")
+            raise ValueError(f"unexpected token '{token}', expected '{expected}'")
+
+        self._position += 1
+
+    def _parse_redirect(self, redirections: list) -> None:
+        """ Consumes a redirect token (and its file name) and appends (fd, mode, target) to redirections
 
         Args:
-            redirect (str): redirect token from command
-            redirect_file (str): file which redirect will points to
+            redirections (list): redirections of the command, in command line order
 
         Return:
             None
         """
-        redirect_command = self.redirects.get(redirect)
-        setattr(self._get_current_command_object(), redirect_command, redirect_file)
+        fd, mode, fixed_target = self.redirects[self._advance()]
 
-    def _assign_operator(self, operator: str) -> None:
-        """ Assigns operator parameter to existing CommandObject """
-        self._get_current_command_object().operator = operator
-
-    def _assign_argument(self, argument: str) -> None:
-        """ Assigns argument parameter to existing CommandObject list of args """
-        self._get_current_command_object().args.append(argument)
-
-    def _get_current_command_object(self) -> CommandObject:
-        """ Returns current command object """
-        return self._commands_flow_list[self._commands_flow_index]
-    
-    def _token_assigned_to_stdin(self, token: str) -> bool:
-        """Check if token is assign to stdin or stdout parameter in CommandObject"""
+        if fixed_target is None:
+            # The next word is the file the redirect points to
+            if self._peek_kind() != ShellTokenizer.WORD:
+                raise ValueError(f"expected a file name after '{self._tokens[self._position - 1].value}'")
+            target = self._advance()
+        else:
+            # fd duplication such as 2>&1, no file name follows
+            target = fixed_target
 
-        current_command_object = self._get_current_command_object()
+        redirections.append((fd, mode, target))
 
-        if token == current_command_object.stdin_redirect or current_command_object.stdout_redirect:
-            return True
-        
-        return False
-    
     def _lookup_command(self, command: str) -> bool:
         """Check if command is in list of supported commands"""
 
@@ -60,70 +96,198 @@ class ShellParser:
             return True
         
         return False
-    
-    def _create_unsuported_command_object(self, command: str):
-        """Creates unsuported command object"""
-        self._commands_flow_list.append(CommandObject(command=command, args=[], unsuported_command=True))
 
-    def parse(self, tokenized_commands: List[str]) -> List[CommandObject]:
+    def _parse_simple_command(self) -> CommandTreeNode:
+        """ Command name, arguments and redirections up to the next operator """
+
+        command: Optional[str] = None
+        args: list[str] = []
+        redirections: list = []
+
+        while True:
+            kind = self._peek_kind()
+
+            if kind is None or kind == ShellTokenizer.OPERATOR:
+                break
+
+            if kind == ShellTokenizer.REDIRECT:
+                self._parse_redirect(redirections)
+            elif command is None:
+                command = self._advance()
+            else:
+                args.append(self._advance())
+
+        if command is None:
+            raise ValueError("missing command before redirection")
+
+        command_object = CommandObject(
+            command=command,
+            args=tuple(args),
+            redirections=tuple(redirections) or None,
+            operator=self._peek_operator(),
+            unsuported_command=not self._lookup_command(command),
+            has_globs=any(isinstance(arg, GlobWord) for arg in args),
+        )
+
+        # Last file stdin / stdout are redirected to
+        for fd, mode, target in redirections:
+            if mode == "<":
+                command_object.stdin_redirect = target
+            elif fd == 1 and mode in (">", ">>"):
+                command_object.stdout_redirect = target
+
+        return CommandTreeNode(CommandTreeNode.COMMAND, data=command_object)
+
+    def _parse_command(self) -> CommandTreeNode:
+        """ Simple command, ( subshell ) or { group } """
+
+        token = self._peek()
+        operator = self._peek_operator()
+
+        if token is None:
+            raise ValueError("unexpected end of line")
+
+        if operator == "(" or token == "{":
+            self._position += 1
+            closing = ")" if token == "(" else "}"
+            inner = self._parse_list(closing)
+            self._expect(closing)
+
+            redirections: list = []
+            while self._peek_kind() == ShellTokenizer.REDIRECT:
+                self._parse_redirect(redirections)
+
+            kind = CommandTreeNode.SUBSHELL if token == "(" else CommandTreeNode.GROUP
+            return CommandTreeNode(kind, children=(inner,), redirections=tuple(redirections) or None)
+
+        if operator is not None:
+            raise ValueError(f"unexpected token '{token}'")
+
+        return self._parse_simple_command()
+
+    def _parse_pipeline(self) -> CommandTreeNode:
+        if self._peek() == "time":
+            # `time` reports the resources of the whole pipeline after it
+            self._position += 1
+            operator = self._peek_operator()
+
+            if self._peek() is None or (operator is not None and operator != "("):
+                return CommandTreeNode(CommandTreeNode.TIME)
+
+            return CommandTreeNode(CommandTreeNode.TIME, children=(self._parse_pipeline(),))
+
+        stages = [self._parse_command()]
+
+        while self._peek_operator() == "|":
+            self._position += 1
+            stages.append(self._parse_command())
+
+        if len(stages) == 1:
+            return stages[0]
+
+        return CommandTreeNode(CommandTreeNode.PIPELINE, children=tuple(stages))
+
+    def _parse_and_or(self) -> CommandTreeNode:
+        pipelines = [self._parse_pipeline()]
+        operators: list[Optional[str]] = [None]
+
+        while self._peek_operator() in ("&&", "||"):
+            operators.append(self._advance())
+            pipelines.append(self._parse_pipeline())
+
+        if len(pipelines) == 1:
+            return pipelines[0]
+
+        return CommandTreeNode(CommandTreeNode.AND_OR, children=tuple(pipelines), operators=tuple(operators))
+
+    def _parse_list(self, closing: Optional[str]) -> CommandTreeNode:
+        """ and-or chains separated by ';' or '&', up to `closing` (')' / '}') or the end of the line """
+
+        items: list[CommandTreeNode] = []
+        background: list[bool] = []
+
+        while True:
+            token = self._peek()
+
+            if token is None or self._peek_operator() == ")" or (closing == "}" and token == "}"):
+                break
+
+            items.append(self._parse_and_or())
+
+            separator = self._peek_operator()
+            if separator in (";", "&"):
+                self._position += 1
+                background.append(separator == "&")
+            else:
+                background.append(False)
+                break
+
+        if not items:
+            token = self._peek()
+            raise ValueError(f"unexpected token '{token}'" if token is not None else "unexpected end of line")
+
+        if len(items) == 1 and not background[0]:
+            return items[0]
+
+        return CommandTreeNode(CommandTreeNode.LIST, children=tuple(items), background=tuple(background))
+
+    def parse(self, tokenized_commands: List[Token]) -> Optional[CommandTreeNode]:
         """Parses tokenized commands provided by user from the console.
 
         Args:
-            list[str]: List of shell-compatible tokens.
+            list[Token]: Typed tokens from ShellTokenizer.tokenize_typed.
 
         Returns:
-            commands_flow_list 
+            Root CommandTreeNode of the line, None for an empty line.
+
+        Raises:
+            ValueError: On a syntax error (unexpected or missing token).
 
         Example:
-            >>> tokenized_commands = ['echo', 'Hello     world', '>', './cmd/files/mop.md', '&&', 'echo', 'Hello', 'world']
-            >>> commands_flow_list =
-            >>> [
-            >>>        CommandObject(
+            >>> tokenized_commands = ShellTokenizer.tokenize_typed('echo "Hello     world" > ./cmd/files/mop.md && echo Hello world')
+            >>> tree =
+            >>> CommandTreeNode(
+            >>>     kind='and_or',
+            >>>     operators=(None, '&&'),
+            >>>     skip_to=(1, 2),
+            >>>     children=(
+            >>>         CommandTreeNode(kind='command', data=CommandObject(
             >>>            command='echo', 
-            >>>            args=['Hello     world'], 
+            >>>            args=('Hello     world',), 
             >>>            stdin_redirect=None, 
             >>>            stdout_redirect='./cmd/files/mop.md', 
+            >>>            redirections=((1, '>', './cmd/files/mop.md'),), 
             >>>            operator='&&', 
             >>>            output=None, 
             >>>            output_status_code=0
-            >>>        ), 
-            >>>        CommandObject(
+            >>>         )), 
+            >>>         CommandTreeNode(kind='command', data=CommandObject(
             >>>            command='echo', 
-            >>>            args=['Hello world'], 
+            >>>            args=('Hello', 'world'), 
             >>>            stdin_redirect=None, 
             >>>            stdout_redirect=None, 
+            >>>            redirections=None, 
             >>>            operator=None, 
             >>>            output=None, 
             >>>            output_status_code=0
-            >>>        )
-            >>>  ]
+            >>>         )),
+            >>>     )
+            >>> )
         """
 
-        self._commands_flow_list = []
-        self._commands_flow_index = -1
+        self._tokens = tokenized_commands
+        self._position = 0
 
-        main_command = tokenized_commands[0]
-        command_supported = self._lookup_command(main_command)
+        if not tokenized_commands:
+            return None
 
-        if command_supported:
-            for index, token in enumerate(tokenized_commands):
+        try:
+            tree = self._parse_list(None)
+        except RecursionError:
+            raise ValueError("too many nested groups") from None
 
-                if token in self.supported_commands:
-                    self._create_command_object(token)
-
-                elif token in self.redirects:
-                    file_name = tokenized_commands[index + 1]
-                    self._assign_redirect(token, file_name)
-        
-                elif token in self.operators:
-                    self._assign_operator(token)
+        if self._position < len(tokenized_commands):
+            # Only a ')' without a matching '(' stops the top level list early
+            raise ValueError(f"unexpected token '{self._peek()}'")
 
-                else:
-                    if self._token_assigned_to_stdin(token):
-                        continue
-
-                    self._assign_argument(token)
-        else:
-            self._create_unsuported_command_object(main_command)
-        
-        return self._commands_flow_list
\ No newline at end of file
+        return tree
@@ -0,0 +1,142 @@
+import os
+import time
+from typing import Optional
+
+class ShellPathCache:
+    """
+    Bash-style ``hash`` table that maps command names to resolved executable paths.
+
+    Searching PATH costs an isfile + access call for every PATH directory, for every
+    external command. The table remembers where a command was found, so the next
+    lookup of the same name costs a single stat of its directory.
+
+    The table is dropped when:
+        - the PATH environment variable changes,
+        - the mtime of any PATH directory changes (a program was added, removed or
+          renamed). The directory holding the hit is checked on every lookup, the
+          whole PATH at most once every MTIME_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self.MTIME_CHECK_INTERVAL: float = 1.0
+
+        self._table: dict[str, str] = {}            # command name -> full path
+        self._hit_counts: dict[str, int] = {}       # command name -> number of hits
+        self._path_value: Optional[str] = None      # PATH the table was built for
+        self._path_dirs: list[str] = []
+        self._dir_mtimes: dict[str, Optional[float]] = {}
+        self._last_full_check: float = 0.0
+
+        # Counters for the whole table, shown by `hash`
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def _dir_mtime(folder_path: str) -> Optional[float]:
+        """ Returns mtime of the directory or None if it does not exist """
+        try:
+            return os.stat(folder_path).st_mtime
+        except OSError:
+            return None
+
+    def clear(self) -> None:
+        """ Forgets every remembered location (``hash -r``) """
+        self._table.clear()
+        self._hit_counts.clear()
+        self._dir_mtimes.clear()
+        self._last_full_check = time.monotonic()
+
+    def _validate(self) -> None:
+        """ Drops the table when PATH or any of its directories changed """
+
+        path_value = os.environ.get("PATH", "")
+
+        if path_value != self._path_value:
+            self._path_value = path_value
+            self._path_dirs = path_value.split(os.pathsep)
+            self.clear()
+            return
+
+        now = time.monotonic()
+
+        if now - self._last_full_check < self.MTIME_CHECK_INTERVAL:
+            return
+
+        self._last_full_check = now
+
+        for folder_path, mtime in self._dir_mtimes.items():
+            if self._dir_mtime(folder_path) != mtime:
+                self.clear()
+                return
+
+    def _search(self, executable_file_name: str) -> Optional[str]:
+        """ Searches every PATH directory, recording the mtimes of the ones visited """
+
+        for folder_path in self._path_dirs:
+            if folder_path not in self._dir_mtimes:
+                self._dir_mtimes[folder_path] = self._dir_mtime(folder_path)
+
+            potential_path = os.path.join(folder_path, executable_file_name)
+
+            # Check if the path exists, is a file, and is executable
+            if os.path.isfile(potential_path) and os.access(potential_path, os.X_OK):
+                return potential_path
+
+        return None
+
+    def lookup(self, executable_file_name: str) -> Optional[str]:
+        """
+        Returns full path to the executable, or None if it is not in PATH.
+        Names containing a slash are not searched in PATH nor remembered.
+        """
+
+        if os.sep in executable_file_name:
+            if os.path.isfile(executable_file_name) and os.access(executable_file_name, os.X_OK):
+                return executable_file_name
+            return None
+
+        self._validate()
+
+        cached_path = self._table.get(executable_file_name)
+
+        if cached_path is not None:
+            folder_path = os.path.dirname(cached_path)
+
+            # One stat instead of a full PATH search
+            if self._dir_mtime(folder_path) == self._dir_mtimes.get(folder_path):
+                self.hits += 1
+                self._hit_counts[executable_file_name] += 1
+                return cached_path
+
+            self.clear()
+
+        self.misses += 1
+        found_path = self._search(executable_file_name)
+
+        if found_path is not None:
+            self._table[executable_file_name] = found_path
+            self._hit_counts[executable_file_name] = 0
+
+        return found_path
+
+    def forget(self, executable_file_name: str) -> None:
+        """ Removes a single remembered command """
+        self._table.pop(executable_file_name, None)
+        self._hit_counts.pop(executable_file_name, None)
+
+    def adopt(self, other: "ShellPathCache", hits_before: int, misses_before: int) -> None:
+        """
+        Takes over the table of a copy of this cache (built by a forked shell
+        server line). The counters add what the copy counted after it had
+        hits_before / misses_before.
+        """
+
+        hits = self.hits + other.hits - hits_before
+        misses = self.misses + other.misses - misses_before
+
+        self.__dict__.update(other.__dict__)
+        self.hits, self.misses = hits, misses
+
+    def entries(self) -> list[tuple[int, str]]:
+        """ Returns (hits, full path) pairs of remembered commands """
+        return [(self._hit_counts[name], path) for name, path in self._table.items()]
@@ -0,0 +1,527 @@
+import os
+import sys
+import json
+import stat
+import pickle
+import signal
+import socket
+import struct
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from shell_client import REQUEST, STDOUT, STDERR, STATUS, RECEIVE_SIZE, default_socket_path, encode_frame, pop_frame
+from shell_executor import ShellExecutor
+from shell_spawn import FORK_AVAILABLE, SpawnedProcess, fork_process
+from shell_stats import wait_child
+from shell_tokenizer import ShellTokenizer
+
+class ShellServer:
+    """
+    Long-lived shell serving command lines over a Unix domain socket.
+
+    One ShellExecutor answers every client, so the parse cache, the PATH hash
+    table, the DNS cache of `net` and the stats table stay warm between
+    requests, and a request costs a round-trip instead of an interpreter start.
+    See shell_client.py for the protocol.
+
+    asyncio serves any number of connected clients at once: it accepts them,
+    reads their requests and forwards captured output while commands run.
+    A line runs on the worker thread of the server while that is free, which
+    costs no more than a function call. A line that arrives while the worker
+    is busy runs in a forked copy of the server instead, which changes to the
+    client's cwd on its own, so one client's slow line never holds up the
+    others. The copy sends what it changed in the shared state back to the
+    server (see _forked_state): the PATH hash table, the stats table and the
+    DNS cache of `net`. Only lines that start or control background jobs
+    (`&`, `jobs`, `wait`, `fg`) always wait for the worker, because jobs are
+    children of the server process. A client that passed its terminal gets
+    the output directly, the server never copies it.
+    """
+
+    # Largest request accepted, a command line is never anywhere near it
+    MAX_REQUEST_BYTES = 1024 * 1024
+
+    # Builtins that work on the server's background jobs, lines using them run in the server process
+    JOB_CONTROL_BUILTINS = frozenset({"jobs", "wait", "fg"})
+
+    def __init__(self, socket_path: Optional[str] = None, executor: Optional[ShellExecutor] = None):
+        self.socket_path = socket_path or default_socket_path()
+        self.executor = executor or ShellExecutor()
+        self.executor.builtins.interactive = False
+
+        self.requests_served: int = 0
+
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shell-server")
+        self._worker_lines: int = 0   # lines queued or running on the worker
+        self._client_tasks: set = set()
+        self._background_tasks: set = set()
+
+    # ----------------------
+    # Socket I/O
+    # ----------------------
+
+    @staticmethod
+    async def _wait_readable(fd: int) -> None:
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+
+        try:
+            await ready
+        finally:
+            loop.remove_reader(fd)
+
+    async def _receive(self, sock: socket.socket) -> tuple[bytes, list[int]]:
+        """ Next chunk from the client with the fds attached to it (asyncio streams drop SCM_RIGHTS) """
+
+        while True:
+            try:
+                data, fds, _, _ = socket.recv_fds(sock, RECEIVE_SIZE, 3)
+                return data, fds
+            except (BlockingIOError, InterruptedError):
+                await self._wait_readable(sock.fileno())
+
+    @staticmethod
+    async def _send_frame(sock: socket.socket, send_lock: asyncio.Lock, kind: bytes, payload: bytes) -> None:
+        async with send_lock:
+            await asyncio.get_running_loop().sock_sendall(sock, encode_frame(kind, payload))
+
+    @staticmethod
+    def _peer_uid(sock: socket.socket) -> Optional[int]:
+        """ uid of the connected process (Linux SO_PEERCRED), None where unknown """
+
+        if not hasattr(socket, "SO_PEERCRED"):
+            return None
+
+        credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        return struct.unpack("3i", credentials)[1]
+
+    # ----------------------
+    # Requests
+    # ----------------------
+
+    def _uses_jobs(self, line: str) -> bool:
+        """
+        True when the line starts a background job or uses JOB_CONTROL_BUILTINS:
+        jobs are children of the server process, a forked copy could not hand
+        them over. Decided on the tokens, the parser belongs to the worker
+        thread, so `echo jobs` counts too (it only waits for the worker).
+        """
+
+        try:
+            tokens = ShellTokenizer.tokenize_typed(line)
+        except ValueError:
+            return True # the worker reports the syntax error
+
+        return any(
+            (token.kind == ShellTokenizer.OPERATOR and token.value == "&")
+            or (token.kind == ShellTokenizer.WORD and token.value in self.JOB_CONTROL_BUILTINS)
+            for token in tokens
+        )
+
+    def _run_line(self, line: str, cwd: Optional[str], fds: dict[int, int]) -> tuple[int, bool, list]:
+        """
+        Runs on the worker thread: the line runs in the client's cwd on the given fds.
+
+        Returns:
+            (status_code, should_exit, threads): threads are the builtin stages of
+            background jobs started by the line, they still write to the fds.
+        """
+
+        executor = self.executor
+
+        if cwd:
+            try:
+                os.chdir(cwd)
+            except OSError as e:
+                executor._write_to_fd(fds[2], f"shell: {cwd}: {e.strerror}\n")
+                return (1, False, [])
+
+        executor._reap_jobs()
+        jobs_before = {id(job) for job in executor.job_table.jobs()}
+
+        try:
+            status_code, should_exit = executor.run_line(line, fds)
+        except Exception as e:
+            executor._write_to_fd(fds[2], f"shell: execution error: {e}\n")
+            status_code, should_exit = 1, False
+
+        threads = [
+            thread
+            for job in executor.job_table.jobs() if id(job) not in jobs_before
+            for thread in job.threads
+        ]
+
+        return (status_code, should_exit, threads)
+
+    def _state_counters(self) -> tuple:
+        """ Counters and settings _forked_state reports as changes: (path hits, path misses, DNS hits, DNS misses, stats always_on) """
+
+        builtins = self.executor.builtins
+        utils = builtins._shell_utils # only loaded by `net`
+
+        return (
+            builtins.path_cache.hits,
+            builtins.path_cache.misses,
+            utils.dns_cache_hits if utils is not None else 0,
+            utils.dns_cache_misses if utils is not None else 0,
+            self.executor.stats.always_on,
+        )
+
+    def _forked_state(self, should_exit: bool, before: tuple) -> dict:
+        """ What a forked line changed in the state the server keeps between requests, before is the _state_counters at the start """
+
+        builtins = self.executor.builtins
+        utils = builtins._shell_utils
+        path_hits, path_misses, dns_hits, dns_misses, always_on = before
+
+        return {
+            "exit": should_exit,
+            "path_cache": (builtins.path_cache, path_hits, path_misses),
+            "stats": (self.executor.stats.journal(), None if self.executor.stats.always_on == always_on else self.executor.stats.always_on),
+            "dns": None if utils is None else (utils._dns_cache, utils.dns_cache_hits - dns_hits, utils.dns_cache_misses - dns_misses),
+        }
+
+    def _adopt_state(self, state: dict) -> bool:
+        """ Applies the _forked_state of a finished copy, returns its should_exit """
+
+        builtins = self.executor.builtins
+        builtins.path_cache.adopt(*state["path_cache"])
+
+        journal, always_on = state["stats"]
+        self.executor.stats.replay(journal)
+        if always_on is not None:
+            self.executor.stats.always_on = always_on
+
+        if state["dns"] is not None:
+            builtins.shell_utils.merge_dns_cache(*state["dns"])
+
+        return state["exit"]
+
+    def _run_forked(self, line: str, cwd: Optional[str], state_fd: int) -> int:
+        """ Runs in the forked copy of the server: the line in the client's cwd on fds 0 / 1 / 2, the state goes to state_fd """
+
+        executor = self.executor
+
+        # Signals go to the copy itself, not to the event loop of the server
+        signal.set_wakeup_fd(-1)
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signal_number, signal.SIG_DFL)
+
+        if cwd:
+            try:
+                os.chdir(cwd)
+            except OSError as e:
+                sys.stderr.write(f"shell: {cwd}: {e.strerror}\n")
+                return 1
+
+        executor.job_table.clear()
+        executor.stats.start_journal()
+        before = self._state_counters()
+
+        status_code, should_exit = executor.run_line(line)
+
+        state = memoryview(pickle.dumps(self._forked_state(should_exit, before)))
+        while state:
+            state = state[os.write(state_fd, state):]
+
+        return status_code
+
+    async def _run_in_fork(self, line: str, cwd: Optional[str], fds: dict[int, int]) -> tuple[int, bool]:
+        """ Runs the line in a forked copy of the server, adopts the state it sends back once it exits """
+
+        state_read, state_write = os.pipe()
+
+        try:
+            process = fork_process(lambda: self._run_forked(line, cwd, state_write), fds[0], fds[1], fds[2], line, keep_fds=(state_write,))
+        except BaseException:
+            os.close(state_read)
+            raise
+        finally:
+            os.close(state_write)
+
+        os.set_blocking(state_read, False)
+        state = bytearray()
+
+        try:
+            while True:
+                try:
+                    data = os.read(state_read, RECEIVE_SIZE)
+                except BlockingIOError:
+                    await self._wait_readable(state_read)
+                    continue
+                if not data:
+                    break
+                state += data
+        finally:
+            os.close(state_read)
+
+        status_code = await self._wait_process(process)
+
+        # No state from a copy that died before the end of the line
+        should_exit = self._adopt_state(pickle.loads(state)) if state else False
+        return (status_code, should_exit)
+
+    async def _wait_process(self, process: SpawnedProcess) -> int:
+        """ Waits for a forked line without blocking the loop, on a pidfd where there is one (Linux) """
+
+        try:
+            pidfd = os.pidfd_open(process.pid)
+        except (AttributeError, OSError):
+            await asyncio.get_running_loop().run_in_executor(None, wait_child, process)
+        else:
+            try:
+                await self._wait_readable(pidfd)
+            finally:
+                os.close(pidfd)
+            wait_child(process)
+
+        # Killed by a signal: 128 + signal number, as in bash
+        return process.returncode if process.returncode >= 0 else 128 - process.returncode
+
+    async def _execute(self, line: str, cwd: Optional[str], fds: dict[int, int], owned_fds: list[int]) -> tuple[int, bool]:
+        """ Runs the line (on the worker or forked), then closes owned_fds once nothing uses them anymore """
+
+        loop = asyncio.get_running_loop()
+        self.requests_served += 1
+        threads: list = []
+
+        try:
+            if self._worker_lines and FORK_AVAILABLE and not self._uses_jobs(line):
+                status_code, should_exit = await self._run_in_fork(line, cwd, fds)
+            else:
+                self._worker_lines += 1
+                try:
+                    status_code, should_exit, threads = await loop.run_in_executor(self._worker, self._run_line, line, cwd, fds)
+                finally:
+                    self._worker_lines -= 1
+        except BaseException:
+            for fd in owned_fds:
+                os.close(fd)
+            raise
+
+        close_task = asyncio.ensure_future(self._close_after(owned_fds, threads))
+        self._background_tasks.add(close_task)
+        close_task.add_done_callback(self._background_tasks.discard)
+
+        return (status_code, should_exit)
+
+    @staticmethod
+    async def _close_after(fds: list[int], threads: list) -> None:
+        """ Closes the fds of a request once the background builtins that write to them are done """
+
+        if threads:
+            await asyncio.get_running_loop().run_in_executor(None, lambda: [thread.join() for thread in threads])
+
+        for fd in fds:
+            os.close(fd)
+
+    async def _forward_output(self, read_fd: int, kind: bytes, sock: socket.socket, send_lock: asyncio.Lock) -> None:
+        """
+        Sends what the command writes to a capture pipe as frames, until EOF.
+        If the client went away the pipe is still drained, so the command
+        never blocks on a full pipe.
+        """
+
+        client_alive = True
+
+        try:
+            while True:
+                try:
+                    data = os.read(read_fd, RECEIVE_SIZE)
+                except BlockingIOError:
+                    await self._wait_readable(read_fd)
+                    continue
+
+                if not data:
+                    return
+
+                if client_alive:
+                    try:
+                        await self._send_frame(sock, send_lock, kind, data)
+                    except OSError:
+                        client_alive = False
+        finally:
+            os.close(read_fd)
+
+    async def _execute_captured(self, line: str, cwd: Optional[str], sock: socket.socket, send_lock: asyncio.Lock) -> tuple[int, bool]:
+        """ Runs the line with stdin from /dev/null, stdout / stderr are sent back in frames """
+
+        stdout_read, stdout_write = os.pipe()
+        stderr_read, stderr_write = os.pipe()
+        stdin_fd = os.open(os.devnull, os.O_RDONLY)
+
+        forwarders = []
+        for read_fd, kind in ((stdout_read, STDOUT), (stderr_read, STDERR)):
+            os.set_blocking(read_fd, False)
+            forwarders.append(asyncio.ensure_future(self._forward_output(read_fd, kind, sock, send_lock)))
+
+        result = await self._execute(line, cwd, {0: stdin_fd, 1: stdout_write, 2: stderr_write}, [stdin_fd, stdout_write, stderr_write])
+
+        # EOF comes once every writer is done, background jobs included (same as bash `$(cmd &)`)
+        await asyncio.gather(*forwarders)
+        return result
+
+    async def _serve_client(self, sock: socket.socket) -> None:
+        """ Answers the requests of one client, in order, until it disconnects """
+
+        buffer = bytearray()
+        received_fds: list[int] = []
+        send_lock = asyncio.Lock()
+
+        try:
+            peer_uid = self._peer_uid(sock)
+            if peer_uid is not None and peer_uid != os.getuid():
+                return
+
+            while True:
+                frame = pop_frame(buffer)
+
+                if frame is None:
+                    if len(buffer) > self.MAX_REQUEST_BYTES:
+                        return
+
+                    data, fds = await self._receive(sock)
+                    received_fds.extend(fds)
+
+                    if not data:
+                        return
+
+                    buffer += data
+                    continue
+
+                kind, payload = frame
+                if kind != REQUEST:
+                    return
+
+                request = json.loads(payload)
+                line, cwd = request["line"], request.get("cwd")
+
+                # Fds travel with their request, hand them over and forget them
+                fds, received_fds = received_fds, []
+
+                if len(fds) == 3:
+                    status_code, should_exit = await self._execute(line, cwd, {0: fds[0], 1: fds[1], 2: fds[2]}, fds)
+                else:
+                    for fd in fds:
+                        os.close(fd)
+                    status_code, should_exit = await self._execute_captured(line, cwd, sock, send_lock)
+
+                result = json.dumps({"status": status_code, "exit": should_exit}).encode()
+                await self._send_frame(sock, send_lock, STATUS, result)
+
+        except (OSError, ValueError, KeyError):
+            # Client went away or sent garbage, only that connection is dropped
+            pass
+
+        finally:
+            for fd in received_fds:
+                os.close(fd)
+            sock.close()
+
+    # ----------------------
+    # Server
+    # ----------------------
+
+    def _bind(self) -> socket.socket:
+        """
+        Listening socket, readable and writable only by the owner: whoever can
+        connect can run commands as this user.
+
+        Raises:
+            OSError: If another server already listens on the path.
+        """
+
+        if os.path.exists(self.socket_path) and stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                os.unlink(self.socket_path) # left behind by a server that died
+            else:
+                raise OSError(f"a shell server is already listening on {self.socket_path}")
+            finally:
+                probe.close()
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+
+        try:
+            listener.bind(self.socket_path)
+        except OSError:
+            listener.close()
+            raise
+        finally:
+            os.umask(old_umask)
+
+        listener.listen(socket.SOMAXCONN)
+        listener.setblocking(False)
+        return listener
+
+    async def serve_forever(self) -> None:
+        """ Serves clients until SIGINT / SIGTERM, then removes the socket """
+
+        loop = asyncio.get_running_loop()
+        listener = self._bind()
+        stop = loop.create_future()
+
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, lambda: stop.done() or stop.set_result(None))
+
+        async def accept_clients():
+            while True:
+                client, _ = await loop.sock_accept(listener)
+                task = asyncio.ensure_future(self._serve_client(client))
+                self._client_tasks.add(task)
+                task.add_done_callback(self._client_tasks.discard)
+
+        acceptor = asyncio.ensure_future(accept_clients())
+
+        try:
+            await stop
+        finally:
+            acceptor.cancel()
+            listener.close()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+            for task in list(self._client_tasks):
+                task.cancel()
+
+            for signal_number in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(signal_number)
+
+            self._worker.shutdown(wait=False)
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """
+    Entry point:
+        shell_server.py [-s SOCKET] [--stats]
+    """
+
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(prog="shell_server.py", description="Python shell server on a Unix domain socket")
+    arg_parser.add_argument("-s", dest="socket_path", metavar="SOCKET", help=f"socket path (default: {default_socket_path()})")
+    arg_parser.add_argument("--stats", action="store_true", help="record every command, see the `stats` builtin")
+    options = arg_parser.parse_args(argv)
+
+    server = ShellServer(options.socket_path)
+
+    if options.stats:
+        server.executor.stats.always_on = True
+
+    sys.stderr.write(f"shell server listening on {server.socket_path}\n")
+
+    try:
+        asyncio.run(server.serve_forever())
+    except OSError as e:
+        sys.stderr.write(f"shell server: {e}\n")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+import os
+import sys
+import signal
+from typing import Callable, Optional
+
+# Signals Python ignores or handles itself, children must start with the default
+# action (e.g. `yes | head` relies on SIGPIPE killing `yes`), same as the
+# restore_signals option of subprocess.Popen
+_RESTORED_SIGNALS = tuple(
+    getattr(signal, name) for name in ("SIGPIPE", "SIGXFSZ") if hasattr(signal, name)
+)
+
+POSIX_SPAWN_AVAILABLE: bool = hasattr(os, "posix_spawn")
+
+FORK_AVAILABLE: bool = hasattr(os, "fork")
+
+try:
+    _MAX_FD: int = os.sysconf("SC_OPEN_MAX")
+except (AttributeError, ValueError, OSError):
+    _MAX_FD = 256
+
+# Since Python 3.13 env=None passes the process environment as is. Before, the
+# environment is converted on every spawn, os.environb at least skips decoding.
+_SPAWN_ENV_INHERIT: bool = sys.version_info >= (3, 13)
+
+# Python 3.10 - 3.12 subprocess already uses vfork on Linux and reuses the
+# environment as is, there posix_spawn is measurably slower because of the
+# conversion above (see benchmarks/bench_spawn.py). Older versions fork the
+# whole interpreter, newer ones skip the conversion.
+POSIX_SPAWN_PREFERRED: bool = POSIX_SPAWN_AVAILABLE and (
+    _SPAWN_ENV_INHERIT or sys.version_info < (3, 10) or not sys.platform.startswith("linux")
+)
+
+class SpawnedProcess:
+    """
+    Child started with os.posix_spawn (or os.fork, see fork_process).
+
+    Has the part of the subprocess.Popen interface the shell uses (pid,
+    returncode, poll, wait), so jobs and wait_child handle both kinds of
+    children the same way.
+    """
+
+    __slots__ = ("args", "pid", "returncode")
+
+    def __init__(self, args: list[str], pid: int):
+        self.args = args
+        self.pid = pid
+        self.returncode: Optional[int] = None
+
+    def _handle_status(self, wait_status: int) -> int:
+        if os.WIFSIGNALED(wait_status):
+            self.returncode = -os.WTERMSIG(wait_status)
+        else:
+            self.returncode = os.WEXITSTATUS(wait_status)
+        return self.returncode
+
+    def poll(self) -> Optional[int]:
+        if self.returncode is None:
+            try:
+                pid, wait_status = os.waitpid(self.pid, os.WNOHANG)
+            except ChildProcessError:
+                self.returncode = 0
+                return self.returncode
+
+            if pid != 0:
+                self._handle_status(wait_status)
+
+        return self.returncode
+
+    def wait(self) -> int:
+        if self.returncode is None:
+            try:
+                _, wait_status = os.waitpid(self.pid, 0)
+            except ChildProcessError:
+                # Reaped somewhere else, same fallback as subprocess
+                self.returncode = 0
+                return self.returncode
+
+            self._handle_status(wait_status)
+
+        return self.returncode
+
+def _as_fd(stream) -> Optional[int]:
+    """ File descriptor of an int / file object, None if the child should inherit the shell's stream """
+
+    if stream is None or isinstance(stream, int):
+        return stream
+    return stream.fileno()
+
+def can_posix_spawn(stdin, stdout, stderr) -> bool:
+    """ posix_spawn only takes fds, subprocess.PIPE / STDOUT / DEVNULL need subprocess """
+
+    if not POSIX_SPAWN_AVAILABLE:
+        return False
+
+    for stream in (stdin, stdout, stderr):
+        if isinstance(stream, int) and stream < 0:
+            return False
+        if stream is not None and not isinstance(stream, int) and not hasattr(stream, "fileno"):
+            return False
+
+    return True
+
+def posix_spawn_process(executable_path: str, args: list[str], stdin=None, stdout=None, stderr=None) -> SpawnedProcess:
+    """
+    Starts executable_path with os.posix_spawn.
+
+    glibc implements posix_spawn with vfork semantics (CLONE_VM | CLONE_VFORK),
+    so the shell's heap is never copied, however large it grows. Redirections
+    and pipes are applied in the child by dup2 file actions. The fds the shell
+    opens itself are close-on-exec (PEP 446), so only 0 / 1 / 2 are inherited.
+
+    Raises:
+        OSError: If the program cannot be executed (ENOENT, EACCES, ...).
+    """
+
+    argv = [executable_path, *args]
+    file_actions = []
+    temporary_fds = []
+
+    try:
+        for target_fd, stream in enumerate((stdin, stdout, stderr)):
+            source_fd = _as_fd(stream)
+
+            if source_fd is None or source_fd == target_fd:
+                continue
+
+            if source_fd <= 2:
+                # e.g. `cmd 2>&1 > file` maps stderr to the shell's fd 1 while fd 1 itself
+                # is replaced first, so dup2 from a copy that no action overwrites
+                source_fd = os.dup(source_fd)
+                temporary_fds.append(source_fd)
+
+            file_actions.append((os.POSIX_SPAWN_DUP2, source_fd, target_fd))
+
+        pid = os.posix_spawn(
+            executable_path,
+            argv,
+            None if _SPAWN_ENV_INHERIT else os.environb,
+            file_actions=file_actions,
+            setsigdef=_RESTORED_SIGNALS,
+        )
+
+    finally:
+        for fd in temporary_fds:
+            os.close(fd)
+
+    return SpawnedProcess(argv, pid)
+
+def spawn_process(executable_path: str, args: list[str], stdin=None, stdout=None, stderr=None, use_posix_spawn: bool = True):
+    """
+    Starts the executable with posix_spawn when possible, otherwise (no
+    posix_spawn, or subprocess.PIPE / STDOUT streams) with subprocess.Popen.
+    """
+
+    if use_posix_spawn and can_posix_spawn(stdin, stdout, stderr):
+        return posix_spawn_process(executable_path, args, stdin=stdin, stdout=stdout, stderr=stderr)
+
+    import subprocess # imported on first use, it is not needed to start the shell
+    return subprocess.Popen([executable_path, *args], stdin=stdin, stdout=stdout, stderr=stderr)
+
+def fork_process(run: Callable[[], int], stdin: int, stdout: int, stderr: int, description: str = "", keep_fds: tuple[int, ...] = ()) -> SpawnedProcess:
+    """
+    Runs run() in a forked copy of the shell, with stdin / stdout / stderr moved
+    to fds 0 / 1 / 2, and returns the child. The child exits with the status
+    run() returns, so whatever run() changes (the cwd, the job table, `exit`)
+    stays in the copy, like in the subshell of a POSIX shell.
+
+    Only the forking thread exists in the child. Locks and thread pools other
+    threads may hold are reset with os.register_at_fork where they are created,
+    the standard streams are replaced here and every fd above 2 is closed,
+    except keep_fds (which must be above 2 too).
+    """
+
+    # Buffered output would otherwise be written by both processes
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    pid = os.fork()
+
+    if pid != 0:
+        return SpawnedProcess([description], pid)
+
+    status_code = 1
+
+    try:
+        # Copies first, so moving one fd onto 0 / 1 / 2 never overwrites another source
+        source_fds = [os.dup(fd) for fd in (stdin, stdout, stderr)]
+        for target_fd, source_fd in enumerate(source_fds):
+            os.dup2(source_fd, target_fd)
+            os.close(source_fd)
+
+        # Pipe ends of the other stages and the shell's own fds: a stage started
+        # from here that held a write end would never see EOF
+        first_fd = 3
+        for kept_fd in sorted(keep_fds):
+            os.closerange(first_fd, kept_fd)
+            first_fd = kept_fd + 1
+        os.closerange(first_fd, _MAX_FD)
+
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", closefd=False)
+        sys.stderr = open(2, "w", closefd=False)
+
+        status_code = run()
+
+    except BaseException as e:
+        try:
+            sys.stderr.write(f"shell: {e}\n")
+        except Exception:
+            pass
+
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+
+        # Never return into the caller's stack (or run its atexit handlers) in the copy
+        os._exit(status_code & 0xFF)
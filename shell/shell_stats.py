@@ -0,0 +1,219 @@
+import os
+import sys
+import time
+from _thread import allocate_lock # threading itself is only loaded by the first pipeline
+from collections import OrderedDict, deque
+from typing import NamedTuple, Optional
+
+class ResourceSample(NamedTuple):
+    """
+    Resources used by one command or pipeline.
+
+    wall:       Elapsed time in seconds
+    user:       CPU time in user mode, in seconds (children + the shell itself)
+    sys:        CPU time in kernel mode, in seconds (children + the shell itself)
+    maxrss_kb:  Peak resident set size in KiB of the largest child, None when
+                no child ran (builtins run in the shell, whose own peak covers
+                its whole lifetime and says nothing about the command)
+    """
+    wall: float
+    user: float
+    sys: float
+    maxrss_kb: Optional[int]
+
+def _maxrss_kb(ru_maxrss: int) -> int:
+    """ ru_maxrss is in KiB on Linux but in bytes on macOS """
+    return ru_maxrss // 1024 if sys.platform == "darwin" else ru_maxrss
+
+def _exit_code(wait_status: int) -> int:
+    """ Same as os.waitstatus_to_exitcode: the exit code, or -signal when killed """
+    if os.WIFSIGNALED(wait_status):
+        return -os.WTERMSIG(wait_status)
+    return os.WEXITSTATUS(wait_status)
+
+def wait_child(process, block: bool = True):
+    """
+    Reaps a child (subprocess.Popen or SpawnedProcess) with os.wait4, which
+    (unlike Popen.wait) keeps its rusage.
+
+    Sets process.returncode once the child exited and returns its rusage,
+    None if the child is still running (block=False), was already reaped, or
+    os.wait4 is not available (Windows), where Popen.wait / poll are used.
+    """
+
+    if process.returncode is not None:
+        return None
+
+    if not hasattr(os, "wait4"):
+        process.wait() if block else process.poll()
+        return None
+
+    try:
+        pid, wait_status, rusage = os.wait4(process.pid, 0 if block else os.WNOHANG)
+    except ChildProcessError:
+        # Reaped somewhere else, let subprocess settle the return code
+        process.wait()
+        return None
+
+    if pid == 0:
+        return None
+
+    process.returncode = _exit_code(wait_status)
+    return rusage
+
+class ShellStats:
+    """
+    Resource accounting of the shell (`time` keyword and `stats` builtin).
+
+    A measurement started with start() collects the wall time, the CPU time of
+    the shell itself (builtins run in-process) and the rusage of every child
+    reaped while it is active (see wait_child / record_child). stop() turns it
+    into a ResourceSample, record() adds the sample to a rolling per-command
+    table: the last STATS_WINDOW samples of the STATS_MAX_COMMANDS most recently
+    used commands are kept.
+
+    With always_on every command and pipeline the shell runs is recorded.
+    """
+
+    STATS_WINDOW = 100
+    STATS_MAX_COMMANDS = 256
+
+    def __init__(self):
+        self.always_on: bool = False
+        self._samples: OrderedDict = OrderedDict()   # command -> deque of ResourceSample
+        self._runs: dict[str, int] = {}              # command -> number of runs since the last clear
+        self._active: list[list] = []                # running measurements
+        self._lock = allocate_lock()                 # children can be reaped by pipeline threads
+        self._journal: Optional[list] = None         # changes since start_journal(), see replay()
+
+        if hasattr(os, "register_at_fork"):
+            # A forked subshell must not inherit the lock held by a thread it does not have
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self) -> None:
+        self._lock = allocate_lock()
+
+    def start(self) -> list:
+        """ Starts a measurement: [wall start, shell user, shell sys, children user, children sys, children maxrss] """
+
+        times = os.times()
+        measurement = [time.perf_counter(), times.user, times.system, 0.0, 0.0, 0]
+
+        with self._lock:
+            self._active.append(measurement)
+
+        return measurement
+
+    def record_child(self, rusage) -> None:
+        """ Adds the rusage of a reaped child to every running measurement """
+
+        if rusage is None:
+            return
+
+        with self._lock:
+            for measurement in self._active:
+                measurement[3] += rusage.ru_utime
+                measurement[4] += rusage.ru_stime
+                measurement[5] = max(measurement[5], _maxrss_kb(rusage.ru_maxrss))
+
+    def stop(self, measurement: list) -> ResourceSample:
+        wall = time.perf_counter() - measurement[0]
+        times = os.times()
+
+        with self._lock:
+            self._active.remove(measurement)
+
+        return ResourceSample(
+            wall,
+            times.user - measurement[1] + measurement[3],
+            times.system - measurement[2] + measurement[4],
+            measurement[5] or None,
+        )
+
+    def start_journal(self) -> None:
+        """
+        Notes every record() and clear() from now on, so a forked copy of the
+        shell (a line of the shell server) can send them to the original, see replay().
+        """
+        self._journal = []
+
+    def journal(self) -> list:
+        """ (command, sample) per record() and None per clear() since start_journal() """
+        return self._journal or []
+
+    def replay(self, journal: list) -> None:
+        """ Applies the journal of a forked copy, samples recorded meanwhile here are kept """
+
+        for entry in journal:
+            if entry is None:
+                self.clear()
+            else:
+                self.record(*entry)
+
+    def record(self, command: str, sample: ResourceSample) -> None:
+        if self._journal is not None:
+            self._journal.append((command, sample))
+
+        samples = self._samples.get(command)
+
+        if samples is None:
+            samples = self._samples[command] = deque(maxlen=self.STATS_WINDOW)
+            if len(self._samples) > self.STATS_MAX_COMMANDS:
+                evicted, _ = self._samples.popitem(last=False) # least recently used
+                self._runs.pop(evicted, None)
+        else:
+            self._samples.move_to_end(command)
+
+        samples.append(sample)
+        self._runs[command] = self._runs.get(command, 0) + 1
+
+    def clear(self) -> None:
+        if self._journal is not None:
+            self._journal.append(None)
+
+        self._samples.clear()
+        self._runs.clear()
+
+    def rows(self) -> list[tuple]:
+        """ (command, runs, avg wall, max wall, avg user, avg sys, max rss or None) over the window, slowest first """
+
+        rows = []
+
+        for command, samples in self._samples.items():
+            count = len(samples)
+            rows.append((
+                command,
+                self._runs[command],
+                sum(sample.wall for sample in samples) / count,
+                max(sample.wall for sample in samples),
+                sum(sample.user for sample in samples) / count,
+                sum(sample.sys for sample in samples) / count,
+                max((sample.maxrss_kb for sample in samples if sample.maxrss_kb is not None), default=None),
+            ))
+
+        rows.sort(key=lambda row: row[2] * row[1], reverse=True)
+        return rows
+
+    def format_table(self) -> str:
+        header = f"{'COMMAND':<24} {'RUNS':>6} {'AVG REAL':>10} {'MAX REAL':>10} {'AVG USER':>10} {'AVG SYS':>10} {'MAXRSS KB':>10}"
+        lines = [header]
+
+        for command, runs, avg_wall, max_wall, avg_user, avg_sys, maxrss_kb in self.rows():
+            maxrss = "n/a" if maxrss_kb is None else maxrss_kb
+            lines.append(f"{command[:24]:<24} {runs:>6} {avg_wall:>10.4f} {max_wall:>10.4f} {avg_user:>10.4f} {avg_sys:>10.4f} {maxrss:>10}")
+
+        return "\n".join(lines)
+
+    @staticmethod
+    def format_report(sample: ResourceSample) -> str:
+        """ Report printed by `time`, in the format of bash """
+
+        def minutes(seconds: float) -> str:
+            return f"{int(seconds // 60)}m{seconds % 60:.3f}s"
+
+        return (
+            f"\nreal\t{minutes(sample.wall)}\n"
+            f"user\t{minutes(sample.user)}\n"
+            f"sys\t{minutes(sample.sys)}\n"
+            f"maxrss\t{'n/a' if sample.maxrss_kb is None else f'{sample.maxrss_kb} KB'}\n"
+        )
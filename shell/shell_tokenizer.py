@@ -1,38 +1,202 @@
-import shlex
+import re
+from typing import NamedTuple
+from shell_glob import GlobWord, escape_pattern, has_magic
+
+class Token(NamedTuple):
+    """
+    Single token produced by ShellTokenizer.tokenize_typed.
+
+    kind:   ShellTokenizer.WORD, ShellTokenizer.OPERATOR or ShellTokenizer.REDIRECT
+    value:  Token text with quotes and escapes already removed
+    start:  Offset of the first character of the token in the source line
+    end:    Offset one past the last character of the token in the source line
+    """
+    kind: str
+    value: str
+    start: int
+    end: int
 
 class ShellTokenizer:
     """
     ShellTokenizer is responsible for parsing and tokenizing shell-like commands.
-    It uses Python's `shlex` to handle quoting, escaping, and POSIX-style syntax.
+    It uses a single-pass, regex-driven lexer to handle quoting, escaping, and
+    POSIX-style syntax.
     """
 
+    WORD = "word"
+    OPERATOR = "operator"
+    REDIRECT = "redirect"
+
+    # Leading whitespace, then one alternative per token kind (group 1..4).
+    # Longer operators come first so '&&' is never read as two '&'.
+    _TOKEN_RE = re.compile(r"""
+        \s*
+        (?:
+              (\#.*)                                                       # 1: comment
+            | (2>&1|1?>&2|[12]?>>|[12]?>|<)                                # 2: redirect
+            | (&&|\|\||;|\||&|\(|\))                                       # 3: operator
+            | ((?:[^\s'"\\;&|<>()]+|'[^']*'|"(?:[^"\\]|\\.)*"|\\.)+)       # 4: word
+        )
+    """, re.VERBOSE | re.DOTALL)
+
+    _COMMENT_GROUP = 1
+    _REDIRECT_GROUP = 2
+    _OPERATOR_GROUP = 3
+
+    # Pieces of a word that contains quotes or escapes
+    _WORD_PIECE_RE = re.compile(r"""'([^']*)'|"((?:[^"\\]|\\.)*)"|\\(.)|([^'"\\]+)""", re.DOTALL)
+
+    # Inside double quotes a backslash only escapes '"' and '\' (same as shlex)
+    _DOUBLE_QUOTED_ESCAPE_RE = re.compile(r'\\(["\\])')
+
     @staticmethod
-    def describe_shlex_usage():
+    def describe_lexer():
         """
-        Explain how and why shlex is configured in this project.
+        Explain how the lexer in this project splits a command line.
+
+        Words:
+            Runs of characters that are not whitespace or operator characters.
+            'single quotes' keep everything literally, "double quotes" allow
+            \\" and \\\\ escapes, outside of quotes a backslash escapes any character.
+            Adjacent quoted and unquoted parts form one word: a"b c"d -> 'ab cd'.
+
+        Operators:
+            &&, ||, |, ;, &, ( and ) are always separate tokens.
+
+        Redirects:
+            <, >, >>, 1>, 1>>, 2>, 2>> and the fd duplications 2>&1, >&2 / 1>&2
+            are separate tokens. A leading fd number is only recognized at the
+            start of a token, so 'a2>f' is the word 'a2', '>' and 'f'.
 
-        POSIX=True:
-            Makes shlex follow standard Unix shell parsing rules (Bash, Dash, etc.).
-            Handles quotes ('", escaping, and word splitting correctly.
+        Comments:
+            A '#' at the start of a token comments out the rest of the line.
 
-        punctuation_chars=True:
-            Treats characters such as |, &, <, >, and () as separate tokens.
-            This is critical for distinguishing operators and redirects in command parsing.
+        Wildcards:
+            A word with an unquoted *, ? or [...] becomes a GlobWord, which is
+            expanded to matching paths when the command runs. Quoted wildcards
+            stay literal: "*.log"* only matches names starting with '*.log'.
 
         Example:
             Input:  echo "Hello   world" > out.txt && echo bye
             Tokens: ['echo', 'Hello   world', '>', 'out.txt', '&&', 'echo', 'bye']
         """
-        print(ShellTokenizer.describe_shlex_usage.__doc__)
+        print(ShellTokenizer.describe_lexer.__doc__)
+
+    @staticmethod
+    def _unquote(raw_word: str) -> str:
+        """ Removes quotes and escapes from a word matched by _TOKEN_RE, a GlobWord if unquoted wildcards are left """
+
+        # Fast path for a word that is exactly one quoted string: 'abc' or "abc"
+        quote = raw_word[0]
+        if quote == raw_word[-1] and len(raw_word) > 1 and quote in "'\"" and "\\" not in raw_word and quote not in raw_word[1:-1]:
+            return raw_word[1:-1]
+
+        parts = []
+        pattern_parts = []  # quoted parts with their wildcards escaped
+        wildcards = False
+        open_bracket = False # an unquoted [ that a later unquoted ] closes, members may be quoted: [\^x]
+
+        for single_quoted, double_quoted, escaped, plain in ShellTokenizer._WORD_PIECE_RE.findall(raw_word):
+            if plain:
+                parts.append(plain)
+                pattern_parts.append(plain)
+                wildcards = wildcards or has_magic(plain) or (open_bracket and "]" in plain)
+                open_bracket = open_bracket or "[" in plain
+                continue
+
+            if escaped:
+                part = escaped
+            elif double_quoted:
+                part = ShellTokenizer._DOUBLE_QUOTED_ESCAPE_RE.sub(r"\1", double_quoted) if "\\" in double_quoted else double_quoted
+            else:
+                part = single_quoted
+
+            parts.append(part)
+            pattern_parts.append(escape_pattern(part))
+
+        if wildcards:
+            return GlobWord("".join(parts), "".join(pattern_parts))
+
+        return "".join(parts)
+
+    @staticmethod
+    def _scan(user_input: str, typed: bool) -> list:
+        """
+        Single pass over the line shared by tokenize and tokenize_typed.
+        Collects Token objects when typed is True, plain strings otherwise.
+        """
+
+        tokens = []
+        append = tokens.append
+        position = 0
+        unquote = ShellTokenizer._unquote
+
+        for match in ShellTokenizer._TOKEN_RE.finditer(user_input):
+            # finditer silently skips text it cannot match, which means a broken quote
+            if match.start() != position:
+                break
+
+            position = match.end()
+            group = match.lastindex
+
+            if group == ShellTokenizer._COMMENT_GROUP:
+                return tokens
+
+            value = match.group(group)
+
+            if group == ShellTokenizer._OPERATOR_GROUP:
+                kind = ShellTokenizer.OPERATOR
+            elif group == ShellTokenizer._REDIRECT_GROUP:
+                kind = ShellTokenizer.REDIRECT
+            else:
+                kind = ShellTokenizer.WORD
+                # Most words have nothing to unquote
+                if "'" in value or '"' in value or "\\" in value:
+                    value = unquote(value)
+                elif ("*" in value or "?" in value or "[" in value) and has_magic(value):
+                    value = GlobWord(value)
+
+            append(Token(kind, value, match.start(group), position) if typed else value)
+
+        # Anything left that is not whitespace could not be tokenized
+        rest = user_input[position:].lstrip()
+        if rest:
+            if rest[0] == "\\" and len(rest) == 1:
+                raise ValueError("No escaped character")
+            raise ValueError("No closing quotation")
+
+        return tokens
+
+    @staticmethod
+    def tokenize_typed(user_input: str) -> list[Token]:
+        """Tokenize a user command into typed tokens carrying source offsets.
+
+        Args:
+            user_input (str): Raw command input from the user.
+
+        Returns:
+            list[Token]: Tokens in the order they appear in the line.
+
+        Raises:
+            ValueError: On an unterminated quote or a trailing backslash.
+
+        Example:
+            >>> ShellTokenizer.tokenize_typed('ls -l > out.txt')
+            [Token(kind='word', value='ls', start=0, end=2),
+             Token(kind='word', value='-l', start=3, end=5),
+             Token(kind='redirect', value='>', start=6, end=7),
+             Token(kind='word', value='out.txt', start=8, end=15)]
+        """
+
+        return ShellTokenizer._scan(user_input, typed=True)
 
     @staticmethod
     def tokenize(user_input: str) -> list[str]:
         """Tokenize a user command into shell-style tokens.
 
-        Uses Python's `shlex` library in POSIX mode to split input
-        according to standard Unix shell parsing rules. Quoted strings,
-        escaped spaces, and redirection or logical operators (e.g. `>`,
-        `<`, `&&`, `||`) are preserved as individual tokens.
+        Quoted strings, escaped spaces, and redirection or logical operators
+        (e.g. `>`, `<`, `&&`, `||`) are preserved as individual tokens, see
+        describe_lexer for the exact rules.
 
         Args:
             user_input (str): Raw command input from the user.
@@ -46,7 +210,4 @@ class ShellTokenizer:
             ['echo', 'Hello     world', '>', './cmd/files/mop.md', '&&', 'echo', 'Hello', 'world']
         """
 
-        s = shlex.shlex(user_input, posix=True, punctuation_chars=True)
-        tokens = list(s)
-
-        return tokens
\ No newline at end of file
+        return ShellTokenizer._scan(user_input, typed=False)
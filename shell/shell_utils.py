@@ -1,32 +1,414 @@
 import os
 import sys
+import time
 import socket
-from typing import Tuple
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Iterable, Optional, Tuple
+
+try:
+    import resource # Unix only
+except ImportError:
+    resource = None
 
 class ShellUtils:
     def __init__(self):
-        pass
-    
-    
-    def create_net_return_object(self, status_code: int, result: str):
-        return (status_code, result)
+        # --- PORT SCANNER DEFAULTS ---
+        self.SCAN_DEFAULT_PORTS: str = "1-1024"
+        self.SCAN_DEFAULT_TIMEOUT: float = 1.0
+        self.SCAN_DEFAULT_CONCURRENCY: int = 1000
+        # File descriptors kept free for the shell itself when capping concurrency
+        self.SCAN_RESERVED_FDS: int = 64
+        # -----------------------------
+
+        # --- NAME RESOLUTION ---
+        # getaddrinfo does not expose record TTLs, so cached answers live for a
+        # fixed time. Failed lookups are cached too (negative caching), except
+        # temporary failures (EAI_AGAIN).
+        self.DNS_POSITIVE_TTL: float = 300.0
+        self.DNS_NEGATIVE_TTL: float = 30.0
+        self.DNS_CACHE_MAX_ENTRIES: int = 100_000
+        self.DNS_MAX_WORKERS: int = 64
+
+        # Replaceable for tests, same signature as socket.getaddrinfo
+        self.resolver: Callable = socket.getaddrinfo
+
+        self._dns_cache: dict[str, tuple] = {}  # name -> (expires_at, addresses, error)
+        self.dns_cache_hits: int = 0
+        self.dns_cache_misses: int = 0
+        # -----------------------
 
 
-    def net_getip(self, domain: str, s: socket.socket=None) -> Tuple[int, str]:
+    def create_net_return_object(self, status_code: int, result: str, errors: str = ""):
+        """ (status_code, result for stdout, error messages for stderr) """
+        return (status_code, result, errors)
+
+
+    def _resolve_one(self, name: str) -> tuple[Optional[list[str]], Optional[str], bool]:
         """
-        
+        Resolves a single name with getaddrinfo (runs in a pool thread).
+
         Returns:
+            (addresses, error, cacheable): every A / AAAA address in resolver order,
+            or None and the error message.
+        """
+        try:
+            address_infos = self.resolver(name, None, 0, socket.SOCK_STREAM)
+
+        except socket.gaierror as e:
+            return (None, e.strerror or str(e), e.errno != socket.EAI_AGAIN)
+
+        except (OSError, UnicodeError) as e:
+            return (None, str(e), False)
+
+        addresses = list(dict.fromkeys(address_info[4][0] for address_info in address_infos))
+        return (addresses, None, True)
+
+
+    def _store_in_dns_cache(self, name: str, addresses: Optional[list[str]], error: Optional[str]) -> None:
+        """ Stores an answer, dropping expired and then oldest entries when the cache is full """
+
+        if len(self._dns_cache) >= self.DNS_CACHE_MAX_ENTRIES:
+            now = time.monotonic()
+            self._dns_cache = {key: entry for key, entry in self._dns_cache.items() if entry[0] > now}
 
+            while len(self._dns_cache) >= self.DNS_CACHE_MAX_ENTRIES:
+                del self._dns_cache[next(iter(self._dns_cache))]
+
+        ttl = self.DNS_POSITIVE_TTL if error is None else self.DNS_NEGATIVE_TTL
+        self._dns_cache[name] = (time.monotonic() + ttl, addresses, error)
+
+
+    def merge_dns_cache(self, entries: dict[str, tuple], hits: int, misses: int) -> None:
+        """
+        Adds the DNS cache of a forked copy (a shell server line) to this one,
+        the answer that expires last wins. hits / misses are the lookups the copy counted.
         """
+
+        for name, entry in entries.items():
+            cached = self._dns_cache.get(name)
+            if cached is None or cached[0] < entry[0]:
+                self._dns_cache[name] = entry
+
+        while len(self._dns_cache) > self.DNS_CACHE_MAX_ENTRIES:
+            del self._dns_cache[next(iter(self._dns_cache))]
+
+        self.dns_cache_hits += hits
+        self.dns_cache_misses += misses
+
+
+    def resolve_many(self, names: Iterable[str]) -> dict[str, tuple[Optional[list[str]], Optional[str]]]:
+        """
+        Resolves many names at once, in input order and without duplicates.
+        Cached answers are served directly, the rest is resolved on a thread pool.
+
+        Returns:
+            dict: name -> (addresses, error), exactly one of them is None.
+        """
+        now = time.monotonic()
+        results: dict[str, tuple[Optional[list[str]], Optional[str]]] = {}
+        pending: list[str] = []
+
+        for name in dict.fromkeys(names):
+            cached = self._dns_cache.get(name)
+
+            if cached is not None and cached[0] > now:
+                self.dns_cache_hits += 1
+                results[name] = (cached[1], cached[2])
+            else:
+                self.dns_cache_misses += 1
+                results[name] = (None, None) # keeps input order, filled below
+                pending.append(name)
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self.DNS_MAX_WORKERS, len(pending))) as pool:
+                for name, (addresses, error, cacheable) in zip(pending, pool.map(self._resolve_one, pending)):
+                    if cacheable:
+                        self._store_in_dns_cache(name, addresses, error)
+                    results[name] = (addresses, error)
+
+        return results
+
+
+    def net_getip(self, args: list[str], stdin: Optional[BinaryIO] = None) -> Tuple[int, str]:
+        """
+        Resolves domains to all of their IPv4 and IPv6 addresses.
+
+        Usage:
+            net getip <domain> [<domain> ...] [-f FILE]
+
+            -f FILE   also resolve the names listed in FILE, one per line
+                      ('-' reads stdin, blank lines and # comments are skipped)
+
+        stdin is the binary stream '-f -' reads, the shell's stdin by default.
+
+        Output:
+            For a single domain its addresses, one per line.
+            For several domains one "domain: address address ..." line each.
+            Names that did not resolve are left out and reported in the errors.
+
+        Returns:
+            (0, output, "") if every name resolved, (1, output, errors) otherwise
+        """
+        names: list[str] = []
+
         try:
-            
-            ip = socket.gethostbyname(domain)
-            return self.create_net_return_object(status_code=0, result=ip)
-        
+            index = 0
+            while index < len(args):
+                if args[index] == "-f":
+                    names.extend(self._read_names(args[index + 1], stdin))
+                    index += 2
+                else:
+                    names.append(args[index])
+                    index += 1
+
+        except IndexError:
+            return self.create_net_return_object(status_code=1, result="", errors="net getip: -f requires a file name")
+
+        except OSError as e:
+            return self.create_net_return_object(status_code=1, result="", errors=f"net getip: {e}")
+
+        if not names:
+            return self.create_net_return_object(status_code=1, result="", errors="usage: net getip <domain> [<domain> ...] [-f FILE]")
+
+        try:
+            results = self.resolve_many(names)
+
         except Exception as e:
             error_message = f"Class ShellUtils - Method net_getip - execution error: {e}"
-            return self.create_net_return_object(status_code=1, result=error_message)
+            return self.create_net_return_object(status_code=1, result="", errors=error_message)
+
+        errors = "\n".join(f"net getip: {name}: {error}" for name, (_, error) in results.items() if error is not None)
+
+        if len(results) == 1:
+            addresses, _ = next(iter(results.values()))
+            output = "\n".join(addresses or ())
+        else:
+            output = "\n".join(
+                f"{name}: {' '.join(addresses)}"
+                for name, (addresses, error) in results.items() if error is None
+            )
+
+        return self.create_net_return_object(status_code=1 if errors else 0, result=output, errors=errors)
+
+
+    @staticmethod
+    def _read_names(file_name: str, stdin: Optional[BinaryIO] = None) -> list[str]:
+        """ Names listed in a file (or in stdin for '-'), one per line """
+
+        if file_name == "-":
+            stream = stdin if stdin is not None else sys.stdin.buffer
+            lines = [line.decode(errors="surrogateescape") for line in stream]
+        else:
+            with open(file_name) as names_file:
+                lines = names_file.readlines()
+
+        return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+
+
+    @staticmethod
+    def parse_ports(port_spec: str) -> list[int]:
+        """
+        Parses a port list such as "22,80,8000-8100" into sorted unique ports.
+
+        Raises:
+            ValueError: On a malformed entry or a port outside 1-65535.
+        """
+        ports = set()
+
+        for part in port_spec.split(","):
+            part = part.strip()
+
+            if not part:
+                continue
+
+            if "-" in part:
+                first, last = part.split("-", 1)
+                first_port, last_port = int(first), int(last)
+            else:
+                first_port = last_port = int(part)
+
+            if not 1 <= first_port <= last_port <= 65535:
+                raise ValueError(f"invalid port range: {part}")
+
+            ports.update(range(first_port, last_port + 1))
+
+        return sorted(ports)
+
+
+    def _max_concurrency(self, requested: int) -> int:
+        """ Caps concurrency so open sockets never exceed the process fd limit """
+
+        if resource is None:
+            # Windows has no RLIMIT_NOFILE, select()-based loops allow ~512 sockets
+            return max(1, min(requested, 512))
+
+        soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+        if soft_limit == resource.RLIM_INFINITY:
+            return requested
+
+        return max(1, min(requested, soft_limit - self.SCAN_RESERVED_FDS))
+
+
+    async def _scan_ports_async(
+        self,
+        address_info: tuple,
+        ports: Iterable[int],
+        timeout: float,
+        concurrency: int,
+        rate: Optional[float],
+        on_open: Callable[[int], None],
+    ) -> None:
+        """
+        Runs `concurrency` workers that share one iterator of ports, so memory does
+        not grow with the number of ports. Each worker does a non-blocking TCP
+        connect with a timeout, an optional rate cap spaces connection attempts
+        at least 1/rate seconds apart.
+        """
+        loop = asyncio.get_running_loop()
+        family, sock_address = address_info
+        port_iterator = iter(ports)
+        interval = 1.0 / rate if rate else 0.0
+        next_slot = [loop.time()]
+
+        async def wait_for_rate_slot():
+            now = loop.time()
+            slot = max(now, next_slot[0])
+            next_slot[0] = slot + interval
+            if slot > now:
+                await asyncio.sleep(slot - now)
+
+        async def connect(sock: socket.socket, port: int):
+            address = (sock_address[0], port, *sock_address[2:])
+
+            # asyncio.timeout (Python 3.11+) does not wrap the connect in an extra task like wait_for
+            if hasattr(asyncio, "timeout"):
+                async with asyncio.timeout(timeout):
+                    await loop.sock_connect(sock, address)
+            else:
+                await asyncio.wait_for(loop.sock_connect(sock, address), timeout)
+
+        async def worker():
+            for port in port_iterator:
+                if interval:
+                    await wait_for_rate_slot()
+
+                sock = socket.socket(family, socket.SOCK_STREAM)
+                sock.setblocking(False)
+
+                try:
+                    await connect(sock, port)
+                except (OSError, asyncio.TimeoutError):
+                    continue
+                finally:
+                    sock.close()
+
+                on_open(port)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+    def scan_ports(
+        self,
+        host: str,
+        ports: list[int],
+        timeout: Optional[float] = None,
+        concurrency: Optional[int] = None,
+        rate: Optional[float] = None,
+        on_open: Optional[Callable[[int], None]] = None,
+    ) -> list[int]:
+        """
+        TCP connect scan of the host. on_open is called for every open port as soon
+        as it is found, the sorted list of open ports is returned at the end.
+
+        The host is resolved with resolve_many, so a repeated scan is served by the DNS cache.
+
+        Raises:
+            OSError: If the host cannot be resolved.
+        """
+        timeout = self.SCAN_DEFAULT_TIMEOUT if timeout is None else timeout
+        concurrency = self._max_concurrency(concurrency or self.SCAN_DEFAULT_CONCURRENCY)
+        concurrency = min(concurrency, len(ports)) or 1
+
+        # Resolve once instead of once per connection attempt, through the cache getip uses
+        addresses, error = self.resolve_many([host])[host]
+
+        if error is not None:
+            raise OSError(f"{host}: {error}")
+
+        address = addresses[0]
+        family = socket.AF_INET6 if ":" in address else socket.AF_INET
+        sock_address = (address, 0, 0, 0) if family == socket.AF_INET6 else (address, 0)
+
+        open_ports: list[int] = []
+
+        def report(port: int):
+            open_ports.append(port)
+            if on_open is not None:
+                on_open(port)
+
+        asyncio.run(self._scan_ports_async((family, sock_address), ports, timeout, concurrency, rate, report))
+
+        return sorted(open_ports)
+
+
+    def net_scanports(self, args: list[str], on_open: Optional[Callable[[int], None]] = None) -> Tuple[int, str]:
+        """
+        Scans TCP ports of a host.
+
+        Usage:
+            net scanports <host> [-p PORTS] [-t TIMEOUT] [-c CONCURRENCY] [-r RATE]
+
+            -p PORTS        ports to scan, e.g. 22,80,8000-8100 (default 1-1024)
+            -t TIMEOUT      seconds to wait for each connect (default 1.0)
+            -c CONCURRENCY  connections in flight at once (default 1000, capped by the fd limit)
+            -r RATE         maximum connection attempts per second (default unlimited)
+
+        on_open is called with every open port as soon as it is found, the report
+        then only has the summary line instead of one line per open port.
+
+        Returns:
+            (0, report of open ports, "") on success, (1, "", error message) on failure
+        """
+        usage = "usage: net scanports <host> [-p PORTS] [-t TIMEOUT] [-c CONCURRENCY] [-r RATE]"
+
+        host = None
+        options = {"-p": self.SCAN_DEFAULT_PORTS, "-t": None, "-c": None, "-r": None}
+
+        try:
+            index = 0
+            while index < len(args):
+                if args[index] in options:
+                    options[args[index]] = args[index + 1]
+                    index += 2
+                elif host is None:
+                    host = args[index]
+                    index += 1
+                else:
+                    raise ValueError(f"unexpected argument: {args[index]}")
+
+            if host is None:
+                raise ValueError("missing host")
+
+            ports = self.parse_ports(options["-p"])
+            timeout = float(options["-t"]) if options["-t"] else None
+            concurrency = int(options["-c"]) if options["-c"] else None
+            rate = float(options["-r"]) if options["-r"] else None
+
+        except (IndexError, ValueError) as e:
+            return self.create_net_return_object(status_code=1, result="", errors=f"net scanports: {e}\n{usage}")
+
+        try:
+            started = time.monotonic()
+            open_ports = self.scan_ports(host, ports, timeout, concurrency, rate, on_open)
+            elapsed = time.monotonic() - started
+
+        except Exception as e:
+            error_message = f"Class ShellUtils - Method net_scanports - execution error: {e}"
+            return self.create_net_return_object(status_code=1, result="", errors=error_message)
 
+        lines = [f"{port}/tcp open" for port in open_ports] if on_open is None else []
+        lines.append(f"{len(open_ports)} open of {len(ports)} scanned ports on {host} in {elapsed:.2f}s")
 
-    def net_scanports(self):
-        pass
\ No newline at end of file
+        return self.create_net_return_object(status_code=0, result="\n".join(lines))
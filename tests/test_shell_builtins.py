@@ -0,0 +1,152 @@
+"""
+Tests of the output contract of builtin handlers: write_output, and builtins
+whose OUTPUT_TEXT is a generator streaming into redirect files and pipes.
+
+Usage:
+    python -m pytest tests
+"""
+
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_builtins import write_output
+from shell_executor import ShellExecutor
+
+
+class ClosingReader(io.BytesIO):
+    """ Binary stream whose reader goes away after limit bytes """
+
+    def __init__(self, limit: int):
+        super().__init__()
+        self.limit = limit
+
+    def write(self, data) -> int:
+        if self.tell() + len(data) > self.limit:
+            raise BrokenPipeError
+        return super().write(data)
+
+
+class WriteOutputTest(unittest.TestCase):
+
+    def written(self, output) -> bytes:
+        stdout = io.BytesIO()
+        write_output(output, stdout)
+        return stdout.getvalue()
+
+    def test_kinds_of_output(self):
+        cases = [
+            (None, b""),
+            ("text", b"text\n"),
+            ("a\nb", b"a\nb\n"),
+            ("", b""),
+            ("  \n", b""),
+            (b"raw", b"raw"),
+            (bytearray(b"raw\n"), b"raw\n"),
+            (["a\n", b"b\n", "c"], b"a\nb\nc"),
+            (iter([]), b""),
+            # Undecodable file names come back as they were
+            (["caf\udcc3\udca9\n"], b"caf\xc3\xa9\n"),
+        ]
+
+        for output, data in cases:
+            with self.subTest(output=output):
+                self.assertEqual(self.written(output), data)
+
+    def test_chunks_are_written_as_produced(self):
+        stdout = io.BytesIO()
+        seen = []
+
+        def chunks():
+            for number in range(3):
+                seen.append(stdout.getvalue())
+                yield f"{number}\n"
+
+        write_output(chunks(), stdout)
+        self.assertEqual(seen, [b"", b"0\n", b"0\n1\n"])
+
+    def test_generator_is_closed_when_the_reader_goes_away(self):
+        state = {"produced": 0, "closed": False}
+
+        def endless():
+            try:
+                while True:
+                    state["produced"] += 1
+                    yield "line\n"
+            finally:
+                state["closed"] = True
+
+        with self.assertRaises(BrokenPipeError):
+            write_output(endless(), ClosingReader(12))
+
+        self.assertEqual(state, {"produced": 3, "closed": True})
+
+    def test_error_of_the_generator_is_raised(self):
+        def failing():
+            yield "a\n"
+            raise OSError("gone")
+
+        stdout = io.BytesIO()
+        with self.assertRaises(OSError):
+            write_output(failing(), stdout)
+        self.assertEqual(stdout.getvalue(), b"a\n")
+
+
+class StreamingBuiltinTest(unittest.TestCase):
+    """ A builtin returning an endless generator, run by the executor """
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+
+        cwd = os.getcwd()
+        os.chdir(temporary.name)
+        self.addCleanup(os.chdir, cwd)
+
+        self.executor = ShellExecutor()
+        self.closed = []
+        self.executor.builtin_commands["gen"] = self.gen
+
+    def gen(self, cmd: str, args: list[str]):
+        count = int(args[0]) if args else None
+
+        def lines():
+            try:
+                number = 0
+                while count is None or number < count:
+                    yield f"line {number}\n"
+                    number += 1
+            finally:
+                self.closed.append(cmd)
+
+        return (0, lines(), False)
+
+    def run_line(self, line: str) -> tuple[int, bytes]:
+        """ (status, stdout) of the line """
+
+        with open(os.devnull, "rb") as stdin, tempfile.TemporaryFile() as stdout, open(os.devnull, "wb") as stderr:
+            status, _ = self.executor.run_line(line, {0: stdin.fileno(), 1: stdout.fileno(), 2: stderr.fileno()})
+
+            stdout.seek(0)
+            return (status, stdout.read())
+
+    def test_into_a_redirect(self):
+        self.assertEqual(self.run_line("gen 3 > out.txt; cat out.txt"), (0, b"line 0\nline 1\nline 2\n"))
+        self.assertEqual(self.closed, ["gen"])
+
+    def test_into_a_pipe(self):
+        expected = b"".join(b"line %d\n" % number for number in range(5000))
+        self.assertEqual(self.run_line("gen 5000 | cat"), (0, expected))
+
+    def test_endless_into_head(self):
+        # head exits, the generator sees the broken pipe and is closed
+        self.assertEqual(self.run_line("gen | head -n 2"), (0, b"line 0\nline 1\n"))
+        self.assertEqual(self.closed, ["gen"])
+
+
+if __name__ == "__main__":
+    unittest.main()
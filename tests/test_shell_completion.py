@@ -0,0 +1,215 @@
+"""
+Tests of Tab completion: CommandTrie and ShellCompleter, with PATH pointing
+at directories in a fresh temporary directory, which is also the cwd.
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_completion import CommandTrie, ShellCompleter, escape_word
+from shell_glob import ShellGlob
+
+
+class CommandTrieTest(unittest.TestCase):
+
+    WORDS = ["git", "gitk", "grep", "gzip", "g++", "ls", "lsblk", "python3", "python3.12", "pydoc"]
+
+    def make_trie(self, words) -> CommandTrie:
+        trie = CommandTrie()
+        for word in words:
+            trie.add(word)
+        return trie
+
+    def test_complete(self):
+        trie = self.make_trie(self.WORDS)
+
+        self.assertEqual(trie.complete("g"), ("g++", "git", "gitk", "grep", "gzip"))
+        self.assertEqual(trie.complete("git"), ("git", "gitk"))
+        self.assertEqual(trie.complete("python3."), ("python3.12",))
+        self.assertEqual(trie.complete("x"), ())
+        self.assertEqual(trie.complete(""), tuple(sorted(self.WORDS)))
+
+    def test_size_counts_distinct_words(self):
+        trie = self.make_trie(self.WORDS + ["git", "ls"])
+        self.assertEqual(len(trie), len(self.WORDS))
+
+    def test_updates_after_cached_completions(self):
+        trie = self.make_trie(self.WORDS)
+        self.assertEqual(trie.complete("gi"), ("git", "gitk"))
+
+        trie.add("gist")
+        self.assertEqual(trie.complete("gi"), ("gist", "git", "gitk"))
+        self.assertEqual(trie.complete(""), tuple(sorted(self.WORDS + ["gist"])))
+
+        trie.remove("git")
+        self.assertEqual(trie.complete("gi"), ("gist", "gitk"))
+        self.assertEqual(len(trie), len(self.WORDS))
+
+    def test_remove(self):
+        trie = self.make_trie(self.WORDS)
+
+        trie.remove("python3")         # a prefix of another word
+        trie.remove("python")          # not a word
+        trie.remove("missing")
+        self.assertEqual(trie.complete("py"), ("pydoc", "python3.12"))
+
+        trie.remove("python3.12")      # the nodes up to "py" lead to nothing now
+        self.assertEqual(trie.complete("pyt"), ())
+        self.assertNotIn("t", trie._root.children["p"].children["y"].children)
+
+    def test_matches_a_sorted_scan(self):
+        words = [f"{prefix}{number}" for prefix in ("a", "ab", "b", "") for number in range(0, 300, 7)]
+        trie = self.make_trie(words)
+        present = set(words)
+
+        for index, word in enumerate(words):
+            if index % 3 == 0:
+                trie.remove(word)
+                present.discard(word)
+
+            if index % 25 == 0:
+                for prefix in ("", "a", "ab", "1", "ab2", "b10"):
+                    with self.subTest(after=word, prefix=prefix):
+                        self.assertEqual(trie.complete(prefix), tuple(sorted(name for name in present if name.startswith(prefix))))
+
+
+class ShellCompleterTest(unittest.TestCase):
+
+    BUILTINS = ["cd", "echo", "exit", "history"]
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.root = temporary.name
+
+        self.bin = self.make_directory("bin", ["tool", "tool-extra", "echo-fast"])
+        self.sbin = self.make_directory("sbin", ["tool", "sadmin"])
+        self.make_file(os.path.join(self.bin, "tool.conf"), executable=False)
+        os.mkdir(os.path.join(self.bin, "toolbox"))
+
+        self.set_path(self.bin, self.sbin)
+        self.completer = ShellCompleter(self.BUILTINS, ShellGlob())
+
+        # Relative paths complete in the temporary directory
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        self.addCleanup(os.chdir, cwd)
+
+    def make_file(self, path: str, executable: bool = True) -> None:
+        open(path, "w").close()
+        os.chmod(path, 0o755 if executable else 0o644)
+
+    def make_directory(self, name: str, executables: list[str]) -> str:
+        directory = os.path.join(self.root, name)
+        os.mkdir(directory)
+        for executable in executables:
+            self.make_file(os.path.join(directory, executable))
+        return directory
+
+    def set_path(self, *directories: str) -> None:
+        patcher = mock.patch.dict(os.environ, {"PATH": os.pathsep.join(directories)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def changed(directory: str) -> None:
+        """ Moves the directory's mtime on, a change within one timestamp tick would go unseen """
+        mtime_ns = os.stat(directory).st_mtime_ns + 1_000_000_000
+        os.utime(directory, ns=(mtime_ns, mtime_ns))
+
+    def test_builtins_and_executables(self):
+        self.assertEqual(self.completer.complete_command("e"), ["echo", "echo-fast", "exit"])
+        self.assertEqual(self.completer.complete_command("to"), ["tool", "tool-extra"])
+        self.assertEqual(self.completer.complete_command("s"), ["sadmin"])
+
+    def test_new_and_removed_executables(self):
+        self.assertEqual(self.completer.complete_command("to"), ["tool", "tool-extra"])
+
+        self.make_file(os.path.join(self.bin, "toolkit"))
+        os.unlink(os.path.join(self.bin, "tool-extra"))
+        self.changed(self.bin)
+
+        self.assertEqual(self.completer.complete_command("to"), ["tool", "toolkit"])
+
+    def test_name_in_two_directories(self):
+        self.completer.warm_up()
+
+        os.unlink(os.path.join(self.bin, "tool"))
+        self.changed(self.bin)
+        self.assertEqual(self.completer.complete_command("tool"), ["tool", "tool-extra"])
+
+        os.unlink(os.path.join(self.sbin, "tool"))
+        self.changed(self.sbin)
+        self.assertEqual(self.completer.complete_command("tool"), ["tool-extra"])
+
+    def test_path_changes(self):
+        self.completer.warm_up()
+        other = self.make_directory("other", ["other-tool"])
+
+        self.set_path(self.sbin, other)
+        self.assertEqual(self.completer.complete_command("to"), ["tool"])
+        self.assertEqual(self.completer.complete_command("o"), ["other-tool"])
+        self.assertEqual(self.completer.complete_command("e"), ["echo", "exit"])
+
+        self.set_path(self.bin)
+        self.assertEqual(self.completer.complete_command("to"), ["tool", "tool-extra"])
+        self.assertEqual(self.completer.complete_command("o"), [])
+        self.assertEqual(self.completer.complete_command("s"), [])
+
+    def test_path_directory_created_later(self):
+        later = os.path.join(self.root, "later")
+        self.set_path(self.bin, later)
+        self.assertEqual(self.completer.complete_command("l"), [])
+
+        self.make_directory("later", ["late"])
+        self.assertEqual(self.completer.complete_command("l"), ["late"])
+
+        os.unlink(os.path.join(later, "late"))
+        os.rmdir(later)
+        self.assertEqual(self.completer.complete_command("l"), [])
+
+    def test_command_or_path_position(self):
+        cases = [
+            ("", "ech", ["echo", "echo-fast"]),
+            ("", "sad", ["sadmin "]),
+            ("ls | ", "sad", ["sadmin "]),
+            ("true && ", "sad", ["sadmin "]),
+            ("( ", "sad", ["sadmin "]),
+            ("time ", "sad", ["sadmin "]),
+            # An argument completes file names
+            ("echo ", "sad", []),
+        ]
+
+        for line_before, text, matches in cases:
+            with self.subTest(line=line_before + text):
+                self.assertEqual(self.completer.complete(line_before, text), matches)
+
+    def test_path_completion(self):
+        os.mkdir(os.path.join(self.root, "work"))
+        for name in ("a file", "another", ".hidden", "b*"):
+            open(os.path.join(self.root, "work", name), "w").close()
+        os.mkdir(os.path.join(self.root, "work", "all"))
+
+        work = os.path.join(self.root, "work")
+        self.assertEqual(self.completer.complete("cat ", f"{work}/a"), [f"{work}/a\\ file", f"{work}/all/", f"{work}/another"])
+        self.assertEqual(self.completer.complete("cat ", f"{work}/b"), [f"{work}/b\\* "])
+        self.assertEqual(self.completer.complete("cat ", f"{work}/."), [f"{work}/.hidden "])
+        self.assertEqual(self.completer.complete("", f"{work}/al"), [f"{work}/all/"])
+        self.assertEqual(self.completer.complete("ls ", "work/an"), ["work/another "])
+        self.assertEqual(self.completer.complete("ls ", "wo"), ["work/"])
+
+    def test_escape_word(self):
+        self.assertEqual(escape_word("my file (1)&'x'"), "my\\ file\\ \\(1\\)\\&\\'x\\'")
+        self.assertEqual(escape_word("plain-name.txt"), "plain-name.txt")
+
+
+if __name__ == "__main__":
+    unittest.main()
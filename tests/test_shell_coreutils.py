@@ -0,0 +1,209 @@
+"""
+Tests of the in-process coreutils (ShellCoreutils): wc, head, tail, grep and
+ls against small fixture files.
+
+Every case is (arguments, stdin, status, stdout, stderr) as the GNU tools
+give them; the expected values were taken from coreutils 9 and grep 3.
+The tools run in a fresh temporary directory holding FILES, which is the cwd
+while the test runs.
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_coreutils import ShellCoreutils
+
+FILES = {
+    "lines.txt": b"alpha\nbeta\ngamma\ndelta\nepsilon\n",
+    "words.txt": b"one two  three\n\tfour\nfive",
+    "empty.txt": b"",
+    "grep.txt": b"foo bar\nFoo\nfoobar\nbar.baz\nbarXbaz\na+b\n(x)\n\n12 apples\n",
+    "dir/a": b"x",
+    "dir/b": b"",
+    "dir/.hidden": b"",
+    "dir/sub/c": b"",
+}
+
+NO_FILE = "No such file or directory"
+
+WC_CASES = [
+    (["-l", "lines.txt"], b"", 0, b"5 lines.txt\n", ""),
+    (["lines.txt"], b"", 0, b" 5  5 31 lines.txt\n", ""),
+    (["-w", "words.txt"], b"", 0, b"5 words.txt\n", ""),
+    (["-c"], b"ab\ncd", 0, b"5\n", ""),
+    (["-lw", "lines.txt", "words.txt"], b"", 0, b" 5  5 lines.txt\n 2  5 words.txt\n 7 10 total\n", ""),
+    (["empty.txt"], b"", 0, b"0 0 0 empty.txt\n", ""),
+    (["missing"], b"", 1, b"", f"wc: missing: {NO_FILE}\n"),
+    (["-l", "lines.txt", "missing"], b"", 1, b" 5 lines.txt\n 5 total\n", f"wc: missing: {NO_FILE}\n"),
+]
+
+HEAD_CASES = [
+    (["-n", "2", "lines.txt"], b"", 0, b"alpha\nbeta\n", ""),
+    (["-2", "lines.txt"], b"", 0, b"alpha\nbeta\n", ""),
+    (["-c", "3", "lines.txt"], b"", 0, b"alp", ""),
+    (["-n", "0", "lines.txt"], b"", 0, b"", ""),
+    (["-n", "9", "words.txt"], b"", 0, b"one two  three\n\tfour\nfive", ""),
+    (["-n", "1", "lines.txt", "words.txt"], b"", 0, b"==> lines.txt <==\nalpha\n\n==> words.txt <==\none two  three\n", ""),
+    (["-q", "-n", "1", "lines.txt", "words.txt"], b"", 0, b"alpha\none two  three\n", ""),
+    (["-n", "1", "-"], b"x\ny\n", 0, b"x\n", ""),
+    (["missing"], b"", 1, b"", f"head: cannot open 'missing' for reading: {NO_FILE}\n"),
+]
+
+TAIL_CASES = [
+    (["-n", "2", "lines.txt"], b"", 0, b"delta\nepsilon\n", ""),
+    (["-n", "+4", "lines.txt"], b"", 0, b"delta\nepsilon\n", ""),
+    (["-n", "0", "lines.txt"], b"", 0, b"", ""),
+    (["-1", "words.txt"], b"", 0, b"five", ""),
+    (["-c", "4", "words.txt"], b"", 0, b"five", ""),
+    (["-v", "-n", "1", "lines.txt"], b"", 0, b"==> lines.txt <==\nepsilon\n", ""),
+    (["-n", "1", "lines.txt", "words.txt"], b"", 0, b"==> lines.txt <==\nepsilon\n\n==> words.txt <==\nfive", ""),
+    (["-n", "2"], b"x\ny\nz\n", 0, b"y\nz\n", ""),
+    (["missing"], b"", 1, b"", f"tail: cannot open 'missing' for reading: {NO_FILE}\n"),
+]
+
+GREP_CASES = [
+    (["beta", "lines.txt"], b"", 0, b"beta\n", ""),
+    (["nomatch", "lines.txt"], b"", 1, b"", ""),
+    (["-c", "a", "lines.txt"], b"", 0, b"4\n", ""),
+    (["-v", "a", "lines.txt"], b"", 0, b"epsilon\n", ""),
+    (["-n", "l", "lines.txt"], b"", 0, b"1:alpha\n4:delta\n5:epsilon\n", ""),
+    (["-m", "1", "bar", "grep.txt"], b"", 0, b"foo bar\n", ""),
+    (["-q", "beta", "lines.txt"], b"", 0, b"", ""),
+    (["x"], b"ax\nb\nx", 0, b"ax\nx\n", ""),
+    # Matching options
+    (["-i", "foo", "grep.txt"], b"", 0, b"foo bar\nFoo\nfoobar\n", ""),
+    (["-w", "foo", "grep.txt"], b"", 0, b"foo bar\n", ""),
+    (["-x", "Foo", "grep.txt"], b"", 0, b"Foo\n", ""),
+    (["-o", "o*", "grep.txt"], b"", 0, b"oo\noo\noo\n", ""),
+    (["^$", "grep.txt"], b"", 0, b"\n", ""),
+    (["-c", "", "grep.txt"], b"", 0, b"9\n", ""),
+    # Basic, extended and fixed string syntax
+    (["bar.baz", "grep.txt"], b"", 0, b"bar.baz\nbarXbaz\n", ""),
+    (["-F", "bar.baz", "grep.txt"], b"", 0, b"bar.baz\n", ""),
+    (["a+b", "grep.txt"], b"", 0, b"a+b\n", ""),
+    (["-E", "a+b", "grep.txt"], b"", 1, b"", ""),
+    (["-F", "a+b", "grep.txt"], b"", 0, b"a+b\n", ""),
+    (["(x)", "grep.txt"], b"", 0, b"(x)\n", ""),
+    (["\\(x\\)", "grep.txt"], b"", 0, b"(x)\n", ""),
+    (["-E", "(x)", "grep.txt"], b"", 0, b"(x)\n", ""),
+    (["-E", "^foo|baz$", "grep.txt"], b"", 0, b"foo bar\nfoobar\nbar.baz\nbarXbaz\n", ""),
+    (["a\\{2\\}"], b"a\naa\n", 0, b"aa\n", ""),
+    (["-E", "a{2}"], b"a\naa\n", 0, b"aa\n", ""),
+    # File names
+    (["beta", "lines.txt", "grep.txt"], b"", 0, b"lines.txt:beta\n", ""),
+    (["-h", "beta", "lines.txt", "grep.txt"], b"", 0, b"beta\n", ""),
+    (["-l", "a", "lines.txt", "grep.txt", "empty.txt"], b"", 0, b"lines.txt\ngrep.txt\n", ""),
+    # Errors: status 2 even with a match, -s only hides the message
+    (["beta", "missing"], b"", 2, b"", f"grep: missing: {NO_FILE}\n"),
+    (["beta", "missing", "lines.txt"], b"", 2, b"lines.txt:beta\n", f"grep: missing: {NO_FILE}\n"),
+    (["-s", "beta", "missing", "lines.txt"], b"", 2, b"lines.txt:beta\n", ""),
+    (["-q", "beta", "missing", "lines.txt"], b"", 0, b"", f"grep: missing: {NO_FILE}\n"),
+    (["-q", "beta", "lines.txt", "missing"], b"", 0, b"", ""),
+]
+
+LS_CASES = [
+    (["dir"], b"", 0, b"a\nb\nsub\n", ""),
+    (["-a", "dir"], b"", 0, b".\n..\n.hidden\na\nb\nsub\n", ""),
+    (["-A", "dir"], b"", 0, b".hidden\na\nb\nsub\n", ""),
+    (["-p", "dir"], b"", 0, b"a\nb\nsub/\n", ""),
+    (["-F", "dir"], b"", 0, b"a\nb\nsub/\n", ""),
+    (["-r", "dir"], b"", 0, b"sub\nb\na\n", ""),
+    (["-d", "dir"], b"", 0, b"dir\n", ""),
+    (["dir/a", "dir/sub", "dir"], b"", 0, b"dir/a\n\ndir:\na\nb\nsub\n\ndir/sub:\nc\n", ""),
+    (["missing"], b"", 2, b"", f"ls: cannot access 'missing': {NO_FILE}\n"),
+    (["dir", "missing"], b"", 2, b"dir:\na\nb\nsub\n", f"ls: cannot access 'missing': {NO_FILE}\n"),
+]
+
+
+class CoreutilsTest(unittest.TestCase):
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+
+        for path, data in FILES.items():
+            full_path = os.path.join(temporary.name, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, "wb") as file:
+                file.write(data)
+
+        cwd = os.getcwd()
+        os.chdir(temporary.name)
+        self.addCleanup(os.chdir, cwd)
+
+        self.coreutils = ShellCoreutils()
+
+    def run_tool(self, tool: str, args: list[str], stdin_data: bytes) -> tuple[int, bytes, str]:
+        """ (status, stdout, stderr) of the in-process tool """
+
+        options = self.coreutils.parse(tool, args)
+        self.assertIsNotNone(options, "runs the real program")
+
+        with tempfile.TemporaryFile() as stdin, tempfile.TemporaryFile() as stdout:
+            stdin.write(stdin_data)
+            stdin.seek(0)
+
+            status, error_text = self.coreutils.run(tool, options, stdin, stdout)
+
+            stdout.seek(0)
+            return (status, stdout.read(), f"{error_text}\n" if error_text else "")
+
+    def check_cases(self, tool: str, cases: list) -> None:
+        for args, stdin_data, status, output, error in cases:
+            with self.subTest(command=" ".join([tool, *args])):
+                self.assertEqual(self.run_tool(tool, args, stdin_data), (status, output, error))
+
+    def test_wc(self):
+        self.check_cases("wc", WC_CASES)
+
+    def test_head(self):
+        self.check_cases("head", HEAD_CASES)
+
+    def test_tail(self):
+        self.check_cases("tail", TAIL_CASES)
+
+    def test_grep(self):
+        self.check_cases("grep", GREP_CASES)
+
+    def test_ls(self):
+        self.check_cases("ls", LS_CASES)
+
+    def test_tail_of_a_pipe(self):
+        # No seeking back: the last lines are kept while reading
+        read_fd, write_fd = os.pipe()
+        with os.fdopen(read_fd, "rb") as stdin, tempfile.TemporaryFile() as stdout:
+            with os.fdopen(write_fd, "wb") as writer:
+                writer.write(b"".join(b"%d\n" % number for number in range(1000)))
+
+            self.assertEqual(self.coreutils.run("tail", self.coreutils.parse("tail", ["-n", "2"]), stdin, stdout), (0, None))
+            stdout.seek(0)
+            self.assertEqual(stdout.read(), b"998\n999\n")
+
+    def test_unsupported_runs_the_real_program(self):
+        cases = [
+            ("wc", ["-m", "lines.txt"]),
+            ("head", ["-n", "-2", "lines.txt"]),
+            ("tail", ["-f", "lines.txt"]),
+            ("ls", ["-l", "dir"]),
+            ("grep", ["-P", "a", "lines.txt"]),
+            ("grep", ["-e", "a", "-e", "b", "lines.txt"]),
+            ("grep", ["[[:digit:]]", "grep.txt"]),
+            ("grep", ["\\(a\\)\\1", "grep.txt"]),
+            ("grep", ["-E", "(ab", "grep.txt"]),
+            ("grep", ["-m", "x", "a", "lines.txt"]),
+        ]
+
+        for tool, args in cases:
+            with self.subTest(command=" ".join([tool, *args])):
+                self.assertIsNone(self.coreutils.parse(tool, args))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+"""
+Tests of ShellExecutor evaluating command lines: and-or chains through the
+skip table, subshells and groups, `time` and syntax errors.
+
+Lines run with run_line on temporary files in place of stdout / stderr, in a
+fresh temporary directory that is the cwd while the test runs. `true` and
+`false` are the external commands.
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_executor import ShellExecutor
+
+
+class ExecutorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory = os.path.realpath(temporary.name)
+
+        cwd = os.getcwd()
+        os.chdir(self.directory)
+        self.addCleanup(os.chdir, cwd)
+
+        self.executor = ShellExecutor()
+
+    def run_line(self, line: str) -> tuple[int, str, str]:
+        """ (status, stdout, stderr) of the line """
+
+        with open(os.devnull, "rb") as stdin, tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+            status, _ = self.executor.run_line(line, {0: stdin.fileno(), 1: stdout.fileno(), 2: stderr.fileno()})
+
+            stdout.seek(0)
+            stderr.seek(0)
+            return (status, stdout.read().decode(), stderr.read().decode())
+
+    def visited(self, line: str) -> list[str]:
+        """ Command lines of the simple commands the evaluator ran, in order """
+
+        commands = []
+        execute_command = self.executor._execute_command
+
+        def record(command_object, fds):
+            commands.append(" ".join([command_object.command, *command_object.args]))
+            return execute_command(command_object, fds)
+
+        with mock.patch.object(self.executor, "_execute_command", record):
+            self.run_line(line)
+        return commands
+
+
+class AndOrTest(ExecutorTestCase):
+
+    def test_status_and_output(self):
+        cases = [
+            ("true && echo a", 0, "a\n"),
+            ("false && echo a", 1, ""),
+            ("false || echo a", 0, "a\n"),
+            ("true || echo a", 0, ""),
+            ("false && echo a && echo b || echo c", 0, "c\n"),
+            ("true || echo a || echo b && echo c", 0, "c\n"),
+            ("true && false || echo c && echo d", 0, "c\nd\n"),
+            ("false || false || false", 1, ""),
+        ]
+
+        for line, status, output in cases:
+            with self.subTest(line=line):
+                self.assertEqual(self.run_line(line)[:2], (status, output))
+
+    def test_skipped_pipelines_are_not_visited(self):
+        self.assertEqual(self.visited("false && echo a && echo b || echo c"), ["false", "echo c"])
+        self.assertEqual(self.visited("true || echo a || { echo b; echo c; } && echo d"), ["true", "echo d"])
+
+    def test_long_chain(self):
+        line = "false" + " && echo x" * 5000 + " || echo done"
+        self.assertEqual(self.visited(line), ["false", "echo done"])
+
+
+class GroupTest(ExecutorTestCase):
+
+    def test_subshell_keeps_the_cwd(self):
+        os.mkdir("inner")
+        self.assertEqual(self.run_line("( cd inner; ( cd / ); pwd ); pwd")[1], f"{self.directory}/inner\n{self.directory}\n")
+        self.assertEqual(os.getcwd(), self.directory)
+
+    def test_group_changes_the_cwd(self):
+        os.mkdir("inner")
+        self.assertEqual(self.run_line("{ cd inner; }; pwd")[1], f"{self.directory}/inner\n")
+
+    def test_exit_leaves_only_the_subshell(self):
+        self.assertEqual(self.executor.run_line("( exit 3 )", None), (3, False))
+        self.assertEqual(self.run_line("( ( exit 3 ); echo after )")[:2], (0, "after\n"))
+        self.assertEqual(self.executor.run_line("{ exit 4; echo never; }", None), (4, True))
+
+    def test_nested_group_redirections(self):
+        status, output, _ = self.run_line("{ echo a; ( echo b; { echo c; } > inner.txt ); } > outer.txt; cat outer.txt inner.txt")
+        self.assertEqual((status, output), (0, "a\nb\nc\n"))
+
+    def test_group_status_is_the_last_command(self):
+        self.assertEqual(self.run_line("{ true; false; } || echo failed")[:2], (0, "failed\n"))
+        self.assertEqual(self.run_line("( false; true ) && echo ok")[:2], (0, "ok\n"))
+
+    def test_group_redirect_error(self):
+        status, output, error = self.run_line("{ echo a; } > missing/out || echo failed")
+        self.assertEqual((status, output), (0, "failed\n"))
+        self.assertIn("missing/out", error)
+
+
+class TimeTest(ExecutorTestCase):
+
+    def test_report_follows_the_output(self):
+        status, output, error = self.run_line("time echo hi")
+        self.assertEqual((status, output), (0, "hi\n"))
+        self.assertRegex(error, r"^\nreal\t\d+m\d+\.\d{3}s\nuser\t.*\nsys\t.*\n")
+
+    def test_status_of_the_timed_pipeline(self):
+        status, _, error = self.run_line("time false")
+        self.assertEqual(status, 1)
+        self.assertIn("real", error)
+
+    def test_time_alone(self):
+        status, output, error = self.run_line("time")
+        self.assertEqual((status, output), (0, ""))
+        self.assertIn("real", error)
+
+
+class SyntaxErrorTest(ExecutorTestCase):
+
+    def test_reported_on_stderr(self):
+        for line in ["echo (", "a &&", "( a", "echo >", "a ) b", "> out"]:
+            with self.subTest(line=line):
+                status, output, error = self.run_line(line)
+                self.assertEqual((status, output), (self.executor.SYNTAX_ERROR_STATUS, ""))
+                self.assertRegex(error, r"^shell: syntax error: .+\n$")
+
+    def test_nothing_runs(self):
+        self.assertEqual(self.visited("echo a; echo b &&"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,326 @@
+"""
+Tests of ShellFileOps (`rm -r`, and the walk behind `find` / `du`).
+
+Every test works in a fresh temporary directory.
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+import shell_fileops
+from shell_coreutils import ShellCoreutils
+from shell_fileops import ShellFileOps
+
+
+def make_tree(root: str, paths: list[str]) -> None:
+    """ Creates the files of paths below root, a trailing / makes a directory """
+
+    for path in paths:
+        full_path = os.path.join(root, path)
+        if path.endswith("/"):
+            os.makedirs(full_path, exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, "w") as file:
+                file.write(path)
+
+
+class RemoveTreesTest(unittest.TestCase):
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.root = temporary.name
+        self.fileops = ShellFileOps()
+
+    def test_tree_is_removed(self):
+        tree = os.path.join(self.root, "t")
+        make_tree(tree, ["a/f1", "a/b/f2", "c/", "f3"] + [f"wide/{number}" for number in range(2 * ShellFileOps.UNLINK_BATCH + 1)])
+
+        self.assertEqual(self.fileops.remove_trees([(0, tree)]), [])
+        self.assertFalse(os.path.exists(tree))
+
+    def test_operand_symlink_is_not_followed(self):
+        outside = os.path.join(self.root, "outside")
+        make_tree(outside, ["keep"])
+        link = os.path.join(self.root, "link")
+        os.symlink(outside, link)
+
+        errors = self.fileops.remove_trees([(0, link)])
+
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(os.path.exists(os.path.join(outside, "keep")))
+
+    def test_directory_swapped_for_a_symlink_during_the_walk(self):
+        tree = os.path.join(self.root, "t")
+        outside = os.path.join(self.root, "outside")
+        make_tree(tree, ["a/b/f1"])
+        make_tree(outside, ["b/keep"])
+
+        original_scan = shell_fileops._TreeRemoval._scan
+
+        def scan(removal, directory):
+            # Once a is listed, a is replaced by a symlink to a tree with the same names
+            if directory.path == os.path.join(tree, "a", "b"):
+                os.rename(os.path.join(tree, "a"), os.path.join(self.root, "a-moved"))
+                os.symlink(outside, os.path.join(tree, "a"))
+            original_scan(removal, directory)
+
+        with mock.patch.object(shell_fileops._TreeRemoval, "_scan", scan):
+            errors = self.fileops.remove_trees([(0, tree)])
+
+        self.assertTrue(os.path.exists(os.path.join(outside, "b", "keep")))
+        self.assertEqual([path for _, path, _ in errors], [os.path.join(tree, "a", "b")])
+
+
+def scandir_walk(path: str, depth: int = 0):
+    """ (path, depth) in the order of a single-threaded walk, directories before their contents """
+
+    yield path, depth
+    with os.scandir(path) as scanner:
+        entries = list(scanner)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from scandir_walk(entry.path, depth + 1)
+        else:
+            yield entry.path, depth + 1
+
+
+class WalkTest(unittest.TestCase):
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.tree = os.path.join(temporary.name, "t")
+        make_tree(self.tree, [f"m{number % 7}/p{number}/q{number % 3}/f{file}" for number in range(60) for file in range(5)])
+        self.fileops = ShellFileOps()
+
+    def walk(self, **options) -> list[tuple[str, int]]:
+        return [(path, depth) for path, depth, _, error in self.fileops.walk([self.tree], **options) if error is None]
+
+    def test_ordered_is_the_sequential_order(self):
+        self.assertEqual(self.walk(), list(scandir_walk(self.tree)))
+
+    def test_unordered_has_the_same_entries(self):
+        self.assertEqual(sorted(self.walk(ordered=False)), sorted(scandir_walk(self.tree)))
+
+    def test_buffer_cap(self):
+        expected = list(scandir_walk(self.tree))
+        largest = max(len(os.listdir(path)) for path, _ in expected if os.path.isdir(path))
+        peak = []
+        consumed = shell_fileops._ParallelWalk._consumed
+
+        def record(walk, listing):
+            peak.append(walk.buffered)
+            consumed(walk, listing)
+
+        for cap in (1, 10):
+            self.fileops.WALK_MAX_BUFFERED = cap
+
+            for ordered in (True, False):
+                peak.clear()
+                with mock.patch.object(shell_fileops._ParallelWalk, "_consumed", record):
+                    entries = []
+                    for item in self.walk(ordered=ordered):
+                        entries.append(item)
+                        time.sleep(0.0001) # a consumer slower than the workers
+
+                with self.subTest(cap=cap, ordered=ordered):
+                    self.assertEqual(entries if ordered else sorted(entries), expected if ordered else sorted(expected))
+                    # Each worker, and the reader itself, may finish the directory it lists
+                    self.assertLessEqual(max(peak), cap + largest * (ShellFileOps.WORKERS + 1))
+
+    def test_max_depth(self):
+        self.assertEqual(self.walk(max_depth=1), [item for item in scandir_walk(self.tree) if item[1] <= 1])
+
+
+class CoreutilsTestCase(unittest.TestCase):
+    """ Runs find / du of ShellCoreutils in a fresh temporary directory, which is the cwd while the test runs """
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+
+        cwd = os.getcwd()
+        os.chdir(temporary.name)
+        self.addCleanup(os.chdir, cwd)
+
+        self.coreutils = ShellCoreutils()
+
+    def run_tool(self, tool: str, args: list[str]) -> tuple[int, str, str]:
+        """ (status, stdout, stderr) of the in-process tool """
+
+        options = self.coreutils.parse(tool, args)
+        self.assertIsNotNone(options, "runs the real program")
+
+        with tempfile.TemporaryFile() as stdout:
+            status, error_text = self.coreutils.run(tool, options, None, stdout)
+            stdout.seek(0)
+            return (status, stdout.read().decode(), error_text or "")
+
+
+class FindTest(CoreutilsTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        make_tree(".", ["a/b/", "a/empty", "a/b/old.log", "a/b/new.log", "a/c/d/"])
+        with open("a/small.txt", "wb") as file:
+            file.write(b"x" * 10)
+        with open("a/big.bin", "wb") as file:
+            file.write(b"x" * 3000)
+        open("a/empty", "w").close()
+        os.symlink("small.txt", "a/link")
+
+        three_days_ago = time.time() - 3 * 86400
+        os.utime("a/b/old.log", (three_days_ago, three_days_ago))
+
+    def find(self, *args: str) -> list[str]:
+        status, output, error = self.run_tool("find", list(args))
+        self.assertEqual((status, error), (0, ""))
+        return sorted(output.splitlines())
+
+    def test_predicates(self):
+        cases = [
+            (["a", "-name", "*.log"], ["a/b/new.log", "a/b/old.log"]),
+            (["a", "-iname", "*.BIN"], ["a/big.bin"]),
+            (["a", "-type", "d"], ["a", "a/b", "a/c", "a/c/d"]),
+            (["a", "-type", "l"], ["a/link"]),
+            (["a", "-type", "f", "!", "-name", "*.log"], ["a/big.bin", "a/empty", "a/small.txt"]),
+            (["a", "-type", "f", "-size", "+1k"], ["a/big.bin"]),
+            (["a", "-type", "f", "-size", "-1k"], ["a/empty"]),
+            (["a", "-size", "10c"], ["a/small.txt"]),
+            (["a", "-type", "f", "-size", "6"], ["a/big.bin"]),
+            (["a", "-type", "f", "-mtime", "+1"], ["a/b/old.log"]),
+            (["a", "-type", "f", "-mtime", "-1", "-name", "*.log"], ["a/b/new.log"]),
+            (["a", "-type", "f", "-mmin", "+60"], ["a/b/old.log"]),
+            (["a", "-type", "f", "-newer", "a/b/old.log"], ["a/b/new.log", "a/big.bin", "a/empty", "a/small.txt"]),
+            (["a", "-maxdepth", "1", "-type", "d"], ["a", "a/b", "a/c"]),
+            (["a", "-mindepth", "2", "-type", "d"], ["a/c/d"]),
+        ]
+
+        for args, paths in cases:
+            with self.subTest(command=" ".join(["find", *args])):
+                self.assertEqual(self.find(*args), paths)
+
+    def test_ordered_output(self):
+        status, output, _ = self.run_tool("find", ["a"])
+        self.assertEqual(status, 0)
+        self.assertEqual(output.splitlines(), [path for path, _ in scandir_walk("a")])
+
+    def test_unordered_output(self):
+        status, output, _ = self.run_tool("find", ["a", "-unordered"])
+        self.assertEqual(status, 0)
+        self.assertEqual(sorted(output.splitlines()), sorted(path for path, _ in scandir_walk("a")))
+
+    def test_print0(self):
+        self.assertEqual(self.run_tool("find", ["a/b", "-name", "new.log", "-print0"]), (0, "a/b/new.log\0", ""))
+
+    def test_quit_stops_the_walk(self):
+        yielded = []
+        walk = self.coreutils.fileops.walk
+
+        def counting_walk(*args, **kwargs):
+            for item in walk(*args, **kwargs):
+                yielded.append(item[0])
+                yield item
+
+        with mock.patch.object(self.coreutils.fileops, "walk", counting_walk):
+            self.assertEqual(self.run_tool("find", ["a", "-print", "-quit"]), (0, "a\n", ""))
+
+        self.assertEqual(yielded, ["a"])
+
+    def test_missing_path(self):
+        status, output, error = self.run_tool("find", ["missing", "a/b"])
+        self.assertEqual(status, 1)
+        self.assertEqual(sorted(output.splitlines()), ["a/b", "a/b/new.log", "a/b/old.log"])
+        self.assertEqual(error, "find: 'missing': No such file or directory")
+
+    def test_unsupported_runs_the_real_find(self):
+        for args in (["a", "-exec", "true", ";"], ["a", "-o", "-name", "x"], ["a", "-size", "1x"], ["a", "-newer", "missing"]):
+            with self.subTest(command=" ".join(["find", *args])):
+                self.assertIsNone(self.coreutils.parse("find", args))
+
+
+class DuTest(CoreutilsTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        make_tree(".", ["d/sub/", "d/empty/"])
+        for path, size in (("d/one", 100), ("d/sub/two", 5000), ("d/sub/three", 70000)):
+            with open(path, "wb") as file:
+                file.write(b"x" * size)
+        os.link("d/sub/two", "d/two-again")
+
+    @staticmethod
+    def apparent(*paths: str) -> int:
+        """ Bytes of paths as du -b counts them: each inode once """
+
+        inodes = {}
+        for path in paths:
+            for directory, names, files in os.walk(path):
+                for name in [""] + names + files:
+                    file_stat = os.lstat(os.path.join(directory, name))
+                    inodes[(file_stat.st_dev, file_stat.st_ino)] = file_stat.st_size
+        return sum(inodes.values())
+
+    def test_summary(self):
+        self.assertEqual(self.run_tool("du", ["-sb", "d"]), (0, f"{self.apparent('d')}\td\n", ""))
+
+    def test_directory_totals(self):
+        sub = self.apparent("d/sub")
+        empty = self.apparent("d/empty")
+        status, output, _ = self.run_tool("du", ["-b", "d"])
+
+        self.assertEqual(status, 0)
+        lines = output.splitlines()
+        # Every directory once it is left, the operand last
+        self.assertEqual(sorted(lines[:-1]), sorted([f"{sub}\td/sub", f"{empty}\td/empty"]))
+        self.assertEqual(lines[-1], f"{self.apparent('d')}\td")
+
+    def test_hard_link_counted_once(self):
+        # d/sub comes first or second, the link to d/sub/two only counts when it is seen first
+        _, output, _ = self.run_tool("du", ["-ab", "d"])
+        sizes = {path: size for size, path in (line.split("\t") for line in output.splitlines())}
+        self.assertEqual(len([path for path in ("d/sub/two", "d/two-again") if path in sizes]), 1)
+        self.assertEqual(int(sizes["d"]), self.apparent("d"))
+
+    def test_depth_and_grand_total(self):
+        status, output, _ = self.run_tool("du", ["-b", "-d", "0", "-c", "d/sub", "d/empty"])
+        sub, empty = self.apparent("d/sub"), self.apparent("d/empty")
+        self.assertEqual((status, output), (0, f"{sub}\td/sub\n{empty}\td/empty\n{sub + empty}\ttotal\n"))
+
+    def test_block_sizes(self):
+        blocks = {}
+        for directory, names, files in os.walk("d"):
+            for name in [""] + names + files:
+                file_stat = os.lstat(os.path.join(directory, name))
+                blocks[(file_stat.st_dev, file_stat.st_ino)] = file_stat.st_blocks * 512
+
+        self.assertEqual(self.run_tool("du", ["-s", "d"]), (0, f"{-(-sum(blocks.values()) // 1024)}\td\n", ""))
+
+    def test_human_sizes(self):
+        cases = [(0, "0"), (1023, "1023"), (1024, "1.0K"), (1025, "1.1K"), (1536, "1.5K"), (10239, "10K"), (10 * 1024 ** 2, "10M"), (1024 ** 3 - 1, "1.0G")]
+
+        for size, text in cases:
+            with self.subTest(size=size):
+                self.assertEqual(ShellCoreutils._human_size(size), text)
+
+    def test_missing_operand(self):
+        status, output, error = self.run_tool("du", ["-sb", "missing", "d/empty"])
+        self.assertEqual((status, output), (1, f"{self.apparent('d/empty')}\td/empty\n"))
+        self.assertEqual(error, "du: cannot access 'missing': No such file or directory")
+
+
+if __name__ == "__main__":
+    unittest.main()
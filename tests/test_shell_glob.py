@@ -0,0 +1,95 @@
+"""
+Tests of ShellGlob (pathname expansion), checked against what bash -O globstar prints.
+
+Every test works in a fresh temporary directory, which is the cwd while it runs.
+
+Usage:
+    python -m pytest tests
+"""
+
+import errno
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_glob import ShellGlob
+from shell_tokenizer import ShellTokenizer
+
+
+class GlobTest(unittest.TestCase):
+
+    FILES = ["x.log", "y.log", "^.log", "!.log", "a/f", "a/b/c", "a/b-c/d", "a/.hidden/z", ".profile"]
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+
+        for path in self.FILES:
+            full_path = os.path.join(temporary.name, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            open(full_path, "w").close()
+
+        cwd = os.getcwd()
+        os.chdir(temporary.name)
+        self.addCleanup(os.chdir, cwd)
+
+        self.glob = ShellGlob()
+
+    def expand(self, word: str) -> list[str]:
+        """ Arguments the shell passes for one word as typed on the command line """
+        return list(self.glob.expand_args(ShellTokenizer.tokenize(word)))
+
+    def test_wildcards(self):
+        self.assertEqual(self.expand("*.log"), ["!.log", "^.log", "x.log", "y.log"])
+        self.assertEqual(self.expand("?.log"), ["!.log", "^.log", "x.log", "y.log"])
+        self.assertEqual(self.expand("[xy].log"), ["x.log", "y.log"])
+        self.assertEqual(self.expand("a/*"), ["a/b", "a/b-c", "a/f"])
+
+    def test_negated_class(self):
+        self.assertEqual(self.expand("[!x].log"), ["!.log", "^.log", "y.log"])
+        self.assertEqual(self.expand("[^x].log"), ["!.log", "^.log", "y.log"])
+        self.assertEqual(self.expand("[^xy^].log"), ["!.log"])
+
+    def test_quoted_caret_is_a_member(self):
+        self.assertEqual(self.expand(r"[\^x].log"), ["^.log", "x.log"])
+        self.assertEqual(self.expand('["^"x].log'), ["^.log", "x.log"])
+        self.assertEqual(self.expand("[x^].log"), ["^.log", "x.log"])
+
+    def test_quoted_wildcards_stay_literal(self):
+        self.assertEqual(self.expand('"*".log'), ["*.log"])
+        self.assertEqual(self.expand("'[^x]'.log"), ["[^x].log"])
+
+    def test_no_match_keeps_the_word(self):
+        self.assertEqual(self.expand("*.missing"), ["*.missing"])
+        self.assertEqual(self.expand("["), ["["])
+
+    def test_hidden_names(self):
+        self.assertNotIn(".profile", self.expand("*"))
+        self.assertEqual(self.expand(".p*"), [".profile"])
+
+    def test_globstar_is_sorted_over_the_whole_word(self):
+        # Per directory order would give a/b a/b/c a/b-c a/b-c/d
+        self.assertEqual(self.expand("a/**"), ["a/", "a/b", "a/b-c", "a/b-c/d", "a/b/c", "a/f"])
+        self.assertEqual(self.expand("**"), ["!.log", "^.log", "a", "a/b", "a/b-c", "a/b-c/d", "a/b/c", "a/f", "x.log", "y.log"])
+
+    def test_globstar_directories(self):
+        self.assertEqual(self.expand("a/**/"), ["a/", "a/b-c/", "a/b/"])
+        self.assertEqual(self.expand("**/c"), ["a/b/c"])
+        self.assertEqual(self.expand("a/**/d"), ["a/b-c/d"])
+
+    def test_cached_listing_sees_new_files(self):
+        self.assertEqual(self.expand("a/b/*"), ["a/b/c"])
+        open(os.path.join("a", "b", "e"), "w").close()
+        self.assertEqual(self.expand("a/b/*"), ["a/b/c", "a/b/e"])
+
+    def test_argument_space_limit(self):
+        with self.assertRaises(OSError) as raised:
+            self.glob.expand_args(ShellTokenizer.tokenize("**"), max_bytes=40)
+        self.assertEqual(raised.exception.errno, errno.E2BIG)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,250 @@
+"""
+Tests of ShellHistory: recording, loading, the gram index search, compaction
+and sessions appending to the same file at once.
+
+Every test uses a history file in a fresh temporary directory.
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_history import ShellHistory, fcntl
+
+
+def reference_search(lines: list[str], query: str) -> list[tuple[int, str]]:
+    """ iter_search without an index: distinct commands containing query, most recently used first """
+
+    results = []
+    seen = set()
+
+    for position in range(len(lines) - 1, -1, -1):
+        if query in lines[position] and lines[position] not in seen:
+            seen.add(lines[position])
+            results.append((position + 1, lines[position]))
+
+    return results
+
+
+class HistoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.path = os.path.join(temporary.name, "history")
+
+    def history(self, **settings) -> ShellHistory:
+        history = ShellHistory(self.path)
+        for name, value in settings.items():
+            setattr(history, name, value)
+        return history
+
+    def file_lines(self) -> list[str]:
+        with open(self.path, encoding="utf-8") as file:
+            return file.read().split("\n")[:-1]
+
+
+class RecordTest(HistoryTestCase):
+
+    def test_ignored_lines(self):
+        history = self.history()
+        for line in ["ls", "ls", " secret", "", "   ", "cd /", "ls"]:
+            history.add(line)
+
+        self.assertEqual(self.file_lines(), ["ls", "cd /", "ls"])
+
+    def test_multi_line_command_is_one_entry(self):
+        history = self.history()
+        history.add("echo a\necho b")
+        self.assertEqual(history.entries(), ["echo a echo b"])
+
+    def test_appends_of_other_sessions_are_read(self):
+        first, second = self.history(), self.history()
+        first.add("one")
+        self.assertEqual(second.entries(), ["one"])
+
+        first.add("two")
+        second.add("three")
+        self.assertEqual(second.entries(), ["one", "two", "three"])
+        self.assertEqual(first.entries(), ["one", "two", "three"])
+
+    def test_line_still_being_written_is_not_read(self):
+        history = self.history()
+        history.add("done")
+
+        with open(self.path, "a") as file:
+            file.write("half")
+            file.flush()
+            self.assertEqual(history.entries(), ["done"])
+
+            file.write(" written\n")
+
+        self.assertEqual(history.entries(), ["done", "half written"])
+
+    def test_recent(self):
+        history = self.history()
+        for number in range(1000):
+            history.add(f"command {number}")
+
+        self.assertEqual(history.recent(3), ["command 997", "command 998", "command 999"])
+        self.assertEqual(len(history.recent(5000)), 1000)
+        self.assertEqual(history.recent(0), [])
+
+    def test_missing_file(self):
+        history = self.history()
+        self.assertEqual((history.entries(), history.recent(5), history.search("x")), ([], [], []))
+
+
+class SearchTest(HistoryTestCase):
+
+    QUERIES = ["git", "git commit", "commit -m", "ls", "l", "", "2", "x 1", "--amend", "naïve", "é", "nothing here"]
+
+    def make_lines(self, count: int) -> list[str]:
+        commands = ["git status", "git commit -m 'x {}'", "ls -la", "cd /tmp/{}", "grep -r naïve .", "echo é{}", "git commit --amend"]
+        return [commands[number % len(commands)].format(number % 50) for number in range(count)]
+
+    def check(self, history: ShellHistory, lines: list[str]) -> None:
+        for query in self.QUERIES:
+            with self.subTest(query=query):
+                self.assertEqual(history.search(query), reference_search(lines, query))
+
+    def test_results_match_a_linear_scan(self):
+        lines = self.make_lines(3000)
+        with open(self.path, "w", encoding="utf-8") as file:
+            file.writelines(line + "\n" for line in lines)
+
+        # Small blocks, so queries span many of them
+        self.check(self.history(INDEX_BLOCK_COMMANDS=8), lines)
+
+    def test_entries_added_after_the_index(self):
+        history = self.history(INDEX_BLOCK_COMMANDS=8, INDEX_TAIL_LINES=40)
+        lines = self.make_lines(500)
+
+        for start in range(0, len(lines), 70):
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.writelines(line + "\n" for line in lines[start:start + 70])
+
+            # Unindexed tail, then folded into new blocks once it is INDEX_TAIL_LINES long
+            self.check(history, lines[:start + 70])
+
+    def test_newest_use_first(self):
+        history = self.history()
+        for line in ["make test", "make", "make install", "make test"]:
+            history.add(line)
+
+        self.assertEqual(history.search("make"), [(4, "make test"), (3, "make install"), (2, "make")])
+        self.assertEqual(history.search("make", limit=1), [(4, "make test")])
+
+    def test_grams_of_every_offset(self):
+        grams = ShellHistory._grams_of(b"abcdef")
+        expected = {int.from_bytes(part, sys.byteorder) for part in (b"abcd", b"bcde", b"cdef")}
+        self.assertEqual(grams, expected)
+        self.assertEqual(ShellHistory._grams_of(b"abc"), set())
+
+
+class CompactionTest(HistoryTestCase):
+
+    def test_newest_occurrence_is_kept(self):
+        history = self.history()
+        for line in ["a", "b", "a", "c", "b", "d"]:
+            history.add(line)
+
+        history.compact()
+        self.assertEqual(self.file_lines(), ["a", "c", "b", "d"])
+        self.assertEqual(history.entries(), ["a", "c", "b", "d"])
+
+    def test_entry_limit(self):
+        history = self.history(MAX_ENTRIES=3)
+        for number in range(10):
+            history.add(str(number))
+
+        history.compact()
+        self.assertEqual(self.file_lines(), ["7", "8", "9"])
+
+    def test_compacts_past_the_size_limit(self):
+        history = self.history(COMPACT_BYTES=200, COMPACT_CHECK_EVERY=1)
+        for number in range(100):
+            history.add(f"command {number % 10}")
+            history.add("x")
+
+        self.assertLessEqual(os.path.getsize(self.path), 200)
+        self.assertEqual(history.search("command 9")[0][1], "command 9")
+
+    def test_other_session_reloads_the_new_file(self):
+        first, second = self.history(), self.history()
+        for line in ["a", "b", "a", "b", "c"]:
+            first.add(line)
+
+        self.assertEqual(second.search("a"), [(3, "a")])
+
+        first.compact()
+        self.assertEqual(second.entries(), ["a", "b", "c"])
+        self.assertEqual(second.search("a"), [(1, "a")])
+
+    def test_file_mode(self):
+        history = self.history()
+        history.add("secret")
+        history.compact()
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+
+@unittest.skipUnless(hasattr(os, "fork") and fcntl is not None, "needs os.fork and flock")
+class ConcurrentAppendTest(HistoryTestCase):
+
+    SESSIONS = 4
+    LINES = 500
+
+    def fork(self, run) -> int:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run()
+            finally:
+                os._exit(0)
+        return pid
+
+    def wait_all(self, pids: list[int]) -> None:
+        for pid in pids:
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+    def session(self, number: int) -> None:
+        history = self.history()
+        for line in range(self.LINES):
+            # Long lines, so a torn write would show
+            history.add(f"session {number} line {line} " + "x" * 200)
+
+    def expected(self) -> set[str]:
+        return {f"session {number} line {line} " + "x" * 200 for number in range(self.SESSIONS) for line in range(self.LINES)}
+
+    def test_no_line_is_lost_or_torn(self):
+        self.wait_all([self.fork(lambda number=number: self.session(number)) for number in range(self.SESSIONS)])
+
+        lines = self.file_lines()
+        self.assertEqual(len(lines), self.SESSIONS * self.LINES)
+        self.assertEqual(set(lines), self.expected())
+
+    def test_compaction_while_sessions_append(self):
+        def compact_repeatedly():
+            history = self.history()
+            for _ in range(50):
+                history.compact()
+
+        pids = [self.fork(lambda number=number: self.session(number)) for number in range(self.SESSIONS)]
+        pids.append(self.fork(compact_repeatedly))
+        self.wait_all(pids)
+
+        # Every line is distinct, so compaction keeps them all
+        self.assertEqual(set(self.file_lines()), self.expected())
+        self.assertEqual(len(self.file_lines()), self.SESSIONS * self.LINES)
+        self.assertEqual([name for name in os.listdir(os.path.dirname(self.path)) if name.endswith(".tmp")], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
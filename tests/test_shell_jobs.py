@@ -0,0 +1,150 @@
+"""
+Tests of background jobs: ShellJobTable and the `jobs`, `wait` and `fg`
+builtins, in a script (non-interactive, like `bash script.sh`) and through
+ShellExecutor.run_line.
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SHELL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell")
+sys.path.insert(0, SHELL_DIR)
+
+from shell_executor import ShellExecutor
+from shell_jobs import ShellJob, ShellJobTable
+
+
+def finished_job(command_line: str, status_code: int) -> ShellJob:
+    """ Job of one external stage that already exited with status_code """
+
+    job = ShellJob(command_line, 0)
+    job.processes[0] = subprocess.Popen([sys.executable, "-c", f"raise SystemExit({status_code})"])
+    job.wait()
+    return job
+
+
+class JobTableTest(unittest.TestCase):
+
+    def test_numbering_and_lookup(self):
+        table = ShellJobTable()
+        jobs = [finished_job(f"job {number}", 0) for number in range(3)]
+
+        self.assertEqual([table.add(job) for job in jobs], [1, 2, 3])
+        self.assertIs(table.get(), jobs[2])
+        self.assertIs(table.get("%2"), jobs[1])
+        self.assertIs(table.get("1"), jobs[0])
+        self.assertIsNone(table.get("%9"))
+        self.assertIsNone(table.get("x"))
+
+        self.assertEqual([table.marker(job) for job in jobs], [" ", "-", "+"])
+
+        table.remove(jobs[2])
+        self.assertEqual([table.marker(job) for job in jobs[:2]], ["-", "+"])
+        self.assertEqual(table.add(finished_job("job 4", 0)), 3)
+
+    def test_reap_removes_finished_jobs(self):
+        table = ShellJobTable()
+        running = ShellJob("sleep", 0)
+        running.processes[0] = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(5)"])
+        self.addCleanup(running.wait)
+        self.addCleanup(running.processes[0].kill)
+
+        done = finished_job("done", 3)
+        table.add(running)
+        table.add(done)
+
+        self.assertEqual(table.reap(), [done])
+        self.assertEqual(done.status_code, 3)
+        self.assertEqual(table.jobs(), [running])
+
+    def test_collect_keeps_finished_jobs(self):
+        table = ShellJobTable()
+        table.MAX_FINISHED = 2
+        jobs = [finished_job(f"job {number}", 0) for number in range(3)]
+        for job in jobs:
+            table.add(job)
+
+        table.collect()
+        self.assertEqual(table.jobs(), jobs[1:])
+
+
+class JobsScriptTest(unittest.TestCase):
+    """ Scripts run by the shell as a program, checked against what bash prints """
+
+    def run_script(self, script: str) -> tuple[int, str, str]:
+        with tempfile.NamedTemporaryFile("w", suffix=".sh") as file:
+            file.write(script)
+            file.flush()
+            result = subprocess.run([sys.executable, os.path.join(SHELL_DIR, "shell_executor.py"), file.name], capture_output=True, text=True, timeout=30)
+        return (result.returncode, result.stdout, result.stderr)
+
+    def test_finished_jobs_are_reported_once(self):
+        script = "sleep 0.1 &\nsleep 2 &\n( exit 3 ) &\nsleep 0.5\njobs\necho ---\njobs\nwait\n"
+        status, output, _ = self.run_script(script)
+
+        self.assertEqual(status, 0)
+        self.assertEqual(output.splitlines(), [
+            "[1]   Done                    sleep 0.1",
+            "[2]-  Running                 sleep 2 &",
+            "[3]+  Exit 3                  ( exit 3 )",
+            "---",
+            "[2]+  Running                 sleep 2 &",
+        ])
+
+    def test_finished_on_the_same_line(self):
+        _, output, _ = self.run_script("sleep 0.1 &\nsleep 0.5; jobs; jobs\n")
+        self.assertEqual(output, "[1]+  Done                    sleep 0.1\n")
+
+    def test_job_output(self):
+        _, output, _ = self.run_script("{ sleep 0.2; echo late; } &\necho early\nwait\necho end\n")
+        self.assertEqual(output, "early\nlate\nend\n")
+
+
+class JobBuiltinsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ShellExecutor()
+        self.addCleanup(self.run_line, "wait")
+
+    def run_line(self, line: str) -> tuple[int, str, str]:
+        """ (status, stdout, stderr) of the line """
+
+        with open(os.devnull, "rb") as stdin, tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+            status, _ = self.executor.run_line(line, {0: stdin.fileno(), 1: stdout.fileno(), 2: stderr.fileno()})
+
+            stdout.seek(0)
+            stderr.seek(0)
+            return (status, stdout.read().decode(), stderr.read().decode())
+
+    def test_background_returns_at_once(self):
+        self.assertEqual(self.run_line("sleep 5 & echo started")[:2], (0, "started\n"))
+        self.assertEqual(len(self.executor.job_table), 1)
+        self.executor.job_table.get().processes[0].kill()
+
+    def test_wait_returns_the_status_of_the_job(self):
+        self.run_line("( exit 4 ) &")
+        self.run_line("sleep 0.1 &")
+
+        self.assertEqual(self.run_line("wait %1")[0], 4)
+        self.assertEqual(self.run_line("wait 2")[0], 0)
+        self.assertEqual(len(self.executor.job_table), 0)
+
+    def test_wait_for_a_missing_job(self):
+        self.assertEqual(self.run_line("wait %7")[:2], (127, "wait: %7: no such job\n"))
+
+    def test_fg_without_jobs(self):
+        self.assertEqual(self.run_line("fg")[:2], (1, "fg: current: no such job\n"))
+
+    def test_background_chain(self):
+        self.run_line("false && echo skipped || echo ran &")
+        self.assertEqual(self.run_line("wait")[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
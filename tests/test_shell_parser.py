@@ -0,0 +1,141 @@
+"""
+Tests of ShellParser: the CommandTreeNode trees it builds, the skip table of
+and-or chains and the syntax errors it reports.
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_executor import ShellExecutor
+from shell_models import CommandTreeNode
+from shell_tokenizer import ShellTokenizer
+
+# Set up with the shell's builtins, operators and redirects
+PARSER = ShellExecutor().parser
+
+
+def parse(line: str):
+    return PARSER.parse(ShellTokenizer.tokenize_typed(line))
+
+
+def shape(node: CommandTreeNode):
+    """ Tree as nested tuples: (kind, children...) with the command line text for commands """
+
+    if node.kind == CommandTreeNode.COMMAND:
+        return node.describe()
+    return (node.kind, *(shape(child) for child in node.children))
+
+
+class SkipTableTest(unittest.TestCase):
+
+    def test_skip_to_the_next_other_operator(self):
+        cases = [
+            ((None,), (1,)),
+            ((None, "&&"), (1, 2)),
+            ((None, "&&", "&&", "||"), (1, 3, 3, 4)),
+            ((None, "||", "||", "||", "&&", "||"), (1, 4, 4, 4, 5, 6)),
+            ((None, "&&", "||", "&&", "||"), (1, 2, 3, 4, 5)),
+        ]
+
+        for operators, skip_to in cases:
+            with self.subTest(operators=operators):
+                self.assertEqual(CommandTreeNode._build_skip_table(operators), skip_to)
+
+    def test_parsed_chain(self):
+        tree = parse("a && b && c || d")
+        self.assertEqual(tree.kind, CommandTreeNode.AND_OR)
+        self.assertEqual(tree.operators, (None, "&&", "&&", "||"))
+        self.assertEqual(tree.skip_to, (1, 3, 3, 4))
+
+    def test_long_chain(self):
+        tree = parse(" && ".join(["a"] * 5000) + " || b")
+        self.assertEqual(len(tree.children), 5001)
+        self.assertEqual(tree.skip_to[1], 5000)
+
+
+class TreeShapeTest(unittest.TestCase):
+
+    def test_lone_command(self):
+        tree = parse("echo 'a b' > out")
+        self.assertEqual(tree.kind, CommandTreeNode.COMMAND)
+        self.assertEqual(tree.data.command, "echo")
+        self.assertEqual(tree.data.args, ("a b",))
+        self.assertEqual(tree.data.redirections, ((1, ">", "out"),))
+
+    def test_empty_line(self):
+        self.assertIsNone(parse(""))
+        self.assertIsNone(parse("# comment"))
+
+    def test_lists_and_chains(self):
+        self.assertEqual(shape(parse("a && b; c")), ("list", ("and_or", "a", "b"), "c"))
+        self.assertEqual(shape(parse("a | b || c")), ("and_or", ("pipeline", "a", "b"), "c"))
+
+        tree = parse("a & b; c &")
+        self.assertEqual(shape(tree), ("list", "a", "b", "c"))
+        self.assertEqual(tree.background, (True, False, True))
+
+    def test_nested_subshells_and_groups(self):
+        tree = parse("( a; ( b && { c; d; } ) ) | e")
+        self.assertEqual(shape(tree), (
+            "pipeline",
+            ("subshell", ("list", "a", ("subshell", ("and_or", "b", ("group", ("list", "c", "d")))))),
+            "e",
+        ))
+
+    def test_group_redirections(self):
+        tree = parse("{ a; b; } > out 2>&1")
+        self.assertEqual(tree.kind, CommandTreeNode.GROUP)
+        self.assertEqual(tree.redirections, ((1, ">", "out"), (2, ">&", "1")))
+
+    def test_closing_brace_is_a_word_inside_a_command(self):
+        self.assertEqual(shape(parse("echo } {")), "echo } {")
+
+    def test_time(self):
+        self.assertEqual(shape(parse("time a | b && c")), ("and_or", ("time", ("pipeline", "a", "b")), "c"))
+        self.assertEqual(shape(parse("time ( a )")), ("time", ("subshell", "a")))
+        self.assertEqual(shape(parse("time")), ("time",))
+        self.assertEqual(shape(parse("time; a")), ("list", ("time",), "a"))
+
+    def test_describe(self):
+        for line in ["a && b || c", "a | b > out", "( a; b ) 2> err", "{ a; } &", "time a | b"]:
+            with self.subTest(line=line):
+                self.assertEqual(parse(parse(line).describe()).describe(), parse(line).describe())
+
+
+class SyntaxErrorTest(unittest.TestCase):
+
+    def test_errors(self):
+        cases = [
+            ("a &&", "unexpected end of line"),
+            ("| a", "unexpected token '|'"),
+            ("a ;; b", "unexpected token ';'"),
+            ("echo (", "unexpected token '('"),
+            ("( a", "unexpected end of line, expected ')'"),
+            ("a ) b", "unexpected token ')'"),
+            ("( )", "unexpected token ')'"),
+            ("{ a", "unexpected end of line, expected '}'"),
+            ("echo >", "expected a file name after '>'"),
+            ("echo > |", "expected a file name after '>'"),
+            ("> out", "missing command before redirection"),
+        ]
+
+        for line, message in cases:
+            with self.subTest(line=line):
+                with self.assertRaises(ValueError) as raised:
+                    parse(line)
+                self.assertEqual(str(raised.exception), message)
+
+    def test_too_deep_nesting(self):
+        with self.assertRaises(ValueError) as raised:
+            parse("(" * 5000 + "a" + ")" * 5000)
+        self.assertEqual(str(raised.exception), "too many nested groups")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+Tests of ShellServer with real clients.
+
+The server runs as a subprocess on a socket in a temporary directory, like
+in benchmarks/bench_suite.py, the clients are ShellClient objects with
+captured output.
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+SHELL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell")
+sys.path.insert(0, SHELL_DIR)
+
+from shell_client import ShellClient
+
+
+@unittest.skipUnless(hasattr(os, "fork") and hasattr(socket, "send_fds"), "needs os.fork and SCM_RIGHTS")
+class ShellServerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.socket_path = os.path.join(cls.directory.name, "shell.sock")
+        cls.server = subprocess.Popen([sys.executable, os.path.join(SHELL_DIR, "shell_server.py"), "-s", cls.socket_path], stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + 10
+        while not os.path.exists(cls.socket_path):
+            if time.monotonic() > deadline or cls.server.poll() is not None:
+                raise RuntimeError("shell server did not start")
+            time.sleep(0.01)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.terminate()
+        cls.server.wait()
+        cls.directory.cleanup()
+
+    def client(self) -> ShellClient:
+        client = ShellClient(self.socket_path)
+        self.addCleanup(client.close)
+        return client
+
+    def run_in_background(self, line: str) -> tuple[threading.Thread, dict]:
+        """ Sends the line from another client on a thread, result is filled with its capture() once done """
+
+        result = {}
+        client = self.client()
+        thread = threading.Thread(target=lambda: result.update(capture=client.capture(line)))
+        thread.start()
+        self.addCleanup(thread.join)
+
+        # Until the server runs the line
+        time.sleep(0.2)
+        return thread, result
+
+    def test_second_client_does_not_wait_for_a_slow_line(self):
+        slow, result = self.run_in_background("cd / && sleep 1 && pwd")
+
+        started = time.monotonic()
+        status_code, output, _ = self.client().capture("echo fast; pwd")
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(status_code, 0)
+        self.assertEqual(output.decode().splitlines(), ["fast", os.getcwd()])
+        self.assertLess(elapsed, 0.6)
+
+        slow.join()
+        self.assertEqual(result["capture"], (0, b"/\n", b""))
+
+    def test_state_changed_beside_a_slow_line_is_kept(self):
+        slow, _ = self.run_in_background("sleep 1")
+
+        client = self.client()
+        self.assertEqual(client.capture("hash -r; hash sh")[0], 0)
+        self.assertEqual(client.capture("exit 7")[0], 7)
+
+        slow.join()
+        _, output, _ = client.capture("hash")
+        self.assertRegex(output.decode(), r"/sh\n")
+
+    def test_jobs_belong_to_the_server(self):
+        client = self.client()
+
+        # Passed fds: a captured background job would hold the request open until it ends
+        devnull = os.open(os.devnull, os.O_RDWR)
+        self.addCleanup(os.close, devnull)
+        self.assertEqual(client.run("sleep 0.3 &", devnull, devnull, devnull), (0, False))
+
+        _, output, _ = client.capture("jobs")
+        self.assertIn("sleep 0.3", output.decode())
+
+        self.assertEqual(client.capture("wait")[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
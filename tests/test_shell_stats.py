@@ -0,0 +1,228 @@
+"""
+Tests of resource accounting: ShellStats, wait_child and the `time` keyword
+and `stats` builtin that report them.
+
+Builtins run in the shell, so their samples have no max RSS ("n/a"); only
+reaped children give one.
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_executor import ShellExecutor
+from shell_stats import ResourceSample, ShellStats, wait_child
+
+
+def sample(wall: float, maxrss_kb=None) -> ResourceSample:
+    return ResourceSample(wall, wall / 2, wall / 4, maxrss_kb)
+
+
+def fake_rusage(user: float, sys_time: float, maxrss_kb: int) -> SimpleNamespace:
+    ru_maxrss = maxrss_kb * 1024 if sys.platform == "darwin" else maxrss_kb
+    return SimpleNamespace(ru_utime=user, ru_stime=sys_time, ru_maxrss=ru_maxrss)
+
+
+class RecordTest(unittest.TestCase):
+
+    def test_rows(self):
+        stats = ShellStats()
+        stats.record("fast", sample(0.1))
+        stats.record("slow", sample(1.0, 300))
+        stats.record("slow", sample(3.0, 200))
+
+        self.assertEqual(stats.rows(), [
+            ("slow", 2, 2.0, 3.0, 1.0, 0.5, 300),
+            ("fast", 1, 0.1, 0.1, 0.05, 0.025, None),
+        ])
+
+    def test_rows_ordered_by_total_time(self):
+        stats = ShellStats()
+        stats.record("once", sample(1.0))
+        for _ in range(3):
+            stats.record("often", sample(0.5))
+
+        self.assertEqual([row[0] for row in stats.rows()], ["often", "once"])
+
+    def test_window(self):
+        stats = ShellStats()
+        stats.STATS_WINDOW = 3
+        for wall in (9.0, 1.0, 2.0, 3.0):
+            stats.record("cmd", sample(wall))
+
+        # Runs count every run, the times only the last STATS_WINDOW
+        self.assertEqual(stats.rows()[0][:4], ("cmd", 4, 2.0, 3.0))
+
+    def test_least_recently_used_command_is_evicted(self):
+        stats = ShellStats()
+        stats.STATS_MAX_COMMANDS = 2
+        stats.record("a", sample(1.0))
+        stats.record("b", sample(1.0))
+        stats.record("a", sample(1.0))
+        stats.record("c", sample(1.0))
+
+        self.assertEqual(sorted(row[0] for row in stats.rows()), ["a", "c"])
+
+        stats.record("b", sample(1.0))
+        self.assertEqual([row[:2] for row in stats.rows() if row[0] == "b"], [("b", 1)])
+
+    def test_clear(self):
+        stats = ShellStats()
+        stats.record("a", sample(1.0))
+        stats.clear()
+        self.assertEqual(stats.rows(), [])
+
+    def test_journal_replay(self):
+        child = ShellStats()
+        child.record("before", sample(1.0))
+        child.start_journal()
+        child.record("a", sample(1.0))
+        child.clear()
+        child.record("b", sample(2.0))
+
+        parent = ShellStats()
+        parent.record("kept", sample(0.5))
+        parent.replay(child.journal())
+
+        self.assertEqual([row[0] for row in parent.rows()], ["b"])
+        self.assertEqual(ShellStats().journal(), [])
+
+
+class FormatTest(unittest.TestCase):
+
+    def test_table_without_maxrss(self):
+        stats = ShellStats()
+        stats.record("echo", sample(0.001))
+        stats.record("sort", sample(0.5, 2048))
+
+        lines = stats.format_table().split("\n")
+        self.assertEqual(lines[0].split(), ["COMMAND", "RUNS", "AVG", "REAL", "MAX", "REAL", "AVG", "USER", "AVG", "SYS", "MAXRSS", "KB"])
+        self.assertEqual(lines[1].split()[::6], ["sort", "2048"])
+        self.assertEqual(lines[2].split()[::6], ["echo", "n/a"])
+
+    def test_report(self):
+        self.assertEqual(ShellStats.format_report(ResourceSample(61.5, 0.25, 0.0, 1500)), "\nreal\t1m1.500s\nuser\t0m0.250s\nsys\t0m0.000s\nmaxrss\t1500 KB\n")
+        self.assertTrue(ShellStats.format_report(sample(0.1)).endswith("\nmaxrss\tn/a\n"))
+
+
+class MeasurementTest(unittest.TestCase):
+
+    def test_children_are_added(self):
+        stats = ShellStats()
+        measurement = stats.start()
+        stats.record_child(fake_rusage(2.0, 1.0, 500))
+        stats.record_child(fake_rusage(1.0, 1.0, 800))
+        stats.record_child(None)
+        result = stats.stop(measurement)
+
+        self.assertGreaterEqual(result.user, 3.0)
+        self.assertGreaterEqual(result.sys, 2.0)
+        self.assertEqual(result.maxrss_kb, 800)
+
+    def test_nested_measurements(self):
+        stats = ShellStats()
+        outer = stats.start()
+        inner = stats.start()
+        stats.record_child(fake_rusage(1.0, 0.0, 100))
+        self.assertEqual(stats.stop(inner).maxrss_kb, 100)
+
+        stats.record_child(fake_rusage(1.0, 0.0, 300))
+        outer_sample = stats.stop(outer)
+        self.assertEqual(outer_sample.maxrss_kb, 300)
+        self.assertGreaterEqual(outer_sample.user, 2.0)
+
+    def test_without_children(self):
+        stats = ShellStats()
+        self.assertIsNone(stats.stop(stats.start()).maxrss_kb)
+
+
+@unittest.skipUnless(hasattr(os, "wait4"), "needs os.wait4")
+class WaitChildTest(unittest.TestCase):
+
+    def test_rusage_of_the_child(self):
+        # Touches 64 MiB, so its peak is well above the interpreter's own
+        process = subprocess.Popen([sys.executable, "-c", "data = bytearray(64 << 20); raise SystemExit(3)"])
+        rusage = wait_child(process)
+
+        self.assertEqual(process.returncode, 3)
+        maxrss_kb = rusage.ru_maxrss // 1024 if sys.platform == "darwin" else rusage.ru_maxrss
+        self.assertGreater(maxrss_kb, 64 << 10)
+
+        # Reaped already
+        self.assertIsNone(wait_child(process))
+
+    def test_not_blocking(self):
+        process = subprocess.Popen([sys.executable, "-c", "import sys; sys.stdin.read()"], stdin=subprocess.PIPE)
+        self.assertIsNone(wait_child(process, block=False))
+        self.assertIsNone(process.returncode)
+
+        process.stdin.close()
+        self.assertIsNotNone(wait_child(process))
+        self.assertEqual(process.returncode, 0)
+
+    def test_killed(self):
+        process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+        process.kill()
+        wait_child(process)
+        self.assertEqual(process.returncode, -9)
+
+
+class ShellTimeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ShellExecutor()
+
+    def run_line(self, line: str) -> tuple[int, str, str]:
+        """ (status, stdout, stderr) of the line """
+
+        with open(os.devnull, "rb") as stdin, tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+            status, _ = self.executor.run_line(line, {0: stdin.fileno(), 1: stdout.fileno(), 2: stderr.fileno()})
+
+            stdout.seek(0)
+            stderr.seek(0)
+            return (status, stdout.read().decode(), stderr.read().decode())
+
+    def test_builtin_has_no_maxrss(self):
+        _, _, error = self.run_line("time echo hi")
+        self.assertTrue(error.endswith("\nmaxrss\tn/a\n"))
+
+    @unittest.skipUnless(hasattr(os, "wait4"), "needs os.wait4")
+    def test_external_command_reports_maxrss(self):
+        _, _, error = self.run_line("time true")
+        self.assertRegex(error, r"\nmaxrss\t\d+ KB\n$")
+
+    def test_time_records_into_the_table(self):
+        self.run_line("time echo hi")
+        self.run_line("time echo again")
+        self.run_line("echo untimed")
+
+        self.assertEqual([row[:2] for row in self.executor.stats.rows()], [("echo", 2)])
+
+    def test_stats_builtin(self):
+        self.assertEqual(self.run_line("stats on")[0], 0)
+        self.run_line("true")
+        self.run_line("echo hi | cat")
+
+        status, output, _ = self.run_line("stats")
+        self.assertEqual(status, 0)
+        self.assertEqual(sorted(line.split()[0] for line in output.splitlines()[1:]), ["echo", "true"])
+
+        # The table is cleared while `stats -r` runs, which is then recorded itself
+        self.run_line("stats -r")
+        self.assertEqual([row[:2] for row in self.executor.stats.rows()], [("stats", 1)])
+
+        self.run_line("stats off")
+        self.run_line("true")
+        self.assertNotIn("true", [row[0] for row in self.executor.stats.rows()])
+
+
+if __name__ == "__main__":
+    unittest.main()
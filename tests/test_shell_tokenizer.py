@@ -0,0 +1,125 @@
+"""
+Tests of ShellTokenizer: shlex compatibility and token kinds.
+
+SHLEX_COMPAT_CORPUS covers the syntax where shlex and a POSIX shell agree, see
+ShellTokenizer.describe_lexer for the differences ($, ',' and '#' inside
+words, 2> redirects). The reference is shlex in POSIX mode with
+punctuation_chars, which splits operators like the shell (shlex.split would
+keep a&&b in one word and does not drop comments).
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import shlex
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_glob import GlobWord
+from shell_tokenizer import ShellTokenizer
+
+SHLEX_COMPAT_CORPUS = [
+    "",
+    "   ",
+    "ls",
+    "ls -la /tmp",
+    "echo Hello world",
+    'echo "Hello     world" > ./cmd/files/mop.md && echo Hello world',
+    "echo 'single quoted' \"double quoted\"",
+    "echo a'b c'd",
+    'echo a"b c"d',
+    'echo "" \'\'',
+    'echo "say \\"hi\\""',
+    'echo "back\\\\slash" "keep\\n"',
+    "echo it\\'s",
+    "echo a\\ b\\ c",
+    "cat < in.txt > out.txt",
+    "sort >> log.txt",
+    "a && b || c ; d | e",
+    "a&&b||c;d|e",
+    "a>b<c",
+    "sleep 1 &",
+    "( cd /tmp ; ls )",
+    "grep -r 'some pattern' ./src | sort | uniq -c | sort -rn | head -20",
+    "find . -name '*.py' -type f",
+    "echo ~/path/to/file.txt -x=1",
+    "echo 'multi\nline'",
+    "echo one # a comment",
+    "# only a comment",
+    'echo "(" \')\'',
+    'echo "|" x',
+    "echo '&&' ok",
+    'echo ">" f "2>&1" \\;',
+]
+
+WORD = ShellTokenizer.WORD
+OPERATOR = ShellTokenizer.OPERATOR
+REDIRECT = ShellTokenizer.REDIRECT
+
+
+def shlex_tokens(line: str) -> list[str]:
+    return list(shlex.shlex(line, posix=True, punctuation_chars=True))
+
+
+class ShlexCompatibilityTest(unittest.TestCase):
+
+    def test_corpus_matches_shlex(self):
+        for line in SHLEX_COMPAT_CORPUS:
+            with self.subTest(line=line):
+                self.assertEqual(ShellTokenizer.tokenize(line), shlex_tokens(line))
+
+    def test_quoted_tokens_are_words(self):
+        # shlex does not say which tokens were quoted, the parser needs them to be words
+        for line in SHLEX_COMPAT_CORPUS:
+            for token in ShellTokenizer.tokenize_typed(line):
+                if line[token.start] in "'\"\\":
+                    with self.subTest(line=line, token=token.value):
+                        self.assertEqual(token.kind, WORD)
+
+    def test_unterminated_quote(self):
+        with self.assertRaises(ValueError):
+            ShellTokenizer.tokenize("echo 'open")
+
+
+class TokenKindTest(unittest.TestCase):
+
+    def kinds(self, line: str) -> list[tuple[str, str]]:
+        return [(token.kind, token.value) for token in ShellTokenizer.tokenize_typed(line)]
+
+    def test_operators(self):
+        self.assertEqual(self.kinds("a && b || c; d | e &"), [
+            (WORD, "a"), (OPERATOR, "&&"), (WORD, "b"), (OPERATOR, "||"), (WORD, "c"),
+            (OPERATOR, ";"), (WORD, "d"), (OPERATOR, "|"), (WORD, "e"), (OPERATOR, "&"),
+        ])
+        self.assertEqual(self.kinds("(a)"), [(OPERATOR, "("), (WORD, "a"), (OPERATOR, ")")])
+
+    def test_redirects(self):
+        self.assertEqual(self.kinds("cmd < in > out 2>> err 2>&1"), [
+            (WORD, "cmd"), (REDIRECT, "<"), (WORD, "in"), (REDIRECT, ">"), (WORD, "out"),
+            (REDIRECT, "2>>"), (WORD, "err"), (REDIRECT, "2>&1"),
+        ])
+
+    def test_quoted_operators_stay_words(self):
+        self.assertEqual(self.kinds('echo "(" \')\' "|" \'&&\' ">" \\;'), [
+            (WORD, "echo"), (WORD, "("), (WORD, ")"), (WORD, "|"), (WORD, "&&"), (WORD, ">"), (WORD, ";"),
+        ])
+
+    def test_braces_are_words(self):
+        self.assertEqual(self.kinds("{ a; }"), [(WORD, "{"), (WORD, "a"), (OPERATOR, ";"), (WORD, "}")])
+
+    def test_offsets_point_into_the_line(self):
+        line = "echo 'a b' > out"
+        self.assertEqual([line[token.start:token.end] for token in ShellTokenizer.tokenize_typed(line)], ["echo", "'a b'", ">", "out"])
+
+    def test_unquoted_wildcards_make_glob_words(self):
+        word = ShellTokenizer.tokenize('"a*"*')[0]
+        self.assertIsInstance(word, GlobWord)
+        self.assertEqual((str(word), word.pattern), ("a**", "a[*]*"))
+        self.assertNotIsInstance(ShellTokenizer.tokenize("'*'")[0], GlobWord)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,211 @@
+"""
+Tests of ShellUtils (`net` builtin).
+
+Names are resolved through a fake ShellUtils.resolver and the cache clock is
+mocked, the port scanner connects to listeners opened on 127.0.0.1, so the
+tests never leave the machine.
+
+Usage:
+    python -m pytest tests
+"""
+
+import io
+import os
+import socket
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shell"))
+
+from shell_executor import ShellExecutor
+from shell_utils import ShellUtils
+
+
+class FakeResolver:
+    """ Stands in for socket.getaddrinfo, answers from a table and counts lookups per name """
+
+    def __init__(self, answers: dict):
+        self.answers = answers   # name -> list of addresses, or a socket.gaierror to raise
+        self.calls: dict[str, int] = {}
+
+    def __call__(self, name, port, family=0, type=0, proto=0, flags=0):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        answer = self.answers[name]
+
+        if isinstance(answer, Exception):
+            raise answer
+
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, 0)) for address in answer]
+
+
+class DnsCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.utils = ShellUtils()
+        self.resolver = FakeResolver({
+            "a.example": ["192.0.2.1", "192.0.2.2"],
+            "missing.example": socket.gaierror(socket.EAI_NONAME, "Name or service not known"),
+            "flaky.example": socket.gaierror(socket.EAI_AGAIN, "Temporary failure in name resolution"),
+        })
+        self.utils.resolver = self.resolver
+        self.now = 1000.0
+
+        patcher = mock.patch("shell_utils.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_answer_is_cached_until_the_positive_ttl_expires(self):
+        self.assertEqual(self.utils.resolve_many(["a.example"]), {"a.example": (["192.0.2.1", "192.0.2.2"], None)})
+
+        self.now += self.utils.DNS_POSITIVE_TTL - 1
+        self.utils.resolve_many(["a.example"])
+        self.assertEqual(self.resolver.calls["a.example"], 1)
+        self.assertEqual(self.utils.dns_cache_hits, 1)
+
+        self.now += 2
+        self.utils.resolve_many(["a.example"])
+        self.assertEqual(self.resolver.calls["a.example"], 2)
+
+    def test_failed_lookup_is_cached_for_the_negative_ttl(self):
+        addresses, error = self.utils.resolve_many(["missing.example"])["missing.example"]
+        self.assertIsNone(addresses)
+        self.assertIn("not known", error)
+
+        self.now += self.utils.DNS_NEGATIVE_TTL - 1
+        self.assertEqual(self.utils.resolve_many(["missing.example"])["missing.example"], (None, error))
+        self.assertEqual(self.resolver.calls["missing.example"], 1)
+
+        # Expires long before a positive answer would
+        self.now += 2
+        self.utils.resolve_many(["missing.example"])
+        self.assertEqual(self.resolver.calls["missing.example"], 2)
+
+    def test_temporary_failure_is_not_cached(self):
+        self.utils.resolve_many(["flaky.example"])
+        self.utils.resolve_many(["flaky.example"])
+        self.assertEqual(self.resolver.calls["flaky.example"], 2)
+
+    def test_duplicates_are_resolved_once_in_input_order(self):
+        results = self.utils.resolve_many(["missing.example", "a.example", "missing.example"])
+        self.assertEqual(list(results), ["missing.example", "a.example"])
+        self.assertEqual(self.resolver.calls, {"missing.example": 1, "a.example": 1})
+
+
+class NetGetipTest(unittest.TestCase):
+
+    def setUp(self):
+        self.utils = ShellUtils()
+        self.utils.resolver = FakeResolver({"a.example": ["192.0.2.1"], "b.example": ["2001:db8::1"]})
+
+    def test_names_from_the_given_stdin(self):
+        stdin = io.BytesIO(b"a.example\n# comment\n\nb.example\n")
+        status_code, output, errors = self.utils.net_getip(["-f", "-"], stdin=stdin)
+
+        self.assertEqual((status_code, errors), (0, ""))
+        self.assertEqual(output, "a.example: 192.0.2.1\nb.example: 2001:db8::1")
+
+    def test_failed_name_sets_the_status(self):
+        self.utils.resolver.answers["bad.example"] = socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        status_code, output, errors = self.utils.net_getip(["a.example", "bad.example"])
+
+        self.assertEqual(status_code, 1)
+        self.assertEqual(output, "a.example: 192.0.2.1")
+        self.assertEqual(errors, "net getip: bad.example: Name or service not known")
+
+    def test_errors_go_to_stderr(self):
+        executor = ShellExecutor()
+        executor.builtins.shell_utils.resolver = self.utils.resolver
+        self.utils.resolver.answers["bad.example"] = socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+
+        with open(os.devnull, "rb") as stdin, tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+            status, _ = executor.run_line("net getip bad.example", {0: stdin.fileno(), 1: stdout.fileno(), 2: stderr.fileno()})
+
+            stdout.seek(0)
+            stderr.seek(0)
+            self.assertEqual((status, stdout.read()), (1, b""))
+            self.assertEqual(stderr.read(), b"net getip: bad.example: Name or service not known\n")
+
+
+class ScanPortsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.utils = ShellUtils()
+        self.listeners = []
+
+        for _ in range(3):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.bind(("127.0.0.1", 0))
+            listener.listen()
+            self.listeners.append(listener)
+            self.addCleanup(listener.close)
+
+        self.open_ports = sorted(listener.getsockname()[1] for listener in self.listeners)
+
+        # A port that was free a moment ago, nothing listens on it
+        closed = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        closed.bind(("127.0.0.1", 0))
+        self.closed_port = closed.getsockname()[1]
+        closed.close()
+
+    def test_open_ports_are_found(self):
+        found = []
+        ports = sorted(self.open_ports + [self.closed_port])
+
+        open_ports = self.utils.scan_ports("127.0.0.1", ports, timeout=2.0, concurrency=2, on_open=found.append)
+
+        self.assertEqual(open_ports, self.open_ports)
+        self.assertEqual(sorted(found), self.open_ports)
+
+    def test_host_is_resolved_through_the_cache(self):
+        resolver = FakeResolver({"scan.example": ["127.0.0.1"], "missing.example": socket.gaierror(socket.EAI_NONAME, "Name or service not known")})
+        self.utils.resolver = resolver
+
+        for _ in range(2):
+            self.assertEqual(self.utils.scan_ports("scan.example", self.open_ports, timeout=2.0), self.open_ports)
+        self.assertEqual(resolver.calls, {"scan.example": 1})
+
+        with self.assertRaisesRegex(OSError, "missing.example: Name or service not known"):
+            self.utils.scan_ports("missing.example", self.open_ports)
+
+    @unittest.skipUnless(socket.has_ipv6, "needs IPv6")
+    def test_ipv6_address(self):
+        try:
+            listener = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+            listener.bind(("::1", 0))
+        except OSError:
+            self.skipTest("no IPv6 loopback")
+
+        listener.listen()
+        self.addCleanup(listener.close)
+        port = listener.getsockname()[1]
+
+        self.assertEqual(self.utils.scan_ports("::1", [port], timeout=2.0), [port])
+
+    def test_report_lists_open_ports(self):
+        port_spec = ",".join(str(port) for port in self.open_ports + [self.closed_port])
+        status_code, output, errors = self.utils.net_scanports(["127.0.0.1", "-p", port_spec, "-t", "2"])
+
+        self.assertEqual(status_code, 0)
+        lines = output.splitlines()
+        self.assertEqual(lines[:-1], [f"{port}/tcp open" for port in self.open_ports])
+        self.assertTrue(lines[-1].startswith("3 open of 4 scanned ports on 127.0.0.1"))
+
+    def test_streamed_ports_leave_only_the_summary(self):
+        found = []
+        port_spec = ",".join(str(port) for port in self.open_ports)
+        status_code, output, errors = self.utils.net_scanports(["127.0.0.1", "-p", port_spec], on_open=found.append)
+
+        self.assertEqual(status_code, 0)
+        self.assertEqual(sorted(found), self.open_ports)
+        self.assertEqual(len(output.splitlines()), 1)
+
+    def test_bad_port_spec(self):
+        status_code, output, errors = self.utils.net_scanports(["127.0.0.1", "-p", "0-10"])
+        self.assertEqual((status_code, output), (1, ""))
+        self.assertIn("invalid port range", errors)
+
+
+if __name__ == "__main__":
+    unittest.main()